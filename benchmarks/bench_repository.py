@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Benchmarks for loading, filtering and saving with a Repository, run against
+an in-memory FakeWorksheet so no credentials are needed.
+
+    python benchmarks/bench_repository.py --rows 1000 10000
+
+Each line reports the best time over the repeats and the API calls the
+operation would have made.
+"""
+from __future__ import print_function
+import argparse
+import sys
+import timeit
+from pygsheetsorm import Repository
+from pygsheetsorm.pygsheetsorm import STORAGE_COLUMNS
+from pygsheetsorm.testing import FakeWorksheet
+
+# Serial number of 2018-01-01
+FIRST_SERIAL = 43101
+STATUSES = [u"new", u"open", u"closed"]
+# Ways to build a Repository, by name
+LOADERS = [
+    ("cells", {}),
+    ("fast_load", {"fast_load": True}),
+    ("columns", {"storage": STORAGE_COLUMNS}),
+]
+
+
+def get_worksheet(row_count):
+    """Build a FakeWorksheet with a text, number, bool and date column."""
+    rows = [[u"Name", u"Status", u"Balance", u"Active", u"Opened"]]
+    format_types = [[None] * 5]
+    for index in range(row_count):
+        rows.append(
+            [
+                u"account {}".format(index),
+                STATUSES[index % len(STATUSES)],
+                index * 1.5,
+                index % 2 == 0,
+                FIRST_SERIAL + index % 365,
+            ]
+        )
+        format_types.append([None, None, u"NUMBER", None, u"DATE"])
+    return FakeWorksheet(rows, format_types=format_types)
+
+
+def get_loaded_repository(row_count, **kwargs):
+    """Build a Repository over a new FakeWorksheet and load every row."""
+    worksheet = get_worksheet(row_count)
+    repository = Repository(worksheet, **kwargs)
+    repository.get_all()
+    worksheet.calls.clear()
+    return worksheet, repository
+
+
+def measure(name, row_count, setup, operation, repeat):
+    """Time an operation and print the best run.
+
+    Args:
+      name (str): name of the benchmark
+      row_count (int): number of rows in the sheet
+      setup (function): returns (worksheet, argument for operation). Called
+          before every run and not timed.
+      operation (function): operation to time
+      repeat (int): number of runs
+    """
+    best = None
+    calls = None
+    for _ in range(repeat):
+        worksheet, argument = setup()
+        start = timeit.default_timer()
+        operation(argument)
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+        calls = worksheet.api_calls
+    print(
+        "{:<28} {:>8} rows {:>10.4f}s {:>4} API calls".format(
+            name, row_count, best, calls
+        )
+    )
+
+
+def run_benchmarks(row_count, repeat):
+    """Run every benchmark for one sheet size."""
+
+    def get_unloaded(**kwargs):
+        def setup():
+            worksheet = get_worksheet(row_count)
+            return worksheet, Repository(worksheet, **kwargs)
+
+        return setup
+
+    def get_loaded(**kwargs):
+        return lambda: get_loaded_repository(row_count, **kwargs)
+
+    for name, kwargs in LOADERS:
+        measure(
+            "get_all[{}]".format(name),
+            row_count,
+            get_unloaded(**kwargs),
+            lambda repository: repository.get_all(),
+            repeat,
+        )
+    measure(
+        "filter[lambda]",
+        row_count,
+        get_loaded(fast_load=True),
+        lambda repository: [
+            model for model in repository.get_all() if model.status == u"open"
+        ],
+        repeat,
+    )
+    for name, kwargs in LOADERS[1:]:
+        measure(
+            "query[{}]".format(name),
+            row_count,
+            get_loaded(**kwargs),
+            lambda repository: (
+                repository.query()
+                .where(status=u"open")
+                .where_gt("balance", row_count / 2)
+                .all()
+            ),
+            repeat,
+        )
+
+    def setup_index():
+        worksheet, repository = get_loaded_repository(row_count, fast_load=True)
+        repository.create_index("name", unique=True)
+        return worksheet, repository
+
+    measure(
+        "get_by[index]",
+        row_count,
+        setup_index,
+        lambda repository: [
+            repository.get_by(name=u"account {}".format(index))
+            for index in range(0, row_count, max(1, row_count // 100))
+        ],
+        repeat,
+    )
+
+    def setup_save():
+        worksheet, repository = get_loaded_repository(row_count, fast_load=True)
+        for model in repository.get_all()[:: max(1, row_count // 100)]:
+            model.status = u"closed"
+        return worksheet, repository
+
+    measure(
+        "save_all[1% modified]",
+        row_count,
+        setup_save,
+        lambda repository: repository.save_all(),
+        repeat,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="sheet sizes to benchmark",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each benchmark")
+    args = parser.parse_args(argv)
+    for row_count in args.rows:
+        run_benchmarks(row_count, args.repeat)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
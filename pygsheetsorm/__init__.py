@@ -3,4 +3,19 @@
 # SPDX-License-Identifier: BSD-3-Clause
 # For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 
-from .pygsheetsorm import Repository, Model, CellConverter, BasicCellConverter
+from .pygsheetsorm import (
+    Repository,
+    Model,
+    CellConverter,
+    BasicCellConverter,
+    SnapshotCache,
+    RateLimiter,
+    Metrics,
+    RequestStats,
+    StatsdMetrics,
+    PrometheusMetrics,
+    Profiler,
+    clear_client_pool,
+    set_default_rate_limiter,
+    set_default_metrics,
+)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+asyncio interface to a Repository. Requires Python 3.5 or later.
+"""
+import asyncio
+import functools
+import logging
+from .pygsheetsorm import (
+    OPERATION_BATCH_SAVE,
+    Repository,
+    retry_if_over_write_quota,
+)
+
+LOG = logging.getLogger(__name__)
+
+# Same backoff as Repository writes, 2, 4, 8... seconds up to a minute
+BACKOFF_MULTIPLIER_SECONDS = 1
+BACKOFF_MAX_SECONDS = 60
+
+
+class AsyncRepository(object):
+    """asyncio interface to a Repository. Blocking calls to the Sheets API
+    run in an executor so they never block the event loop, and at most
+    concurrency of them run at once. Writes that hit the API quota are
+    retried with an exponential backoff that waits with asyncio.sleep
+    instead of sleeping in a thread.
+
+    Requests made through one pygsheets client are still sent one at a time
+    because they share its HTTP connection. Pass the same semaphore to
+    several AsyncRepositories to limit the requests they make together.
+
+    AsyncRepositories are usually created with create(), which fetches the
+    header row without blocking. Lookups of cached Models, like query() and
+    get_by(), don't make requests and can be called on repository directly.
+
+    Args:
+      repository (Repository): Repository to make requests for
+      concurrency (int): Maximum number of requests running at once.
+          Default value = 4
+      semaphore (asyncio.Semaphore): Semaphore limiting requests, used
+          instead of one created from concurrency. Default value = None
+      executor (concurrent.futures.Executor): Executor blocking calls run
+          in. None means the default executor of the event loop.
+          Default value = None
+      max_attempts (int): Number of times a write over quota is tried.
+          None means until it succeeds, like Repository. Default value = None
+
+    """
+
+    def __init__(
+        self,
+        repository,
+        concurrency=4,
+        semaphore=None,
+        executor=None,
+        max_attempts=None,
+    ):
+        self.repository = repository
+        self._concurrency = concurrency
+        # Created on first use so it belongs to the running event loop
+        self._semaphore = semaphore
+        self._executor = executor
+        self._max_attempts = max_attempts
+
+    @classmethod
+    async def create(
+        cls,
+        pygsheets_worksheet,
+        concurrency=4,
+        semaphore=None,
+        executor=None,
+        max_attempts=None,
+        **kwargs
+    ):
+        """Create a Repository in the executor and wrap it.
+
+        Args:
+          pygsheets_worksheet (pygsheets.Worksheet): Worksheet to read/write from
+          concurrency (int): See AsyncRepository. Default value = 4
+          semaphore (asyncio.Semaphore): See AsyncRepository. Default value = None
+          executor (concurrent.futures.Executor): See AsyncRepository.
+              Default value = None
+          max_attempts (int): See AsyncRepository. Default value = None
+          kwargs: Other arguments for Repository
+
+        Returns:
+          AsyncRepository: AsyncRepository created with arguments
+        """
+        async_repository = cls(
+            repository=None,
+            concurrency=concurrency,
+            semaphore=semaphore,
+            executor=executor,
+            max_attempts=max_attempts,
+        )
+        async_repository.repository = await async_repository._run(
+            functools.partial(
+                Repository, pygsheets_worksheet=pygsheets_worksheet, **kwargs
+            )
+        )
+        return async_repository
+
+    async def _run(self, function, *args):
+        """Run a blocking function in the executor once a request slot is free.
+
+        Args:
+          function (function): function to run
+          args: arguments for function
+
+        Returns:
+          what function returns
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(function, *args)
+            )
+
+    async def get_all(self, lambda_filter=None):
+        """See Repository.get_all(). Cached Models are returned without
+        going through the executor.
+
+        Args:
+          lambda_filter (function): Lambda function which will filter list
+              (Default value = None)
+
+        Returns:
+          list: Model objects that correspond to each row in the sheet
+        """
+        if self.repository._models:
+            return self.repository.get_all(lambda_filter=lambda_filter)
+        return await self._run(
+            functools.partial(self.repository.get_all, lambda_filter=lambda_filter)
+        )
+
+    async def refresh(self, key=None):
+        """See Repository.refresh().
+
+        Args:
+          key (str): property name identifying a row (Default value = None)
+
+        Returns:
+          RefreshResult: added, updated and removed Models
+        """
+        return await self._run(functools.partial(self.repository.refresh, key=key))
+
+    async def save(self, *models):
+        """Save modified properties of Models. Batches that don't fit in
+        one request are sent concurrently.
+
+        Args:
+          models: Model objects to save
+        """
+        updates, saved_models = self.repository._get_pending_updates(models)
+        batches = self.repository._split_updates(updates)
+        await asyncio.gather(*[self._batch_update(batch) for batch in batches])
+        for model in saved_models:
+            model.Metadata.reset_modified_properties()
+
+    async def save_all(self):
+        """Save every cached Model that has modified properties."""
+        await self.save(*self.repository._models)
+
+    async def _batch_update(self, updates):
+        """Write cell values in one request, retrying with exponential
+        backoff if the API quota is hit.
+
+        Args:
+          updates (list): (row, column, value) tuples
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await self._run(self.repository._send_batch_update, updates)
+            except Exception as err:
+                if not retry_if_over_write_quota(err):
+                    raise
+                if self._max_attempts is not None and attempt >= self._max_attempts:
+                    raise
+            wait = min(
+                BACKOFF_MULTIPLIER_SECONDS * pow(2, attempt), BACKOFF_MAX_SECONDS
+            )
+            LOG.debug("Over write quota, retrying in %s seconds", wait)
+            self.repository._record_backoff(OPERATION_BATCH_SAVE, wait)
+            await asyncio.sleep(wait)
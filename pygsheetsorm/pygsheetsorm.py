@@ -8,19 +8,121 @@
 Classes to interact with a google spreadsheet via a model
 with attributes that automatically map to column headers
 """
+import bisect
+import collections
+import contextlib
 import datetime
+import decimal
+import functools
+import heapq
+import itertools
+import json
+import numbers
 import re
 import logging
+import multiprocessing.pool
+import operator
+import sqlite3
+import sys
+import threading
+import time
+import timeit
+import weakref
+import zlib
+import google_auth_httplib2
 import pygsheets
 import six
 from googleapiclient.errors import HttpError
-from retrying import retry
+from retrying import Retrying
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, it speeds up date conversion
+    numpy = None
+try:
+    import pandas
+except ImportError:  # pandas is optional, see Repository.to_dataframe
+    pandas = None
+try:
+    import pyarrow
+except ImportError:  # pyarrow is optional, see Repository.to_arrow
+    pyarrow = None
+try:
+    import prometheus_client
+except ImportError:  # prometheus_client is optional, see PrometheusMetrics
+    prometheus_client = None
 
 LOG = logging.getLogger(__name__)
 
+# Batched writes are split so each request stays within what the
+# Sheets API accepts in a single call.
+BATCH_UPDATE_MAX_CELLS = 50000
+BATCH_UPDATE_MAX_BYTES = 2 * 1024 * 1024
+# Rough JSON overhead for each range in a batch update request
+BATCH_UPDATE_RANGE_OVERHEAD_BYTES = 80
+# Ways a Repository can keep values in memory
+STORAGE_ROWS = "rows"
+STORAGE_COLUMNS = "columns"
+# Only fetch the parts of each cell that Models are built from
+GRID_DATA_FIELDS = (
+    "sheets(properties/gridProperties/rowCount,"
+    "data/rowData/values(effectiveValue,userEnteredFormat/numberFormat/type))"
+)
+# GRID_DATA_FIELDS for requests of several ranges, which need to know
+# where each range starts
+PROJECTION_GRID_DATA_FIELDS = (
+    "sheets(data(startColumn,"
+    "rowData/values(effectiveValue,userEnteredFormat/numberFormat/type)))"
+)
+# Kinds of Sheets API requests, each has its own quota
+REQUEST_READ = "read"
+REQUEST_WRITE = "write"
+# Operations Sheets API requests are recorded under, see Metrics
+OPERATION_HEADER = "header"
+OPERATION_LOAD = "load"
+OPERATION_REVISION = "revision"
+OPERATION_SAVE = "save"
+OPERATION_BATCH_SAVE = "batch_save"
+OPERATION_APPEND = "append"
+OPERATION_DELETE = "delete"
+OPERATION_SYNC = "sync"
+# Phases of loading a Profiler records, see Profiler
+PHASE_FETCH = "fetch"
+PHASE_PLACEHOLDERS = "placeholder_cells"
+PHASE_CONVERSION = "conversion"
+PHASE_BUILD = "build_models"
+PHASE_INDEX = "index"
+# Sections of a Profiler report
+PROFILE_PHASES = "phases"
+PROFILE_COLUMNS = "columns"
+PROFILE_CONVERTERS = "converters"
+PROFILE_SECTIONS = (PROFILE_PHASES, PROFILE_COLUMNS, PROFILE_CONVERTERS)
+# What pygsheets needs to open a spreadsheet, plus GRID_DATA_FIELDS values
+SPREADSHEET_GRID_DATA_FIELDS = (
+    "spreadsheetId,properties,namedRanges,sheets(properties,"
+    "data/rowData/values(effectiveValue,userEnteredFormat/numberFormat/type))"
+)
+
 
 class CellConverter(object):
-    """See BasicCellConverter for how to implement."""
+    """See BasicCellConverter for how to implement.
+
+    Converters may also implement from_value(value, format_type, property_name)
+    to convert an unformatted value and its number format type without a
+    pygsheets.Cell. Repositories created with fast_load=True need it.
+
+    When loading with fast_load=True, a column whose non empty cells share
+    one number format is passed to from_column(values, format_type,
+    property_name) if the converter has it. It must return a list of
+    converted values the same length as values. Empty cells have a
+    value of "".
+
+    Converters may also implement get_column_converter(format_type,
+    property_name). It is called once per column each time the sheet is
+    loaded, for columns whose non empty cells share one number format,
+    and returns a function that takes the list of values of the column
+    and returns them converted, or None to use from_column instead.
+    """
 
     pass
 
@@ -30,35 +132,233 @@ class BasicCellConverter(CellConverter):
         # In most cases, value_unformatted is what we want.
         # It can return unicode, bool, int, float based on
         # type set in google sheet.
-        value = cell.value_unformatted
+        return self.from_value(
+            value=cell.value_unformatted,
+            format_type=cell.format[0],
+            property_name=property_name,
+        )
+
+    def from_value(self, value, format_type, property_name):
         # format is either a unicode string or an enum from pygsheets
-        format_type = cell.format[0]
-        if isinstance(format_type, six.string_types):
-            if u"DATE" in format_type or u"TIME" in format_type:
-                # Need to convert google sheet return value (which is based on excel)
-                # to a real datetime https://stackoverflow.com/a/47508307
-                cell_datetime = datetime.datetime(
-                    year=1899, month=12, day=30
-                ) + datetime.timedelta(days=value)
-                # Round the microseconds
-                if cell_datetime.microsecond >= 500000:
-                    cell_datetime = cell_datetime.replace(
-                        second=cell_datetime.second + 1, microsecond=0
-                    )
-                else:
-                    cell_datetime = cell_datetime.replace(microsecond=0)
-                if format_type == u"DATE_TIME":
-                    return cell_datetime
-                elif format_type == u"DATE":
-                    return cell_datetime.date()
-                elif format_type == u"TIME":
-                    return cell_datetime.time()
+        # Empty cells can still carry the number format of their column
+        if isinstance(format_type, six.string_types) and value != u"":
+            convert = _SERIAL_CONVERTERS.get(format_type)
+            if convert is not None:
+                return convert(value)
         return value
 
+    def from_column(self, values, format_type, property_name):
+        if not _is_basic_method(self, "from_value"):
+            # A subclass converts values its own way, honour it for each value
+            return [
+                self.from_value(
+                    value=value, format_type=format_type, property_name=property_name
+                )
+                for value in values
+            ]
+        # Only date and time columns need converting
+        if format_type not in _SERIAL_CONVERTERS:
+            return list(values)
+        converted = list(values)
+        indexes = []
+        for index, value in enumerate(values):
+            if isinstance(value, numbers.Real):
+                indexes.append(index)
+            elif value != u"":
+                # Let from_value deal with values that are not serial numbers
+                converted[index] = self.from_value(
+                    value=value, format_type=format_type, property_name=property_name
+                )
+        results = _convert_serials([values[index] for index in indexes], format_type)
+        for index, result in zip(indexes, results):
+            converted[index] = result
+        return converted
+
     def to_cell(self, cell, property_name, value):
         cell.value = str(value)
 
 
+def _serial_to_datetime(serial):
+    """Convert a serial number, days since 1899-12-30 as Sheets keeps dates
+    and times, to a datetime rounded to the second.
+
+    Args:
+      serial (float): serial number
+
+    Returns:
+      datetime.datetime: date and time of the serial number
+    """
+    # Need to convert google sheet return value (which is based on excel)
+    # to a real datetime https://stackoverflow.com/a/47508307
+    cell_datetime = datetime.datetime(year=1899, month=12, day=30) + datetime.timedelta(
+        days=serial
+    )
+    # Round the microseconds
+    if cell_datetime.microsecond >= 500000:
+        return cell_datetime.replace(microsecond=0) + datetime.timedelta(seconds=1)
+    return cell_datetime.replace(microsecond=0)
+
+
+# Functions converting a serial number by number format type
+_SERIAL_CONVERTERS = {
+    u"DATE": lambda serial: _serial_to_datetime(serial).date(),
+    u"TIME": lambda serial: _serial_to_datetime(serial).time(),
+    u"DATE_TIME": _serial_to_datetime,
+}
+
+
+def _convert_serials(serials, format_type):
+    """Convert serial numbers like BasicCellConverter.from_value does, all
+    at once with numpy when it is installed.
+
+    Args:
+      serials (list): serial numbers
+      format_type (str): "DATE", "TIME" or "DATE_TIME"
+
+    Returns:
+      list: dates, times or datetimes
+    """
+    if numpy is None or not serials:
+        convert = _SERIAL_CONVERTERS[format_type]
+        return [convert(serial) for serial in serials]
+    seconds, _ = _serials_to_seconds(serials)
+    if format_type == u"TIME":
+        seconds = seconds % 86400
+        return [
+            datetime.time(hour, minute, second)
+            for hour, minute, second in zip(
+                (seconds // 3600).tolist(),
+                (seconds % 3600 // 60).tolist(),
+                (seconds % 60).tolist(),
+            )
+        ]
+    cell_datetimes = numpy.datetime64("1899-12-30T00:00:00", "s") + seconds
+    if format_type == u"DATE":
+        cell_datetimes = cell_datetimes.astype("datetime64[D]")
+    return cell_datetimes.tolist()
+
+
+def _to_int(value):
+    """Convert a value to an int, refusing to drop a fraction."""
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError("{} is not a whole number".format(value))
+    return int(value)
+
+
+def _to_bool(value):
+    """Convert a value to a bool, reading "TRUE" and "FALSE" in any case."""
+    if isinstance(value, six.string_types):
+        if value.upper() not in (u"TRUE", u"FALSE"):
+            raise ValueError("{} is not TRUE or FALSE".format(value))
+        return value.upper() == u"TRUE"
+    return bool(value)
+
+
+# Functions converting non empty values to the types a schema can declare,
+# see Repository. Date and time types are converted from serial numbers.
+_TYPED_CONVERTERS = {
+    int: _to_int,
+    float: float,
+    decimal.Decimal: lambda value: decimal.Decimal(six.text_type(value)),
+    bool: _to_bool,
+    str: six.text_type,
+    six.text_type: six.text_type,
+}
+# Number format types of the serial numbers date and time types are
+# converted from, see _TYPED_CONVERTERS
+_TYPED_FORMAT_TYPES = {
+    datetime.date: u"DATE",
+    datetime.datetime: u"DATE_TIME",
+    datetime.time: u"TIME",
+}
+
+
+def _get_typed_column_converter(value_type, property_name):
+    """Get a function converting the values of a column to a type declared
+    in a schema. Empty cells stay "".
+
+    Args:
+      value_type (type): one of the types in _TYPED_CONVERTERS or
+          _TYPED_FORMAT_TYPES
+      property_name (str): property name of the column, for errors
+
+    Returns:
+      function: takes a list of values and returns a list of converted values
+    """
+    convert = _TYPED_CONVERTERS.get(value_type)
+    format_type = _TYPED_FORMAT_TYPES.get(value_type)
+
+    def convert_column(values):
+        try:
+            if format_type is not None:
+                # Convert every serial number at once
+                results = iter(
+                    _convert_serials(
+                        [value for value in values if value != ""], format_type
+                    )
+                )
+                return [value if value == "" else next(results) for value in values]
+            return [value if value == "" else convert(value) for value in values]
+        except (TypeError, ValueError, decimal.InvalidOperation) as error:
+            raise ValueError(
+                "Can't convert {} to {}: {}".format(
+                    property_name, value_type.__name__, error
+                )
+            )
+
+    return convert_column
+
+
+def _convert_values(from_value, values, format_types, property_name):
+    """Convert the values of a column one at a time with from_value.
+
+    Args:
+      from_value (function): from_value method of a cell converter
+      values (list): values of the column
+      format_types (list): number format types of the column's cells
+      property_name (str): property name of the column
+
+    Returns:
+      list: converted values
+    """
+    return [
+        from_value(value=value, format_type=format_type, property_name=property_name)
+        for value, format_type in zip(values, format_types)
+    ]
+
+
+def _is_basic_method(converter, name):
+    """Whether a method of a cell converter is the one of
+    BasicCellConverter, and not overridden or missing.
+
+    Args:
+      converter: cell converter
+      name (str): method name
+
+    Returns:
+      bool: True if the converter uses BasicCellConverter's method
+    """
+    method = getattr(type(converter), name, None)
+    return method is not None and six.get_unbound_function(
+        method
+    ) is six.get_unbound_function(getattr(BasicCellConverter, name))
+
+
+def _converts_cell_values(converter):
+    """Whether the from_cell method of a cell converter is the one of
+    BasicCellConverter, which only converts the cell's unformatted value
+    and number format type with from_value. Columns of cells can then be
+    converted without calling from_cell for each cell.
+
+    Args:
+      converter: cell converter
+
+    Returns:
+      bool: True if cells can be converted from their values
+    """
+    return _is_basic_method(converter, "from_cell")
+
+
 def retry_if_over_write_quota(exception):
     """Returns True if the exception is an insufficient tokens for quota errorr"""
     over_quota = isinstance(
@@ -69,6 +369,176 @@ def retry_if_over_write_quota(exception):
     return over_quota
 
 
+def _grid_data_to_matrices(grid_data):
+    """Convert GridData returned by the API to plain matrices.
+
+    Args:
+      grid_data (dict): GridData with effectiveValue and numberFormat fields
+
+    Returns:
+      tuple: (values, format types) as lists of rows. Empty cells have a
+             value of "" and a format type of None.
+    """
+    values = []
+    format_types = []
+    for row_data in grid_data.get("rowData", []):
+        row_values = []
+        row_format_types = []
+        for cell_data in row_data.get("values", []):
+            effective_value = cell_data.get("effectiveValue")
+            if effective_value:
+                row_values.append(list(effective_value.values())[0])
+            else:
+                row_values.append("")
+            number_format = cell_data.get("userEnteredFormat", {}).get(
+                "numberFormat", {}
+            )
+            row_format_types.append(number_format.get("type"))
+        values.append(row_values)
+        format_types.append(row_format_types)
+    return values, format_types
+
+
+def _get_column(values, format_types, column_number):
+    """Get the values and number format types of one column.
+
+    Args:
+      values (list): rows of unformatted values, starting with column 1
+      format_types (list): rows of number format types, starting with column 1
+      column_number (int): column number
+
+    Returns:
+      tuple: (values, format types) of the column. Trailing empty cells
+             that were not returned are "" with no format type.
+    """
+    index = column_number - 1
+    column_values = []
+    column_format_types = []
+    for row_values, row_format_types in zip(values, format_types):
+        if index < len(row_values):
+            column_values.append(row_values[index])
+            column_format_types.append(row_format_types[index])
+        else:
+            # Trailing empty cells are not returned
+            column_values.append("")
+            column_format_types.append(None)
+    return column_values, column_format_types
+
+
+def _serials_to_seconds(values):
+    """Convert serial numbers to whole seconds since 1899-12-30, rounded
+    like BasicCellConverter.from_value. Requires numpy.
+
+    Args:
+      values (list): serial numbers, "" for empty cells
+
+    Returns:
+      tuple: (numpy int64 array of seconds, numpy bool array that is True
+             for empty cells). Empty cells are 0 seconds.
+    """
+    empty = numpy.array([value == "" for value in values], "bool")
+    serial_days = numpy.array(
+        [0.0 if value == "" else value for value in values], "float64"
+    )
+    # Same rounding as from_value, to the microsecond then to the second
+    microseconds = numpy.round(serial_days * 86400000000).astype("int64")
+    return (microseconds + 500000) // 1000000, empty
+
+
+class _Prefetch(object):
+    """Run a function in a background thread and hand back its result,
+    or raise its exception, when asked for it.
+
+    Args:
+      function (function): function to run
+      kwargs: keyword arguments for function
+    """
+
+    def __init__(self, function, **kwargs):
+        self._result = None
+        self._exc_info = None
+        self._thread = threading.Thread(target=self._run, args=(function, kwargs))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, function, kwargs):
+        try:
+            self._result = function(**kwargs)
+        except Exception:
+            self._exc_info = sys.exc_info()
+
+    def get(self):
+        """Wait for the function to finish.
+
+        Returns:
+          value returned by the function
+        """
+        self._thread.join()
+        if self._exc_info:
+            six.reraise(*self._exc_info)
+        return self._result
+
+
+def _merge_cell_updates(updates):
+    """Merge single cell updates into rectangular ranges. Adjacent cells in
+    a row are merged first, then runs spanning the same columns in
+    consecutive rows are stacked.
+
+    Args:
+      updates (list): (row, column, value) tuples
+
+    Returns:
+      list: (start row, start column, matrix of values) tuples
+    """
+    values = {}
+    for row, column, value in updates:
+        values[(row, column)] = value
+    segments = []
+    segment = None
+    for row, column in sorted(values):
+        if segment and segment[0] == row and segment[2] == column - 1:
+            segment[2] = column
+        else:
+            segment = [row, column, column]
+            segments.append(segment)
+    rectangles = []
+    open_rectangles = {}
+    for row, start_column, end_column in segments:
+        rectangle = open_rectangles.get((start_column, end_column))
+        if rectangle and rectangle[1] == row - 1:
+            rectangle[1] = row
+        else:
+            rectangle = [row, row, start_column, end_column]
+            open_rectangles[(start_column, end_column)] = rectangle
+            rectangles.append(rectangle)
+    merged = []
+    for start_row, end_row, start_column, end_column in rectangles:
+        matrix = [
+            [values[(row, column)] for column in range(start_column, end_column + 1)]
+            for row in range(start_row, end_row + 1)
+        ]
+        merged.append((start_row, start_column, matrix))
+    return merged
+
+
+def _merge_row_ranges(row_numbers):
+    """Merge row numbers into runs of consecutive rows.
+
+    Args:
+      row_numbers (list): row numbers
+
+    Returns:
+      list: (first row, last row) tuples in row order
+    """
+    ranges = []
+    for row in sorted(set(row_numbers)):
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return [tuple(row_range) for row_range in ranges]
+
+
 class ModelMetadata(object):
     """Hold metadata for a Model. This data is primarily used by
        the Repository
@@ -81,30 +551,102 @@ class ModelMetadata(object):
 
     """
 
+    __slots__ = (
+        "repository",
+        "model",
+        "cell_converter",
+        "row",
+        "property_to_column",
+        "property_to_cell",
+        "modified_properties",
+    )
+
     def __init__(self, repository, model, cell_converter):
         self.repository = repository
         self.model = model
         self.cell_converter = cell_converter
+        # Row number in the sheet, set when the first property is added
+        self.row = None
         # Store mappings of property name to column number
         self.property_to_column = {}
         self.property_to_cell = {}
         self.reset_modified_properties()
 
-    def add_cell(self, property_name, cell):
+    def add_cell(self, property_name, cell, convert=True):
         """Used by Repository to populate starting state of Model.
            This bypasses setattr so nothing is marked as modified.
 
         Args:
           name (str): name of property (must be valid python property name)
           cell (pygsheets.Cell): Cell property corresponds to
-          value: value of property
+          convert (bool): Set the property to the cell converted with
+              from_cell. When False the Repository sets it with set_value().
+              Default value = True
         """
+        self.row = cell.row
         self.property_to_cell[property_name] = cell
         self.property_to_column[property_name] = cell.col
-        converted_value = self.cell_converter.from_cell(
-            cell=cell, property_name=property_name
-        )
-        self.model.__dict__[property_name] = converted_value
+        if convert:
+            converted_value = self.cell_converter.from_cell(
+                cell=cell, property_name=property_name
+            )
+            self.set_value(property_name, converted_value)
+
+    def add_value(self, property_name, row, column, value):
+        """Used by Repository to populate starting state of Model from
+           values already converted by the cell converter, without a
+           pygsheets.Cell.
+           This bypasses setattr so nothing is marked as modified.
+
+        Args:
+          property_name (str): name of property (must be valid python property name)
+          row (int): row number of the cell
+          column (int): column number of the cell
+          value: converted value of the property
+        """
+        self.row = row
+        self.property_to_column[property_name] = column
+        self.set_value(property_name, value)
+
+    def get_value(self, property_name):
+        """Get the current value of a property.
+
+        Args:
+          property_name (str): property name
+
+        Returns:
+          value of the property
+        """
+        return getattr(self.model, property_name)
+
+    def set_value(self, property_name, value):
+        """Set the value of a property without marking it as modified.
+
+        Args:
+          property_name (str): property name
+          value: value of the property
+        """
+        object.__setattr__(self.model, property_name, value)
+
+    def get_cell(self, property_name):
+        """Get the pygsheets.Cell a property corresponds to. Cells are
+           only created when asked for, Models loaded from values do not
+           have them.
+
+        Args:
+          property_name (str): property name
+
+        Returns:
+          pygsheets.Cell: cell linked to the worksheet
+        """
+        cell = self.property_to_cell.get(property_name)
+        if cell is None:
+            cell = pygsheets.Cell(
+                (self.row, self.property_to_column[property_name]),
+                worksheet=self.repository.worksheet,
+            )
+            self.property_to_cell[property_name] = cell
+        return cell
 
     def set_modified_property(self, property_name):
         """Mark a property as modified. Used to determine
@@ -113,6 +655,10 @@ class ModelMetadata(object):
         Args:
           property_name (str): property name
         """
+        session = self.repository._session
+        if session is not None:
+            session.track(self.model, property_name)
+        self.repository._discard_from_index(self.model, property_name)
         self.modified_properties.add(property_name)
 
     def reset_modified_properties(self):
@@ -127,28 +673,143 @@ class ModelMetadata(object):
         """
         return self.modified_properties
 
+    def get_pending_updates(self):
+        """Get the values of modified properties as they will be written
+           to the sheet. The cell converter is handed an unlinked copy of
+           each cell, so nothing is sent to the sheet here.
+
+        Returns:
+          list: (row, column, value) tuples, one per modified property
+        """
+        updates = []
+        modified_properties = self.get_modified_properties()
+        if modified_properties and self.row is None:
+            raise DeletedModelException("The row of this Model was deleted")
+        for property_name in modified_properties:
+            column = self.property_to_column[property_name]
+            unlinked_cell = pygsheets.Cell((self.row, column))
+            self.cell_converter.to_cell(
+                cell=unlinked_cell,
+                property_name=property_name,
+                value=self.get_value(property_name),
+            )
+            updates.append((self.row, column, unlinked_cell.value))
+        return updates
+
     def save(self):
-        # TODO: Add batch save code
-        for property_name in self.get_modified_properties():
-            self._save_property(property_name)
-        self.reset_modified_properties()
+        """Save all modified properties in a single batch request.
+        Inside a Repository session the save is deferred until the
+        session is committed.
+        """
+        session = self.repository._session
+        if session is not None:
+            session.save([self.model])
+            return
+        self.repository._save_models([self.model], operation=OPERATION_SAVE)
 
-    @retry(
-        wait_exponential_multiplier=1000,
-        wait_exponential_max=60000,
-        retry_on_exception=retry_if_over_write_quota,
-    )
-    def _save_property(self, property_name):
-        """Save property (cell) with exponential backoff retry up to 60 seconds.
-           Retry specifically happens if you hit API quota.
+
+class ColumnTable(object):
+    """Column oriented storage for the values of a sheet. Holds one list of
+    values per property, so memory grows with the data and not with the
+    number of rows. Used by Repositories created with storage="columns".
+
+    Args:
+      repository (Repository): Repository the table belongs to
+      property_to_column (dict): property names mapped to column numbers
+    """
+
+    def __init__(self, repository, property_to_column):
+        self.repository = repository
+        self.property_to_column = property_to_column
+        self.columns = dict((property_name, []) for property_name in property_to_column)
+        self.row_numbers = []
+        # State kept per row index, only for rows that need it
+        self.modified = {}
+        self.cells = {}
+
+    def __len__(self):
+        return len(self.row_numbers)
+
+
+class ColumnModelMetadata(ModelMetadata):
+    """Metadata for a ColumnarModel. Created on access, all state is kept
+       in the ColumnTable the model is a view of.
+
+    Args:
+      model (ColumnarModel): Which Model to associate with
+
+    """
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, model):
+        table = model._table
+        self._table = table
+        self._index = model._index
+        self.repository = table.repository
+        self.model = model
+        self.cell_converter = table.repository._cell_converter
+        self.row = table.row_numbers[model._index]
+        self.property_to_column = table.property_to_column
+        self.property_to_cell = table.cells.get(model._index, {})
+
+    def set_modified_property(self, property_name):
+        """Mark a property as modified. Used to determine
+           what properties will need to be saved.
+
+        Args:
+          property_name (str): property name
+        """
+        session = self.repository._session
+        if session is not None:
+            session.track(self.model, property_name)
+        self.repository._discard_from_index(self.model, property_name)
+        self._table.modified.setdefault(self._index, set()).add(property_name)
+
+    def reset_modified_properties(self):
+        """On save, reset our modified properties."""
+        self._table.modified.pop(self._index, None)
+
+    def get_modified_properties(self):
+        """Get properties that have been modified.
+        Returns:
+          set: modified properties
+
+        """
+        return self._table.modified.get(self._index, set())
+
+    def get_value(self, property_name):
+        """Get the current value of a property.
 
         Args:
-          property_name (str): property name to save
+          property_name (str): property name
+
+        Returns:
+          value of the property
+        """
+        return self._table.columns[property_name][self._index]
+
+    def set_value(self, property_name, value):
+        """Set the value of a property without marking it as modified.
+
+        Args:
+          property_name (str): property name
+          value: value of the property
         """
-        value = self.model.__dict__[property_name]
-        cell = self.property_to_cell[property_name]
-        # Setting the value on the cell will save the cell
-        self.cell_converter.to_cell(cell=cell, property_name=property_name, value=value)
+        self._table.columns[property_name][self._index] = value
+
+    def get_cell(self, property_name):
+        """Get the pygsheets.Cell a property corresponds to.
+
+        Args:
+          property_name (str): property name
+
+        Returns:
+          pygsheets.Cell: cell linked to the worksheet
+        """
+        cell = super(ColumnModelMetadata, self).get_cell(property_name)
+        self._table.cells[self._index] = self.property_to_cell
+        return cell
 
 
 class Model(object):
@@ -161,6 +822,15 @@ class Model(object):
       cell_convert (int): row number Model corresponds to
     """
 
+    # Subclasses generated by Repository keep their properties in slots
+    __slots__ = ()
+
+    def __new__(cls, *args, **kwargs):
+        if cls is Model:
+            # Models created directly keep their properties in a __dict__
+            cls = _DictModel
+        return object.__new__(cls)
+
     # TODO refactor repository out, not really needed
     def __init__(self, repository, cell_converter=None):
         if not cell_converter:
@@ -185,8 +855,11 @@ class Model(object):
         for column_number, property_name in six.iteritems(
             self.Metadata.repository._col_to_property_name
         ):
+            if property_name not in self.Metadata.property_to_column:
+                # Not loaded, see Repository.get_all(columns=...)
+                continue
             repr_str += '[{}:{}="{}"], '.format(
-                column_number, property_name, self.__dict__[property_name]
+                column_number, property_name, self.Metadata.get_value(property_name)
             )
         repr_str = repr_str.rstrip(" ,") + ">"
         return repr_str
@@ -200,141 +873,2965 @@ class Model(object):
         self.Metadata.save()
 
 
-class SpreadsheetException(Exception):
-    """The exception class for connecting to Google API"""
+class _DictModel(Model):
+    """Model that keeps its properties in a __dict__, created by Model()."""
 
 
-class Repository(object):
-    """This Repository is used to access a sheet and return
-    Model objects which represent each row in the sheet.
-    The first row is assumed to be the header. Column
-    values from the first row will be lowercased and
-    underscores replacing characters to create
-    the property names.
+def _create_model_class(property_names):
+    """Create a Model subclass for a sheet. Each property is stored in a
+    slot, so instances do not need a __dict__ and reading a property is a
+    plain slot lookup. Assignments go through a single dict lookup to find
+    the slot, mark the property modified if the value changed and store it.
 
     Args:
-      pygsheets_worksheet (pygsheets.Worksheet): Worksheet to read/write fro
-      cell_converter: cell_converter allows you to customize the value that is set
-          on the Model for a given property as well as when the value is saved back
-          to the cell. The default is None which means a BasicCellConverter will
-          be instantiated and used.
-          A converter is an object with a two methods.
-          obj.from_cell(pygsheets.Cell, str) and obj.to_cell(pygsheets.Cell, str, str).
-          from_cell will be called to populate the value of a property on Model. It
-          is called for each corresponding cell to property name. Arguments passed
-          are the cell and  property_name.
-          to_cell is called to update the cell with the value currently set on the
-          Model. It is called with pygsheets.Cell, property_name and the current
-          value set on the Model for the given property_name.
-    Returns:
-      Repository
+      property_names (list): property names from the header row
 
+    Returns:
+      type: subclass of Model
     """
+    # Property names are lowercase, so these never collide with them
+    slot_names = ["_Column{}".format(index) for index in range(len(property_names))]
+    model_class = type(
+        str("SheetModel"), (Model,), {"__slots__": tuple(["Metadata"] + slot_names)}
+    )
+    slots = {}
+    for property_name, slot_name in zip(property_names, slot_names):
+        slot = model_class.__dict__[slot_name]
+        setattr(model_class, property_name, slot)
+        slots[property_name] = slot
+    metadata_slot = model_class.__dict__["Metadata"]
 
-    def __init__(self, pygsheets_worksheet, cell_converter=None):
-        self.worksheet = pygsheets_worksheet
-        self._col_to_property_name = {}
-        self._set_header_mappings()
-        # We will cache the models
-        self._models = []
-        # If no cell_converter given, default to our basic one
-        if not cell_converter:
-            cell_converter = BasicCellConverter()
-        self._cell_converter = cell_converter
+    def __setattr__(self, key, value):
+        slot = slots.get(key)
+        if slot is None:
+            if key != "Metadata":
+                raise TypeError("No column corresponds with name {}".format(key))
+            metadata_slot.__set__(self, value)
+        else:
+            try:
+                current = slot.__get__(self, model_class)
+            except AttributeError:
+                raise PropertyNotLoadedException(
+                    "Property {} was not loaded".format(key)
+                )
+            if current != value:
+                # Only set modified if value has actually changed
+                self.Metadata.set_modified_property(key)
+            slot.__set__(self, value)
 
-    def _get_property_name_from_column_header(self, column_header):
-        """Convert a column name into a valid python property.
+    def __getattr__(self, key):
+        # Only called when a slot was never set, see get_all(columns=...)
+        if key in slots:
+            raise PropertyNotLoadedException("Property {} was not loaded".format(key))
+        raise AttributeError(key)
 
-        Args:
-          column_header (str): text from column header
+    model_class.__setattr__ = __setattr__
+    model_class.__getattr__ = __getattr__
+    return model_class
 
-        Returns:
-          str: lowercase alphanumeric with underscores replacing invalid chars
-        """
-        property_name = column_header.lower()
-        # Swap non-alphanumeric with underscores
+
+class ColumnarModel(Model):
+    """Model that is a view of one row of a ColumnTable. Values are read
+    from and written to the table, the model only holds its row index.
+    Models should only be created by Repository.
+
+    Args:
+      table (ColumnTable): table holding the values
+      index (int): index of the row in the table
+    """
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table, index):
+        object.__setattr__(self, "_table", table)
+        object.__setattr__(self, "_index", index)
+
+    @property
+    def Metadata(self):
+        return ColumnModelMetadata(model=self)
+
+    def __getattr__(self, key):
+        # Only called when normal lookup fails, so this is a column
+        table = object.__getattribute__(self, "_table")
+        try:
+            return table.columns[key][object.__getattribute__(self, "_index")]
+        except KeyError:
+            raise AttributeError(key)
+
+    def __setattr__(self, key, value):
+        column = self._table.columns.get(key)
+        if column is None:
+            raise TypeError("No column corresponds with name {}".format(key))
+        if column[self._index] != value:
+            # Only set modified if value has actually changed
+            self.Metadata.set_modified_property(key)
+        column[self._index] = value
+
+
+class Session(object):
+    """Unit of work for a Repository. While a session is active, changes
+    made to Models are recorded but not written. Committing the session
+    writes every change in as few batched range writes as possible.
+    Sessions should be created with Repository.session().
+
+    Args:
+      repository (Repository): Repository to track changes for
+    """
+
+    def __init__(self, repository):
+        self.repository = repository
+        self._models = []
+        # Values of properties before they were first changed in this
+        # session, keyed by id of the model
+        self._original_values = {}
+
+    def __enter__(self):
+        if self.repository._session is not None:
+            raise SessionException("A session is already active for this repository")
+        self.repository._session = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            self.repository._session = None
+        return False
+
+    def track(self, model, property_name):
+        """Record that a property is about to change. Called by ModelMetadata
+        before the new value is set, so the current value is the original.
+
+        Args:
+          model (Model): Model being changed
+          property_name (str): property name
+        """
+        original_values = self._original_values.get(id(model))
+        if original_values is None:
+            original_values = self._original_values[id(model)] = {}
+            self._models.append(model)
+        if property_name not in original_values:
+            was_modified = property_name in model.Metadata.get_modified_properties()
+            original_values[property_name] = (
+                model.Metadata.get_value(property_name),
+                was_modified,
+            )
+
+    def save(self, models):
+        """Queue Models to be saved when the session is committed, with
+        properties they had modified before the session started.
+
+        Args:
+          models (list): Model objects
+        """
+        for model in models:
+            if id(model) in self._original_values:
+                continue
+            if model.Metadata.get_modified_properties():
+                self._original_values[id(model)] = {}
+                self._models.append(model)
+
+    def get_models(self):
+        """Get Models changed in this session.
+
+        Returns:
+          list: Model objects
+        """
+        return list(self._models)
+
+    def commit(self):
+        """Write all pending changes. Properties that were set back to their
+        original value are not written.
+        """
+        for model in self._models:
+            modified_properties = model.Metadata.get_modified_properties()
+            original_values = self._original_values[id(model)]
+            for property_name, (value, was_modified) in six.iteritems(original_values):
+                if (
+                    not was_modified
+                    and model.Metadata.get_value(property_name) == value
+                ):
+                    modified_properties.discard(property_name)
+        self.repository._save_models(self._models)
+        self._clear()
+
+    def rollback(self):
+        """Discard pending changes and restore the values Models had
+        when they were first changed in this session.
+        """
+        for model in self._models:
+            modified_properties = model.Metadata.get_modified_properties()
+            original_values = self._original_values[id(model)]
+            for property_name, (value, was_modified) in six.iteritems(original_values):
+                self.repository._discard_from_index(model, property_name)
+                model.Metadata.set_value(property_name, value)
+                if not was_modified:
+                    modified_properties.discard(property_name)
+        self._clear()
+
+    def _clear(self):
+        self._models = []
+        self._original_values = {}
+
+
+class _HashIndex(object):
+    """Hash index of the cached Models of a Repository by the value of
+    one property. Models whose value is about to change are taken out of
+    the index and added back under their new value on the next lookup.
+
+    Args:
+      property_name (str): property name the index is on
+      unique (bool): whether each value may only belong to one Model
+    """
+
+    def __init__(self, property_name, unique):
+        self.property_name = property_name
+        self.unique = unique
+        # Values mapped to Models keyed by their id
+        self.buckets = {}
+        # Value each indexed Model was indexed under, keyed by its id
+        self.values = {}
+        # Models taken out of the index because their value is changing
+        self.pending = collections.OrderedDict()
+
+    def build(self, models):
+        """Index models, replacing what was indexed before.
+
+        Args:
+          models (list): Model objects
+        """
+        self.buckets = {}
+        self.values = {}
+        self.pending = collections.OrderedDict()
+        for model in models:
+            self.add(model)
+
+    def add(self, model):
+        """Index a Model under its current value. A unique index is left
+        unchanged when the value already belongs to another Model.
+
+        Args:
+          model (Model): Model to index
+
+        Raises:
+          IndexException: if the index is unique and the value is taken
+        """
+        value = getattr(model, self.property_name)
+        bucket = self.buckets.get(value)
+        if self.unique and bucket:
+            raise IndexException(
+                'Value "{}" of unique index {} belongs to more than one row'.format(
+                    value, self.property_name
+                )
+            )
+        if bucket is None:
+            bucket = self.buckets[value] = collections.OrderedDict()
+        bucket[id(model)] = model
+        self.values[id(model)] = value
+
+    def discard(self, model):
+        """Take a Model out of the index until the next lookup. Models
+        that are not indexed are ignored.
+
+        Args:
+          model (Model): Model whose value is about to change
+        """
+        key = id(model)
+        if key not in self.values:
+            return
+        value = self.values.pop(key)
+        bucket = self.buckets[value]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[value]
+        self.pending[key] = model
+
+    def get(self, value):
+        """Get Models indexed under a value.
+
+        Args:
+          value: value of the property
+
+        Returns:
+          list: Model objects
+        """
+        while self.pending:
+            # A Model stays pending until it is indexed, so a clashing
+            # value is reported on every lookup until it is fixed
+            key, model = next(iter(self.pending.items()))
+            self.add(model)
+            del self.pending[key]
+        bucket = self.buckets.get(value)
+        if bucket is None:
+            return []
+        return list(bucket.values())
+
+
+def _matches(function, value, other):
+    """Compare a value with a comparison function. Values that can't be
+    compared, like "" and 10, don't match."""
+    try:
+        return function(value, other)
+    except TypeError:
+        return False
+
+
+def _sort_key(value, descending):
+    """Sort key for a property value that puts empty cells last."""
+    if descending:
+        return (value != "", value)
+    return (value == "", value)
+
+
+class Query(object):
+    """Query over the cached Models of a Repository. Queries should only be
+    created by Repository.query(). Every method that refines a query returns
+    a new Query and leaves the one it was called on unchanged.
+
+    Equality predicates on a property with an index only check the Models
+    the index returns. With storage="columns" predicates are checked one
+    column at a time. Without order_by(), Models are returned in row order
+    and no more rows are checked once limit() Models are found. With both
+    order_by() and limit() only the first limit Models are kept while sorting.
+
+    Args:
+      repository (Repository): Repository to query
+    """
+
+    def __init__(self, repository):
+        self.repository = repository
+        # (property name, comparison function, value) tuples
+        self._predicates = []
+        # (property name, descending) tuples
+        self._order = []
+        self._limit = None
+
+    def _copy(self):
+        query = Query(self.repository)
+        query._predicates = list(self._predicates)
+        query._order = list(self._order)
+        query._limit = self._limit
+        return query
+
+    def _check_property_name(self, property_name):
+        if property_name not in self.repository._get_property_to_column():
+            raise ValueError("No column corresponds with name {}".format(property_name))
+
+    def _where(self, property_name, function, value):
+        self._check_property_name(property_name)
+        query = self._copy()
+        query._predicates.append((property_name, function, value))
+        return query
+
+    def where(self, **kwargs):
+        """Only match Models whose properties equal the given values,
+        e.g. where(status="open").
+
+        Args:
+          kwargs: property names mapped to values
+
+        Returns:
+          Query: refined query
+        """
+        query = self
+        for property_name, value in sorted(six.iteritems(kwargs)):
+            query = query._where(property_name, operator.eq, value)
+        return query
+
+    def where_gt(self, property_name, value):
+        """Only match Models whose property is greater than value.
+
+        Args:
+          property_name (str): property name
+          value: value to compare with
+
+        Returns:
+          Query: refined query
+        """
+        return self._where(property_name, operator.gt, value)
+
+    def where_gte(self, property_name, value):
+        """Only match Models whose property is greater than or equal to value.
+
+        Args:
+          property_name (str): property name
+          value: value to compare with
+
+        Returns:
+          Query: refined query
+        """
+        return self._where(property_name, operator.ge, value)
+
+    def where_lt(self, property_name, value):
+        """Only match Models whose property is less than value.
+
+        Args:
+          property_name (str): property name
+          value: value to compare with
+
+        Returns:
+          Query: refined query
+        """
+        return self._where(property_name, operator.lt, value)
+
+    def where_lte(self, property_name, value):
+        """Only match Models whose property is less than or equal to value.
+
+        Args:
+          property_name (str): property name
+          value: value to compare with
+
+        Returns:
+          Query: refined query
+        """
+        return self._where(property_name, operator.le, value)
+
+    def order_by(self, property_name, descending=False):
+        """Sort Models by a property. Calling order_by() again sorts by
+        another property when the previous ones are equal. Empty cells are
+        sorted last. Raises TypeError if the values can't be compared.
+
+        Args:
+          property_name (str): property name
+          descending (bool): largest values first (Default value = False)
+
+        Returns:
+          Query: refined query
+        """
+        self._check_property_name(property_name)
+        query = self._copy()
+        query._order.append((property_name, descending))
+        return query
+
+    def limit(self, count):
+        """Return at most count Models.
+
+        Args:
+          count (int): maximum number of Models
+
+        Returns:
+          Query: refined query
+        """
+        if count < 0:
+            raise ValueError("Limit must not be negative")
+        query = self._copy()
+        query._limit = count
+        return query
+
+    def all(self):
+        """Run the query.
+
+        Returns:
+          list: matching Model objects
+        """
+        return list(self)
+
+    def first(self):
+        """Run the query for one Model.
+
+        Returns:
+          Model: first matching Model or None if there is none
+        """
+        return next(iter(self.limit(1)), None)
+
+    def __iter__(self):
+        models = self._filter()
+        if self._order:
+            models = self._sort(models)
+        if self._limit is not None:
+            models = itertools.islice(models, self._limit)
+        return iter(models)
+
+    def _filter(self):
+        """Iterate over Models that match all predicates."""
+        repository = self.repository
+        models = repository.get_all()
+        predicates = list(self._predicates)
+        # Start from the smallest index bucket if any predicate can use one
+        buckets = [
+            (repository._indexes[predicate[0]].get(predicate[2]), predicate)
+            for predicate in predicates
+            if predicate[1] is operator.eq and predicate[0] in repository._indexes
+        ]
+        if buckets:
+            models, predicate = min(buckets, key=lambda bucket: len(bucket[0]))
+            predicates.remove(predicate)
+            # Buckets keep the order Models were indexed in, not row order
+            models = sorted(models, key=lambda model: model.Metadata.row)
+        elif repository._storage == STORAGE_COLUMNS and predicates:
+            indexes = range(len(models))
+            for property_name, function, value in predicates:
+                column = repository._table.columns[property_name]
+                indexes = [
+                    index
+                    for index in indexes
+                    if _matches(function, column[index], value)
+                ]
+            return (models[index] for index in indexes)
+        return (
+            model
+            for model in models
+            if all(
+                _matches(function, getattr(model, property_name), value)
+                for property_name, function, value in predicates
+            )
+        )
+
+    def _sort(self, models):
+        """Sort Models, keeping only the first limit Models if there is a limit."""
+        directions = set(descending for _, descending in self._order)
+        if len(directions) > 1:
+            # Stable sorts from the last property to the first
+            models = list(models)
+            for property_name, descending in reversed(self._order):
+                models.sort(
+                    key=lambda model: _sort_key(
+                        getattr(model, property_name), descending
+                    ),
+                    reverse=descending,
+                )
+            return models
+        descending = directions.pop()
+        property_names = [property_name for property_name, _ in self._order]
+
+        def key(model):
+            return tuple(
+                _sort_key(getattr(model, property_name), descending)
+                for property_name in property_names
+            )
+
+        if self._limit is None:
+            return sorted(models, key=key, reverse=descending)
+        if descending:
+            return heapq.nlargest(self._limit, models, key=key)
+        return heapq.nsmallest(self._limit, models, key=key)
+
+
+RefreshResult = collections.namedtuple("RefreshResult", ["added", "updated", "removed"])
+RefreshResult.__doc__ = """Models changed by Repository.refresh().
+
+Args:
+  added (list): Models for rows that were not cached
+  updated (list): cached Models whose values or row number changed
+  removed (list): cached Models whose rows are gone
+"""
+
+SyncResult = collections.namedtuple("SyncResult", ["added", "updated", "removed"])
+SyncResult.__doc__ = """Models changed by Repository.sync().
+
+Args:
+  added (list): Models for rows added for new keys
+  updated (list): cached Models whose values changed
+  removed (list): cached Models whose rows were deleted
+"""
+
+
+def _values_differ(current, value):
+    """Check if a value differs from the current value of a property.
+    Date cells load as dates, so a datetime at midnight on that date, e.g.
+    from a pandas Timestamp, is the same value.
+
+    Args:
+      current: current value of the property
+      value: new value
+
+    Returns:
+      bool: True if the value differs
+    """
+    if (
+        isinstance(current, datetime.date)
+        and not isinstance(current, datetime.datetime)
+        and isinstance(value, datetime.datetime)
+    ):
+        return value.time() != datetime.time() or value.date() != current
+    return current != value
+
+
+def _get_dataframe_records(frame):
+    """Convert the rows of a pandas DataFrame to dicts of plain values.
+
+    Args:
+      frame (pandas.DataFrame): DataFrame with property names as column names
+
+    Returns:
+      list: dicts of property names to values. Missing values are None and
+            timestamps are datetimes.
+    """
+    records = frame.to_dict("records")
+    for record in records:
+        for property_name, value in list(six.iteritems(record)):
+            if pandas.isnull(value):
+                record[property_name] = None
+            elif isinstance(value, pandas.Timestamp):
+                record[property_name] = value.to_pydatetime()
+    return records
+
+
+class SnapshotCache(object):
+    """Keeps the header and values of sheets in a SQLite database so a
+    Repository can load them from disk instead of the Sheets API when the
+    spreadsheet has not changed since they were stored.
+
+    Snapshots are keyed by spreadsheet id and sheet title. Each one records
+    the spreadsheet revision (its Drive modified time) it was fetched at and
+    is only used while the spreadsheet still has that revision. Values are
+    stored as fetched, before cell converters are applied.
+
+    Args:
+      path (str): SQLite database file. It is created if it doesn't exist.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS snapshots ("
+                    "spreadsheet_id TEXT NOT NULL, "
+                    "sheet_title TEXT NOT NULL, "
+                    "revision TEXT NOT NULL, "
+                    "data BLOB NOT NULL, "
+                    "PRIMARY KEY (spreadsheet_id, sheet_title))"
+                )
+        finally:
+            connection.close()
+
+    def _connect(self):
+        # A connection per call so a cache can be shared between threads
+        return sqlite3.connect(self.path)
+
+    def load(self, spreadsheet_id, sheet_title, revision):
+        """Get the snapshot stored for a sheet if it is at a revision.
+
+        Args:
+          spreadsheet_id (str): id of the spreadsheet
+          sheet_title (str): title of the sheet
+          revision (str): current revision of the spreadsheet
+
+        Returns:
+          tuple: (header, values, format types) or None if there is no
+                 snapshot at revision. Header maps column numbers to
+                 property names, values and format types are lists of rows.
+        """
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT data FROM snapshots "
+                "WHERE spreadsheet_id = ? AND sheet_title = ? AND revision = ?",
+                (spreadsheet_id, sheet_title, revision),
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        data = json.loads(zlib.decompress(bytes(row[0])).decode("utf-8"))
+        header = dict((int(col), name) for col, name in data["header"].items())
+        return header, data["values"], data["format_types"]
+
+    def store(
+        self, spreadsheet_id, sheet_title, revision, header, values, format_types
+    ):
+        """Replace the snapshot of a sheet.
+
+        Args:
+          spreadsheet_id (str): id of the spreadsheet
+          sheet_title (str): title of the sheet
+          revision (str): revision of the spreadsheet the data was fetched at
+          header (dict): column numbers mapped to property names
+          values (list): rows of unformatted values
+          format_types (list): rows of number format types
+        """
+        data = json.dumps(
+            {"header": header, "values": values, "format_types": format_types},
+            separators=(",", ":"),
+        )
+        blob = sqlite3.Binary(zlib.compress(data.encode("utf-8")))
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO snapshots "
+                    "(spreadsheet_id, sheet_title, revision, data) "
+                    "VALUES (?, ?, ?, ?)",
+                    (spreadsheet_id, sheet_title, revision, blob),
+                )
+        finally:
+            connection.close()
+
+    def delete(self, spreadsheet_id, sheet_title):
+        """Remove the snapshot of a sheet if there is one.
+
+        Args:
+          spreadsheet_id (str): id of the spreadsheet
+          sheet_title (str): title of the sheet
+        """
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "DELETE FROM snapshots WHERE spreadsheet_id = ? AND sheet_title = ?",
+                    (spreadsheet_id, sheet_title),
+                )
+        finally:
+            connection.close()
+
+
+class _ClientPool(object):
+    """Authorized pygsheets clients by service account file, and the
+    spreadsheets opened with them, shared by the whole process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._spreadsheets = {}
+
+    def get_client(self, service_account_file):
+        """Get the client for a service account file, authorizing it the
+        first time.
+
+        Args:
+          service_account_file (str): Service account key file (JSON)
+
+        Returns:
+          pygsheets.Client: authorized client
+        """
+        with self._lock:
+            client = self._clients.get(service_account_file)
+            if client is None:
+                client = pygsheets.authorize(service_account_file=service_account_file)
+                self._clients[service_account_file] = client
+            return client
+
+    def get_spreadsheet(self, service_account_file, spreadsheet_id):
+        """Get a spreadsheet opened with the client for a service account
+        file, opening it the first time.
+
+        Args:
+          service_account_file (str): Service account key file (JSON)
+          spreadsheet_id (str): id of the spreadsheet
+
+        Returns:
+          pygsheets.Spreadsheet: opened spreadsheet
+        """
+        key = (service_account_file, spreadsheet_id)
+        client = self.get_client(service_account_file)
+        with self._lock:
+            spreadsheet = self._spreadsheets.get(key)
+        if spreadsheet is not None:
+            return spreadsheet
+        # Waiting for the rate limiter or the API must not block threads
+        # getting other spreadsheets
+        if _default_rate_limiter is not None:
+            _default_rate_limiter.acquire(REQUEST_READ)
+        with _get_client_lock(client):
+            spreadsheet = client.open_by_key(spreadsheet_id)
+        with self._lock:
+            # Keep the spreadsheet of a thread that opened it first
+            return self._spreadsheets.setdefault(key, spreadsheet)
+
+    def clear(self):
+        """Forget all clients and spreadsheets."""
+        with self._lock:
+            self._clients.clear()
+            self._spreadsheets.clear()
+
+
+_CLIENT_POOL = _ClientPool()
+
+
+def clear_client_pool():
+    """Forget the clients and spreadsheets kept by
+    Repository.get_repository_with_creds(), so the next call authorizes and
+    opens them again. Repositories already created keep working."""
+    _CLIENT_POOL.clear()
+
+
+# Requests made through one client share its HTTP connection, which isn't
+# thread safe, so every Repository using the client takes the same lock
+_CLIENT_LOCKS = weakref.WeakKeyDictionary()
+_CLIENT_LOCKS_LOCK = threading.Lock()
+
+
+def _get_client_lock(client):
+    """Get the lock for requests made through a client.
+
+    Args:
+      client (pygsheets.Client): client, or None for a lock of its own
+
+    Returns:
+      threading.RLock: lock
+    """
+    if client is None:
+        return threading.RLock()
+    with _CLIENT_LOCKS_LOCK:
+        lock = _CLIENT_LOCKS.get(client)
+        if lock is None:
+            lock = _CLIENT_LOCKS[client] = threading.RLock()
+        return lock
+
+
+RateLimiterStats = collections.namedtuple(
+    "RateLimiterStats", ["requests", "waiting", "wait_seconds"]
+)
+RateLimiterStats.__doc__ = """Activity of one kind of request in a RateLimiter.
+
+Args:
+  requests (int): requests let through so far
+  waiting (int): requests waiting for their turn right now
+  wait_seconds (float): total time requests have waited
+"""
+
+
+class _TokenBucket(object):
+    """Token bucket that lets requests through at a steady rate, with
+    bursts of up to capacity requests. Each request takes a token as it
+    arrives, and waits until the bucket would have refilled it.
+
+    Args:
+      rate (float): tokens added per second
+      capacity (float): most tokens the bucket holds
+      clock (function): returns the current time in seconds
+      sleep (function): sleeps for a number of seconds
+    """
+
+    def __init__(self, rate, capacity, clock, sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = capacity
+        self._updated = clock()
+        self._requests = 0
+        self._waiting = 0
+        self._wait_seconds = 0.0
+
+    def acquire(self):
+        """Take a token, waiting as long as it takes to get one.
+
+        Returns:
+          float: seconds waited
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Tokens go negative while requests wait, so later requests
+            # queue behind them
+            self._tokens -= 1
+            wait = max(0.0, -self._tokens / self.rate)
+            self._waiting += 1
+        try:
+            if wait:
+                self._sleep(wait)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                self._requests += 1
+                self._wait_seconds += wait
+        return wait
+
+    def get_stats(self):
+        """Get activity so far.
+
+        Returns:
+          RateLimiterStats: requests, waiting requests and seconds waited
+        """
+        with self._lock:
+            return RateLimiterStats(
+                requests=self._requests,
+                waiting=self._waiting,
+                wait_seconds=self._wait_seconds,
+            )
+
+
+class RateLimiter(object):
+    """Paces Sheets API read and write requests so they stay under quota
+    instead of being rejected and retried. Share one RateLimiter between
+    Repositories, or set it for all of them with set_default_rate_limiter(),
+    so their requests are paced together. The defaults are the per user
+    quota of the Sheets API. Requests rejected for quota are still retried.
+
+    Args:
+      reads_per_minute (float): read requests allowed per minute.
+          Default value = 60
+      writes_per_minute (float): write requests allowed per minute.
+          Default value = 60
+      burst (int): requests that can be made at once after a quiet period.
+          Default value = 10
+      clock (function): returns the current time in seconds. None means
+          time.monotonic, or time.time where there is no monotonic clock.
+          Default value = None
+      sleep (function): sleeps for a number of seconds
+          Default value = time.sleep
+
+    """
+
+    def __init__(
+        self,
+        reads_per_minute=60,
+        writes_per_minute=60,
+        burst=10,
+        clock=None,
+        sleep=time.sleep,
+    ):
+        if clock is None:
+            clock = getattr(time, "monotonic", time.time)
+        self._buckets = {
+            REQUEST_READ: _TokenBucket(
+                rate=reads_per_minute / 60.0, capacity=burst, clock=clock, sleep=sleep
+            ),
+            REQUEST_WRITE: _TokenBucket(
+                rate=writes_per_minute / 60.0, capacity=burst, clock=clock, sleep=sleep
+            ),
+        }
+
+    def acquire(self, kind):
+        """Wait until a request may be made.
+
+        Args:
+          kind (str): REQUEST_READ or REQUEST_WRITE
+
+        Returns:
+          float: seconds waited
+        """
+        return self._buckets[kind].acquire()
+
+    def get_stats(self, kind):
+        """Get activity for one kind of request, e.g. to watch queue depth
+        and time spent waiting.
+
+        Args:
+          kind (str): REQUEST_READ or REQUEST_WRITE
+
+        Returns:
+          RateLimiterStats: requests, waiting requests and seconds waited
+        """
+        return self._buckets[kind].get_stats()
+
+
+_default_rate_limiter = None
+
+
+def set_default_rate_limiter(rate_limiter):
+    """Set the RateLimiter used by Repositories created without one.
+
+    Args:
+      rate_limiter (RateLimiter): RateLimiter to share, or None to stop
+          pacing requests
+    """
+    global _default_rate_limiter
+    _default_rate_limiter = rate_limiter
+
+
+OperationStats = collections.namedtuple(
+    "OperationStats",
+    ["requests", "errors", "seconds", "payload_bytes", "retries", "backoff_seconds"],
+)
+OperationStats.__doc__ = """Requests made for one kind of Repository operation.
+
+Args:
+  requests (int): requests made, including ones that failed
+  errors (int): requests that raised
+  seconds (float): total time spent in requests
+  payload_bytes (int): total size of the JSON sent or received, where known
+  retries (int): times a request was retried because the quota was hit
+  backoff_seconds (float): total time spent waiting to retry
+"""
+
+
+class Metrics(object):
+    """Receives a record of every Sheets API request a Repository makes.
+    Subclass it and override the methods to send requests to a metrics
+    system. Operations are the OPERATION_* constants. Methods are called
+    from whichever thread made the request.
+    """
+
+    def record_request(self, operation, seconds, payload_bytes, error):
+        """Called after each request.
+
+        Args:
+          operation (str): operation the request was made for
+          seconds (float): time the request took
+          payload_bytes (int): size of the JSON sent or received, None if
+              it isn't known
+          error (bool): True if the request raised
+        """
+
+    def record_backoff(self, operation, seconds):
+        """Called before waiting to retry a request that hit the quota.
+
+        Args:
+          operation (str): operation the request was made for
+          seconds (float): time that will be waited
+        """
+
+
+class RequestStats(Metrics):
+    """Metrics that keeps totals for each operation in memory, e.g. to log
+    how many requests a job made at its end.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _add(self, operation, **kwargs):
+        with self._lock:
+            stats = self._stats.get(operation) or OperationStats(0, 0, 0.0, 0, 0, 0.0)
+            self._stats[operation] = stats._replace(
+                **dict(
+                    (name, getattr(stats, name) + value)
+                    for name, value in six.iteritems(kwargs)
+                )
+            )
+
+    def record_request(self, operation, seconds, payload_bytes, error):
+        self._add(
+            operation,
+            requests=1,
+            errors=int(error),
+            seconds=seconds,
+            payload_bytes=payload_bytes or 0,
+        )
+
+    def record_backoff(self, operation, seconds):
+        self._add(operation, retries=1, backoff_seconds=seconds)
+
+    def get_stats(self, operation):
+        """Get the totals for one operation.
+
+        Args:
+          operation (str): one of the OPERATION_* constants
+
+        Returns:
+          OperationStats: totals so far
+        """
+        with self._lock:
+            return self._stats.get(operation) or OperationStats(0, 0, 0.0, 0, 0, 0.0)
+
+    def get_all_stats(self):
+        """Get the totals of every operation that made a request.
+
+        Returns:
+          dict: operations mapped to OperationStats
+        """
+        with self._lock:
+            return dict(self._stats)
+
+
+class StatsdMetrics(Metrics):
+    """Metrics that sends counters and timers to StatsD, named
+    <prefix>.<operation>.<metric>.
+
+    Args:
+      client: StatsD client with incr(name, count) and timing(name, ms)
+          methods, e.g. statsd.StatsClient
+      prefix (str): prefix of metric names. Default value = "pygsheetsorm"
+
+    """
+
+    def __init__(self, client, prefix="pygsheetsorm"):
+        self.client = client
+        self.prefix = prefix
+
+    def _name(self, operation, metric):
+        return "{}.{}.{}".format(self.prefix, operation, metric)
+
+    def record_request(self, operation, seconds, payload_bytes, error):
+        self.client.incr(self._name(operation, "requests"), 1)
+        self.client.timing(self._name(operation, "latency"), seconds * 1000)
+        if error:
+            self.client.incr(self._name(operation, "errors"), 1)
+        if payload_bytes is not None:
+            self.client.incr(self._name(operation, "payload_bytes"), payload_bytes)
+
+    def record_backoff(self, operation, seconds):
+        self.client.incr(self._name(operation, "retries"), 1)
+        self.client.timing(self._name(operation, "backoff"), seconds * 1000)
+
+
+class PrometheusMetrics(Metrics):
+    """Metrics that keeps Prometheus counters and a latency histogram,
+    labelled by operation. Requires prometheus_client.
+
+    Args:
+      registry (prometheus_client.CollectorRegistry): registry for the
+          metrics. None means the default registry. Default value = None
+      namespace (str): prefix of metric names. Default value = "pygsheetsorm"
+
+    """
+
+    def __init__(self, registry=None, namespace="pygsheetsorm"):
+        if prometheus_client is None:
+            raise ImportError("PrometheusMetrics requires prometheus_client")
+        if registry is None:
+            registry = prometheus_client.REGISTRY
+        labels = ["operation"]
+        self.requests = prometheus_client.Counter(
+            "requests_total",
+            "Sheets API requests",
+            labels,
+            namespace=namespace,
+            registry=registry,
+        )
+        self.errors = prometheus_client.Counter(
+            "request_errors_total",
+            "Sheets API requests that failed",
+            labels,
+            namespace=namespace,
+            registry=registry,
+        )
+        self.latency = prometheus_client.Histogram(
+            "request_seconds",
+            "Time taken by Sheets API requests",
+            labels,
+            namespace=namespace,
+            registry=registry,
+        )
+        self.payload = prometheus_client.Counter(
+            "payload_bytes_total",
+            "JSON sent or received by Sheets API requests",
+            labels,
+            namespace=namespace,
+            registry=registry,
+        )
+        self.retries = prometheus_client.Counter(
+            "retries_total",
+            "Sheets API requests retried because the quota was hit",
+            labels,
+            namespace=namespace,
+            registry=registry,
+        )
+        self.backoff = prometheus_client.Counter(
+            "backoff_seconds_total",
+            "Time spent waiting to retry Sheets API requests",
+            labels,
+            namespace=namespace,
+            registry=registry,
+        )
+
+    def record_request(self, operation, seconds, payload_bytes, error):
+        self.requests.labels(operation).inc()
+        self.latency.labels(operation).observe(seconds)
+        if error:
+            self.errors.labels(operation).inc()
+        if payload_bytes is not None:
+            self.payload.labels(operation).inc(payload_bytes)
+
+    def record_backoff(self, operation, seconds):
+        self.retries.labels(operation).inc()
+        self.backoff.labels(operation).inc(seconds)
+
+
+_default_metrics = None
+
+
+def set_default_metrics(metrics):
+    """Set the Metrics used by Repositories created without one.
+
+    Args:
+      metrics (Metrics): Metrics to record requests with, or None to stop
+          recording them
+    """
+    global _default_metrics
+    _default_metrics = metrics
+
+
+class _RequestRecord(object):
+    """Payload of a request being recorded, see _record_request()."""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.payload_bytes = None
+
+    def set_payload(self, payload):
+        """Measure the JSON sent or received. Does nothing when no
+        Metrics are recording, since large payloads take a while to encode.
+
+        Args:
+          payload: JSON serializable body
+        """
+        if self.enabled:
+            self.payload_bytes = len(json.dumps(payload, separators=(",", ":")))
+
+
+@contextlib.contextmanager
+def _record_request(metrics, operation):
+    """Context for timing a request and recording it with metrics. Yields
+    a _RequestRecord to set the payload on.
+
+    Args:
+      metrics (Metrics): Metrics to record with, or None to not record
+      operation (str): one of the OPERATION_* constants
+    """
+    record = _RequestRecord(enabled=metrics is not None)
+    if metrics is None:
+        yield record
+        return
+    clock = getattr(time, "monotonic", time.time)
+    start = clock()
+    try:
+        yield record
+    except Exception:
+        metrics.record_request(operation, clock() - start, record.payload_bytes, True)
+        raise
+    metrics.record_request(operation, clock() - start, record.payload_bytes, False)
+
+
+def _retry_over_quota(operation):
+    """Decorate a Repository method to retry it with exponential backoff
+    up to 60 seconds while the API quota is hit. Each backoff is recorded
+    with the Repository's metrics, under the operation keyword argument of
+    the call if it has one.
+
+    Args:
+      operation (str): one of the OPERATION_* constants
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def retry_method(self, *args, **kwargs):
+            call_operation = kwargs.get("operation", operation)
+
+            def wait(attempt_number, delay_since_first_attempt_ms):
+                wait_ms = min(1000 * pow(2, attempt_number), 60000)
+                self._record_backoff(call_operation, wait_ms / 1000.0)
+                return wait_ms
+
+            retrying = Retrying(
+                wait_func=wait, retry_on_exception=retry_if_over_write_quota
+            )
+            return retrying.call(method, self, *args, **kwargs)
+
+        return retry_method
+
+    return decorator
+
+
+class Profiler(object):
+    """Records where Repository.get_all() spends its time: wall time per
+    phase, per column and per converter method. Pass one to a Repository
+    to turn profiling on. Without one, loading only checks that there is
+    none.
+
+    Phases are the PHASE_* constants and don't overlap, e.g. time spent
+    converting values while building Models counts as conversion only.
+    Columns are property names, converters are "<class>.<method>".
+    Use a Profiler from one thread at a time.
+
+    Args:
+      clock (function): returns the current time in seconds. None means
+          timeit.default_timer. Default value = None
+
+    """
+
+    def __init__(self, clock=None):
+        self._clock = clock or timeit.default_timer
+        self._totals = {}
+        # Time spent in phases nested in each running timer
+        self._nested = []
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        self._totals = dict((section, {}) for section in PROFILE_SECTIONS)
+        self._nested = []
+
+    def start(self):
+        """Start timing. Timers can be nested.
+
+        Returns:
+          float: start time to pass to stop()
+        """
+        self._nested.append(0.0)
+        return self._clock()
+
+    def stop(self, start, phase=None, column=None, converter=None):
+        """Stop the timer started last and record its time.
+
+        Args:
+          start (float): value returned by start()
+          phase (str): phase to record the time under, less the time of
+              phases nested in it. Default value = None
+          column (str): column to record the time under. Default value = None
+          converter (str): converter to record the time under.
+              Default value = None
+        """
+        elapsed = self._clock() - start
+        nested = self._nested.pop()
+        if phase is not None:
+            self._add(PROFILE_PHASES, phase, elapsed - nested)
+            nested = elapsed
+        if self._nested:
+            self._nested[-1] += nested
+        if column is not None:
+            self._add(PROFILE_COLUMNS, column, elapsed)
+        if converter is not None:
+            self._add(PROFILE_CONVERTERS, converter, elapsed)
+
+    @contextlib.contextmanager
+    def time(self, phase):
+        """Context that records the time of its block under a phase.
+
+        Args:
+          phase (str): one of the PHASE_* constants
+        """
+        start = self.start()
+        try:
+            yield
+        finally:
+            self.stop(start, phase=phase)
+
+    def _add(self, section, name, seconds):
+        totals = self._totals[section].get(name)
+        if totals is None:
+            self._totals[section][name] = [1, seconds]
+        else:
+            totals[0] += 1
+            totals[1] += seconds
+
+    def get_report(self):
+        """Get everything recorded so far.
+
+        Returns:
+          dict: "phases", "columns" and "converters", each mapping names to
+                dicts of "calls" and "seconds"
+        """
+        return dict(
+            (
+                section,
+                dict(
+                    (name, {"calls": calls, "seconds": seconds})
+                    for name, (calls, seconds) in six.iteritems(totals)
+                ),
+            )
+            for section, totals in six.iteritems(self._totals)
+        )
+
+    def to_json(self, **kwargs):
+        """Get the report as JSON, see get_report().
+
+        Args:
+          kwargs: Other arguments for json.dumps
+
+        Returns:
+          str: JSON report
+        """
+        return json.dumps(self.get_report(), sort_keys=True, **kwargs)
+
+
+class _ProfiledConverter(object):
+    """Cell converter that times the from_* methods of another cell
+    converter with a Profiler, per column and per converter method.
+
+    Args:
+      converter: cell converter to time
+      profiler (Profiler): Profiler to record with
+      phase (str): phase to record the time under as well.
+          Default value = None
+
+    """
+
+    def __init__(self, converter, profiler, phase=None):
+        self._converter = converter
+        self._profiler = profiler
+        self._phase = phase
+
+    def __getattr__(self, name):
+        attribute = getattr(self._converter, name)
+        converter_name = "{}.{}".format(type(self._converter).__name__, name)
+        if name == "get_column_converter":
+
+            def get_column_converter(format_type, property_name):
+                column_converter = attribute(
+                    format_type=format_type, property_name=property_name
+                )
+                if column_converter is None:
+                    return None
+                return _profile_function(
+                    column_converter,
+                    profiler=self._profiler,
+                    converter_name=converter_name,
+                    phase=self._phase,
+                    column=property_name,
+                )
+
+            return get_column_converter
+        if not name.startswith("from_"):
+            return attribute
+        return _profile_function(
+            attribute,
+            profiler=self._profiler,
+            converter_name=converter_name,
+            phase=self._phase,
+        )
+
+
+def _profile_function(function, profiler, converter_name, phase=None, column=None):
+    """Wrap a conversion function so each call is timed with a Profiler.
+
+    Args:
+      function (function): function to time
+      profiler (Profiler): Profiler to record with
+      converter_name (str): converter to record the time under
+      phase (str): phase to record the time under as well.
+          Default value = None
+      column (str): column to record the time under. None means the
+          property_name keyword argument of each call. Default value = None
+
+    Returns:
+      function: function taking the same arguments
+    """
+
+    def profiled(*args, **kwargs):
+        start = profiler.start()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.stop(
+                start,
+                phase=phase,
+                column=column or kwargs.get("property_name"),
+                converter=converter_name,
+            )
+
+    return profiled
+
+
+class SessionException(Exception):
+    """The exception class for Repository sessions"""
+
+
+class IndexException(Exception):
+    """The exception class for Repository indexes"""
+
+
+class SpreadsheetException(Exception):
+    """The exception class for connecting to Google API"""
+
+
+class DeletedModelException(Exception):
+    """The exception class for saving a Model whose row was deleted"""
+
+
+class PropertyNotLoadedException(AttributeError):
+    """The exception class for properties a Model loaded with
+    Repository.get_all(columns=...) doesn't have"""
+
+
+class Repository(object):
+    """This Repository is used to access a sheet and return
+    Model objects which represent each row in the sheet.
+    The first row is assumed to be the header. Column
+    values from the first row will be lowercased and
+    underscores replacing characters to create
+    the property names.
+
+    Args:
+      pygsheets_worksheet (pygsheets.Worksheet): Worksheet to read/write fro
+      cell_converter: cell_converter allows you to customize the value that is set
+          on the Model for a given property as well as when the value is saved back
+          to the cell. The default is None which means a BasicCellConverter will
+          be instantiated and used.
+          A converter is an object with a two methods.
+          obj.from_cell(pygsheets.Cell, str) and obj.to_cell(pygsheets.Cell, str, str).
+          from_cell will be called to populate the value of a property on Model. It
+          is called for each corresponding cell to property name. Arguments passed
+          are the cell and  property_name.
+          to_cell is called to update the cell with the value currently set on the
+          Model. It is called with pygsheets.Cell, property_name and the current
+          value set on the Model for the given property_name. The cell passed
+          to to_cell is unlinked; the value assigned to it is collected and
+          written with other modified cells in a batch request.
+      fast_load (bool): Load rows as plain value and number format matrices
+          fetched in a single request instead of as pygsheets.Cell objects.
+          Requires a cell_converter that implements from_value.
+          Default value = False
+      storage (str): How values are kept in memory. "rows" keeps values on
+          each Model. "columns" keeps one list of values per column in a
+          ColumnTable and Models are views of a row in it. "columns" always
+          loads like fast_load and requires a cell_converter that implements
+          from_value. Default value = "rows"
+      snapshot_cache (SnapshotCache): Keep the header and values of the sheet
+          in a SnapshotCache. While the spreadsheet is unchanged they are
+          loaded from it instead of being fetched. Loads like fast_load when
+          the cell_converter implements from_value, otherwise the cache is
+          not used. Default value = None
+      rate_limiter (RateLimiter): Pace requests with this RateLimiter. None
+          means the one set with set_default_rate_limiter(), if any.
+          Default value = None
+      metrics (Metrics): Record every request with this Metrics. None
+          means the one set with set_default_metrics(), if any.
+          Default value = None
+      profiler (Profiler): Record where get_all() spends its time with
+          this Profiler. None means not to profile. Default value = None
+      lazy (bool): Don't make any request until the Repository is used.
+          The header row is then fetched in the same request as the rows
+          when get_all() loads them, or on its own if something else needs
+          it first. Default value = False
+      header (list): Values of the header row, when they are known. The
+          header row is then never fetched. They must match the sheet's
+          header row, otherwise values are read from and written to the
+          wrong columns. Default value = None
+      schema (dict): Property names mapped to the type their values are
+          converted to instead of using the cell_converter. Types are int,
+          float, decimal.Decimal, bool, str, datetime.date,
+          datetime.datetime and datetime.time. Dates and times are read
+          from serial numbers. Empty cells are "". A value that can't be
+          converted raises ValueError. Default value = None
+    Returns:
+      Repository
+
+    """
+
+    def __init__(
+        self,
+        pygsheets_worksheet,
+        cell_converter=None,
+        fast_load=False,
+        storage=STORAGE_ROWS,
+        snapshot_cache=None,
+        rate_limiter=None,
+        metrics=None,
+        profiler=None,
+        lazy=False,
+        header=None,
+        schema=None,
+        _preloaded=None,
+    ):
+        self.worksheet = pygsheets_worksheet
+        self._schema = dict(schema or {})
+        for property_name, value_type in six.iteritems(self._schema):
+            if value_type not in _TYPED_CONVERTERS and (
+                value_type not in _TYPED_FORMAT_TYPES
+            ):
+                raise ValueError(
+                    "Can't convert {} to {}".format(property_name, value_type)
+                )
+        # Column numbers mapped to property names, None until the header
+        # is loaded, see _col_to_property_name
+        self._header = None
+        self._rate_limiter = rate_limiter
+        self._metrics = metrics
+        self._profiler = profiler
+        # Requests can be made from a prefetch thread, see iter_all(), and
+        # by other Repositories sharing the client
+        self._api_lock = _get_client_lock(getattr(pygsheets_worksheet, "client", None))
+        if snapshot_cache is not None and not hasattr(
+            cell_converter or BasicCellConverter, "from_value"
+        ):
+            LOG.debug("Cell converter has no from_value, not using snapshot cache")
+            snapshot_cache = None
+        self._snapshot_cache = snapshot_cache
+        # Revision of the spreadsheet the cached models were loaded at
+        self._revision = None
+        # Values loaded with the header, until get_all() uses them
+        self._preloaded = None
+        if _preloaded is not None:
+            # (header values, values, format types) fetched by load_many()
+            header_values, values, format_types = _preloaded
+            self._set_header_mappings(header_values=header_values)
+            self._preloaded = (values, format_types)
+        elif header is not None:
+            self._set_header_mappings(header_values=header)
+        elif not lazy:
+            self._load_header()
+        # We will cache the models
+        self._models = []
+        # Active unit of work, see session()
+        self._session = None
+        # If no cell_converter given, default to our basic one
+        if not cell_converter:
+            cell_converter = BasicCellConverter()
+        self._cell_converter = cell_converter
+        if storage not in (STORAGE_ROWS, STORAGE_COLUMNS):
+            raise ValueError("Unknown storage {}".format(storage))
+        if snapshot_cache is not None or _preloaded is not None:
+            fast_load = True
+        if not hasattr(cell_converter, "from_value"):
+            if fast_load or storage == STORAGE_COLUMNS:
+                LOG.debug("Cell converter has no from_value, loading cells instead")
+            fast_load = False
+            storage = STORAGE_ROWS
+        self._fast_load = fast_load
+        self._storage = storage
+        # Values of all rows when storage is "columns"
+        self._table = None
+        # Model subclass generated from the header row
+        self._model_class = None
+        # Hash indexes of the cached models by property name
+        self._indexes = {}
+
+    def _get_property_name_from_column_header(self, column_header):
+        """Convert a column name into a valid python property.
+
+        Args:
+          column_header (str): text from column header
+
+        Returns:
+          str: lowercase alphanumeric with underscores replacing invalid chars
+        """
+        property_name = column_header.lower()
+        # Swap non-alphanumeric with underscores
         property_name = re.sub("[^0-9a-zA-Z]+", "_", property_name)
         # Swap leading numbers with underscores
         property_name = re.sub("^[0-9]+", "_", property_name)
         return property_name
 
-    def _set_header_mappings(self):
-        """Populate a dict to map column numbers to python property names."""
-        header_row = self.worksheet.get_row(
-            1, include_tailing_empty=False, returnas="cells"
+    @property
+    def _col_to_property_name(self):
+        """Column numbers mapped to property names. The header is loaded
+        the first time it is needed."""
+        if self._header is None:
+            self._load_header()
+        return self._header
+
+    def _load_header(self):
+        """Load the header mappings, with the values of the sheet from the
+        snapshot cache if it has them, otherwise fetch the header row."""
+        if self._snapshot_cache is not None:
+            self._load_snapshot()
+        if self._header is None:
+            self._set_header_mappings()
+
+    def _set_header_mappings(self, header_values=None):
+        """Populate a dict to map column numbers to python property names.
+
+        Args:
+          header_values (list): values of the header row. Fetched from the
+              sheet if None (Default value = None)
+        """
+        if header_values is None:
+            with self._api_request(REQUEST_READ, OPERATION_HEADER):
+                header_row = self.worksheet.get_row(
+                    1, include_tailing_empty=False, returnas="cells"
+                )
+            header_values = dict((cell.col, cell.value) for cell in header_row)
+        else:
+            header_values = dict(enumerate(header_values, 1))
+        col_to_property_name = {}
+        for column, value in six.iteritems(header_values):
+            property_name = self._get_property_name_from_column_header(
+                six.text_type(value)
+            )
+            col_to_property_name[column] = property_name
+        self._header = col_to_property_name
+
+    @contextlib.contextmanager
+    def _api_request(self, kind, operation):
+        """Context for making a Sheets API request. Waits for the rate
+        limiter, then holds the lock of the client while the request is
+        timed and recorded. Yields a _RequestRecord to set the payload on.
+
+        Args:
+          kind (str): REQUEST_READ or REQUEST_WRITE
+          operation (str): one of the OPERATION_* constants
+        """
+        rate_limiter = self._rate_limiter or _default_rate_limiter
+        if rate_limiter is not None:
+            rate_limiter.acquire(kind)
+        with self._api_lock:
+            with _record_request(self._get_metrics(), operation) as record:
+                yield record
+
+    @contextlib.contextmanager
+    def _profile_phase(self, phase):
+        """Context that records the time of its block under a phase with
+        the profiler, if there is one.
+
+        Args:
+          phase (str): one of the PHASE_* constants
+        """
+        if self._profiler is None:
+            yield
+        else:
+            with self._profiler.time(phase):
+                yield
+
+    def _get_metrics(self):
+        """Get the Metrics to record requests with, None if there are none."""
+        return self._metrics or _default_metrics
+
+    def _record_backoff(self, operation, seconds):
+        """Record waiting to retry a request that hit the quota.
+
+        Args:
+          operation (str): one of the OPERATION_* constants
+          seconds (float): time that will be waited
+        """
+        metrics = self._get_metrics()
+        if metrics is not None:
+            metrics.record_backoff(operation, seconds)
+
+    def _get_revision(self):
+        """Get the revision of the spreadsheet, which changes whenever the
+        spreadsheet is edited.
+
+        Returns:
+          str: modified time of the spreadsheet
+        """
+        with self._api_lock:
+            with _record_request(self._get_metrics(), OPERATION_REVISION):
+                return self.worksheet.spreadsheet.updated
+
+    def _load_snapshot(self):
+        """Take the header mappings and values from the snapshot cache if
+        it has them at the current revision of the spreadsheet."""
+        self._revision = self._get_revision()
+        snapshot = self._snapshot_cache.load(
+            spreadsheet_id=self.worksheet.spreadsheet.id,
+            sheet_title=self.worksheet.title,
+            revision=self._revision,
+        )
+        if snapshot is None:
+            LOG.debug("No snapshot of %s at %s", self.worksheet.title, self._revision)
+            return
+        header, values, format_types = snapshot
+        self._header = dict(header)
+        self._preloaded = (values, format_types)
+
+    def _fetch_sheet_matrices(self):
+        """Get values and number format types of all rows below the header.
+        Values loaded with the header or from a current snapshot are used
+        once instead of fetching. If the header isn't loaded yet, it is
+        fetched in the same request.
+
+        Returns:
+          tuple: (values, format types) as lists of rows
+        """
+        if self._snapshot_cache is not None and self._revision is None:
+            # Not looked for yet, as the Repository is lazy or has a header
+            self._load_snapshot()
+        if self._preloaded is not None:
+            values, format_types = self._preloaded
+            self._preloaded = None
+            return values, format_types
+        revision = None
+        if self._snapshot_cache is not None:
+            # Read the revision first so the snapshot is never newer than it says
+            revision = self._get_revision()
+        if self._header is None:
+            values, format_types = self._fetch_value_matrices(start_row=1)
+            self._set_header_mappings(header_values=values[0] if values else [])
+            values, format_types = values[1:], format_types[1:]
+        else:
+            values, format_types = self._fetch_value_matrices(start_row=2)
+        if self._snapshot_cache is None:
+            return values, format_types
+        self._snapshot_cache.store(
+            spreadsheet_id=self.worksheet.spreadsheet.id,
+            sheet_title=self.worksheet.title,
+            revision=revision,
+            header=self._col_to_property_name,
+            values=values,
+            format_types=format_types,
+        )
+        self._revision = revision
+        return values, format_types
+
+    @classmethod
+    def get_repository_with_creds(
+        cls,
+        service_account_file,
+        spreadsheet_id,
+        sheet_name="Sheet1",
+        snapshot_cache=None,
+    ):
+        """Factory method to return a Repository given signed crednentials,
+        spreadsheet id, and name of sheet. Authorized clients and opened
+        spreadsheets are kept for the life of the process, so Repositories
+        for the same credentials share a client and its HTTP connection and
+        opening another sheet of the same spreadsheet makes no extra requests.
+        See clear_client_pool().
+
+        Args:
+          service_account_file (str): Service account key file (JSON) from google
+              https://pygsheets.readthedocs.io/en/stable/authorizing.html#signed-credentials
+          spreadsheet_id (str): The ID of the google spreadsheet to retrieve data from.
+          sheet_name (str): Name of sheet in spreadhseet to read/write to.
+                            Default value = "Sheet1"
+          snapshot_cache (SnapshotCache): See Repository. Default value = None
+
+        Returns:
+          Repository: Repository created with arguments
+
+        """
+        try:
+            spreadsheet = _CLIENT_POOL.get_spreadsheet(
+                service_account_file=service_account_file, spreadsheet_id=spreadsheet_id
+            )
+            worksheet = spreadsheet.worksheet_by_title(sheet_name)
+            return cls(pygsheets_worksheet=worksheet, snapshot_cache=snapshot_cache)
+        except HttpError as err:
+            if "Requested entity was not found" in err._get_reason():
+                raise SpreadsheetException(
+                    "Error connecting to Google Sheets. " "Check your spreadsheet ID."
+                )
+            raise
+
+    @classmethod
+    def load_many(cls, client, specs, max_workers=4, **kwargs):
+        """Create Repositories for many sheets that share one client. Each
+        spreadsheet is opened with a single request that also returns the
+        header and values of all of its sheets, and up to max_workers
+        spreadsheets are requested at once. Repositories load like
+        fast_load and get_all() uses the values fetched here.
+
+        Args:
+          client (pygsheets.Client): authorized client to share
+          specs (list): (spreadsheet id, sheet name) tuples
+          max_workers (int): Maximum number of requests at once.
+              Default value = 4
+          kwargs: Other arguments for each Repository
+
+        Returns:
+          list: Repository for each spec, in the same order
+        """
+        sheet_names = collections.OrderedDict()
+        for spreadsheet_id, sheet_name in specs:
+            names = sheet_names.setdefault(spreadsheet_id, [])
+            if sheet_name not in names:
+                names.append(sheet_name)
+
+        def load_spreadsheet(item):
+            spreadsheet_id, names = item
+            return (
+                spreadsheet_id,
+                cls._load_spreadsheet(
+                    client=client,
+                    spreadsheet_id=spreadsheet_id,
+                    sheet_names=names,
+                    **kwargs
+                ),
+            )
+
+        pool = multiprocessing.pool.ThreadPool(
+            processes=max(1, min(max_workers, len(sheet_names)))
+        )
+        try:
+            results = dict(pool.map(load_spreadsheet, list(sheet_names.items())))
+        finally:
+            pool.close()
+            pool.join()
+        return [
+            results[spreadsheet_id][sheet_name] for spreadsheet_id, sheet_name in specs
+        ]
+
+    @classmethod
+    def _load_spreadsheet(cls, client, spreadsheet_id, sheet_names, **kwargs):
+        """Open a spreadsheet and fetch the values of some of its sheets in
+        one request, and create a Repository for each sheet. The request
+        uses its own HTTP connection so it can run in any thread.
+
+        Args:
+          client (pygsheets.Client): authorized client
+          spreadsheet_id (str): id of the spreadsheet
+          sheet_names (list): names of the sheets
+          kwargs: Other arguments for each Repository
+
+        Returns:
+          dict: sheet names mapped to Repositories
+        """
+        request = client.sheet.service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields=SPREADSHEET_GRID_DATA_FIELDS,
+            includeGridData=True,
+            ranges=["'{}'".format(name.replace("'", "''")) for name in sheet_names],
+        )
+        rate_limiter = kwargs.get("rate_limiter") or _default_rate_limiter
+        if rate_limiter is not None:
+            rate_limiter.acquire(REQUEST_READ)
+        metrics = kwargs.get("metrics") or _default_metrics
+        with _record_request(metrics, OPERATION_LOAD) as record:
+            response = request.execute(
+                http=google_auth_httplib2.AuthorizedHttp(client.oauth),
+                num_retries=client.sheet.retries,
+            )
+            record.set_payload(response)
+        grids = {}
+        for sheet in response.get("sheets", []):
+            # Worksheets keep their json, so don't keep the values there
+            grid_data = sheet.pop("data", [])
+            if grid_data:
+                grids[sheet["properties"]["title"]] = _grid_data_to_matrices(
+                    grid_data[0]
+                )
+        spreadsheet = client.spreadsheet_cls(client, response)
+        repositories = {}
+        for name in sheet_names:
+            worksheet = spreadsheet.worksheet_by_title(name)
+            values, format_types = grids.get(name, ([], []))
+            repositories[name] = cls(
+                pygsheets_worksheet=worksheet,
+                _preloaded=(values[0] if values else [], values[1:], format_types[1:]),
+                **kwargs
+            )
+        return repositories
+
+    def get_all(self, lambda_filter=None, columns=None):
+        """Get all rows from sheet as Model objects. A filter can be provided to
+        limit results. First row is assumed to be header and is not returned.
+        All records are initially cached so subsequent calls can be made with
+        or without a filter and no data will be pulled from the sheet.
+
+        With columns, only those columns are fetched, in one request, and
+        converted. The first column is fetched with them to find rows at
+        the end of the sheet that are empty in those columns, so it should
+        be filled in every row. The Models returned only have those
+        properties, reading or setting any other raises
+        PropertyNotLoadedException.
+        These partial Models are not cached, but if all Models are cached
+        already they are returned instead.
+
+        Args:
+          lambda_filter (function): Lambda function which will filter list
+              (Default value = None)
+          columns (list): property names to load. None means all of them.
+              Requires a cell_converter that implements from_value.
+              (Default value = None)
+
+        Returns:
+          list: Model objects that correspond to each row in the sheet
+
+        """
+        if columns is not None and not self._models:
+            models = self._get_projected_models(columns)
+            if lambda_filter:
+                return list(filter(lambda_filter, models))
+            return models
+        loaded = not self._models
+        # Only get new models if none are cached
+        if not self._models and self._storage == STORAGE_COLUMNS:
+            with self._profile_phase(PHASE_FETCH):
+                values, format_types = self._fetch_sheet_matrices()
+            with self._profile_phase(PHASE_BUILD):
+                self._table = self._get_table_from_values(
+                    start_row=2, values=values, format_types=format_types
+                )
+                self._models = [
+                    ColumnarModel(table=self._table, index=index)
+                    for index in range(len(self._table))
+                ]
+        elif not self._models and self._fast_load:
+            with self._profile_phase(PHASE_FETCH):
+                values, format_types = self._fetch_sheet_matrices()
+            with self._profile_phase(PHASE_CONVERSION):
+                columns = self._convert_columns(
+                    values=values, format_types=format_types
+                )
+            with self._profile_phase(PHASE_BUILD):
+                property_to_column = self._get_property_to_column()
+                for row_index in range(len(values)):
+                    model = self._get_model_from_columns(
+                        columns=columns,
+                        property_to_column=property_to_column,
+                        row_index=row_index,
+                        row_number=row_index + 2,
+                    )
+                    self._models.append(model)
+        elif not self._models:
+            with self._profile_phase(PHASE_FETCH):
+                with self._api_request(REQUEST_READ, OPERATION_LOAD):
+                    rows = self.worksheet.get_all_values(
+                        include_tailing_empty=False,
+                        include_tailing_empty_rows=False,
+                        returnas="cells",
+                    )
+            if self._header is None:
+                self._set_header_mappings(
+                    header_values=[cell.value for cell in rows[0]] if rows else []
+                )
+            with self._profile_phase(PHASE_BUILD):
+                # Skip header row
+                self._models.extend(self._get_models_from_rows(rows[1:]))
+        if loaded:
+            with self._profile_phase(PHASE_INDEX):
+                self._build_indexes()
+        if lambda_filter:
+            return list(filter(lambda_filter, self._models))
+        return self._models
+
+    def refresh(self, key=None):
+        """Re-read the sheet and bring cached Models up to date in place.
+        Only Models whose values changed are updated, rows added to the
+        sheet get new Models, and Models for rows that are gone are removed
+        from the cache. Model objects that are kept stay the same objects.
+        Properties modified locally and not saved yet keep their local value.
+
+        Without a key, rows are matched to cached Models by position. With a
+        key, rows are matched by the value of that property, so Models follow
+        their row when rows are inserted or deleted above them.
+
+        Args:
+          key (str): property name identifying a row (Default value = None)
+
+        Returns:
+          RefreshResult: added, updated and removed Models
+        """
+        property_to_column = self._get_property_to_column()
+        if key is not None and key not in property_to_column:
+            raise ValueError("No column corresponds with name {}".format(key))
+        if not self._models:
+            return RefreshResult(added=list(self.get_all()), updated=[], removed=[])
+        if self._snapshot_cache is not None and self._revision == self._get_revision():
+            # Nothing changed since the cached models were loaded
+            return RefreshResult(added=[], updated=[], removed=[])
+        row_numbers, columns = self._fetch_columns()
+        matches = self._match_rows(columns=columns, row_count=len(row_numbers), key=key)
+        if self._storage == STORAGE_COLUMNS:
+            models, added, updated = self._refresh_table(
+                matches=matches,
+                row_numbers=row_numbers,
+                columns=columns,
+                property_to_column=property_to_column,
+            )
+        else:
+            models, added, updated = self._refresh_models(
+                matches=matches,
+                row_numbers=row_numbers,
+                columns=columns,
+                property_to_column=property_to_column,
+            )
+        matched = set(id(model) for model in matches if model is not None)
+        removed = [model for model in self._models if id(model) not in matched]
+        self._models[:] = models
+        self._build_indexes()
+        return RefreshResult(added=added, updated=updated, removed=removed)
+
+    def create_index(self, property_name, unique=False):
+        """Create a hash index on a property so get_by() and find_by() can
+        look cached Models up by its value without scanning them all.
+        The index follows changes made to Models and is rebuilt when rows
+        are reloaded. Creating an index loads the Models if needed.
+
+        Args:
+          property_name (str): property name to index
+          unique (bool): raise IndexException if a value belongs to more
+              than one row (Default value = False)
+        """
+        if property_name not in self._get_property_to_column():
+            raise ValueError("No column corresponds with name {}".format(property_name))
+        index = _HashIndex(property_name=property_name, unique=unique)
+        index.build(self.get_all())
+        self._indexes[property_name] = index
+
+    def drop_index(self, property_name):
+        """Remove the index on a property.
+
+        Args:
+          property_name (str): property name the index is on
+        """
+        self._indexes.pop(property_name, None)
+
+    def find_by(self, **kwargs):
+        """Get cached Models whose properties equal the given values,
+        e.g. find_by(status="open"). If any of the properties has an index,
+        only the Models it returns are checked, otherwise all are.
+
+        Args:
+          kwargs: property names mapped to the values to match
+
+        Returns:
+          list: matching Model objects
+        """
+        return list(self._iter_by(kwargs))
+
+    def get_by(self, **kwargs):
+        """Get a cached Model whose properties equal the given values,
+        e.g. get_by(email="rick@example.com"). See find_by().
+
+        Args:
+          kwargs: property names mapped to the values to match
+
+        Returns:
+          Model: a matching Model or None if there is none
+        """
+        return next(self._iter_by(kwargs), None)
+
+    def query(self):
+        """Start a query over the cached Models, e.g.
+        repo.query().where(status="open").where_gt("balance", 10)
+        .order_by("expiration_date").limit(50).all()
+
+        Returns:
+          Query: query matching every Model
+        """
+        return Query(self)
+
+    def _iter_by(self, criteria):
+        """Iterate over cached Models whose properties equal the given values.
+
+        Args:
+          criteria (dict): property names mapped to values
+
+        Returns:
+          iterator: matching Model objects
+        """
+        if not criteria:
+            raise ValueError("No property values given")
+        property_to_column = self._get_property_to_column()
+        for property_name in criteria:
+            if property_name not in property_to_column:
+                raise ValueError(
+                    "No column corresponds with name {}".format(property_name)
+                )
+        models = self.get_all()
+        indexed = [name for name in criteria if name in self._indexes]
+        if indexed:
+            models = min(
+                (self._indexes[name].get(criteria[name]) for name in indexed), key=len
+            )
+        criteria = list(six.iteritems(criteria))
+        return (
+            model
+            for model in models
+            if all(getattr(model, name) == value for name, value in criteria)
+        )
+
+    def _build_indexes(self):
+        """Index the cached Models again after they were reloaded."""
+        for index in self._indexes.values():
+            index.build(self._models)
+
+    def _discard_from_index(self, model, property_name):
+        """Take a Model out of the index on a property, if there is one,
+        because its value is about to change.
+
+        Args:
+          model (Model): Model being changed
+          property_name (str): property name
+        """
+        index = self._indexes.get(property_name)
+        if index is not None:
+            index.discard(model)
+
+    def _fetch_columns(self):
+        """Fetch all rows the same way get_all() does and convert them to
+        a list of values per property.
+
+        Returns:
+          tuple: (row numbers, dict of property names mapped to lists of values)
+        """
+        if self._fast_load or self._storage == STORAGE_COLUMNS:
+            values, format_types = self._fetch_sheet_matrices()
+            columns = self._convert_columns(values=values, format_types=format_types)
+            return list(range(2, 2 + len(values))), columns
+        with self._api_request(REQUEST_READ, OPERATION_LOAD):
+            rows = self.worksheet.get_all_values(
+                include_tailing_empty=False,
+                include_tailing_empty_rows=False,
+                returnas="cells",
+            )
+        models = self._get_models_from_rows(rows[1:])
+        columns = dict(
+            (
+                property_name,
+                [model.Metadata.get_value(property_name) for model in models],
+            )
+            for property_name in self._get_property_to_column()
+        )
+        return [model.Metadata.row for model in models], columns
+
+    def _match_rows(self, columns, row_count, key):
+        """Match fetched rows to cached Models.
+
+        Args:
+          columns (dict): property names mapped to lists of fetched values
+          row_count (int): number of fetched rows
+          key (str): property name to match on, or None to match by position
+
+        Returns:
+          list: cached Model for each fetched row, or None for new rows
+        """
+        if key is None:
+            return [
+                self._models[index] if index < len(self._models) else None
+                for index in range(row_count)
+            ]
+        cached = {}
+        for model in self._models:
+            cached.setdefault(model.Metadata.get_value(key), []).append(model)
+        matches = []
+        for value in columns[key]:
+            models = cached.get(value)
+            matches.append(models.pop(0) if models else None)
+        return matches
+
+    def _refresh_models(self, matches, row_numbers, columns, property_to_column):
+        """Update Models that keep their own values from fetched columns.
+
+        Returns:
+          tuple: (Models in sheet order, added Models, updated Models)
+        """
+        models = []
+        added = []
+        updated = []
+        for index, model in enumerate(matches):
+            row_number = row_numbers[index]
+            if model is None:
+                model = self._get_model_from_columns(
+                    columns=columns,
+                    property_to_column=property_to_column,
+                    row_index=index,
+                    row_number=row_number,
+                )
+                added.append(model)
+            else:
+                metadata = model.Metadata
+                changed = metadata.row != row_number
+                if changed:
+                    metadata.row = row_number
+                    # Cells point at the old row
+                    metadata.property_to_cell.clear()
+                modified_properties = metadata.get_modified_properties()
+                for property_name in property_to_column:
+                    value = columns[property_name][index]
+                    if property_name in modified_properties:
+                        continue
+                    if metadata.get_value(property_name) != value:
+                        metadata.set_value(property_name, value)
+                        changed = True
+                if changed:
+                    updated.append(model)
+            models.append(model)
+        return models, added, updated
+
+    def _refresh_table(self, matches, row_numbers, columns, property_to_column):
+        """Replace the ColumnTable with fetched columns and point Models that
+        are kept at their new row in it.
+
+        Returns:
+          tuple: (Models in sheet order, added Models, updated Models)
+        """
+        old_table = self._table
+        table = ColumnTable(repository=self, property_to_column=property_to_column)
+        table.columns = columns
+        table.row_numbers = list(row_numbers)
+        models = []
+        added = []
+        updated = []
+        for index, model in enumerate(matches):
+            if model is None:
+                model = ColumnarModel(table=table, index=index)
+                added.append(model)
+            else:
+                old_index = model._index
+                changed = old_table.row_numbers[old_index] != row_numbers[index]
+                modified_properties = old_table.modified.get(old_index, set())
+                for property_name in property_to_column:
+                    old_value = old_table.columns[property_name][old_index]
+                    if property_name in modified_properties:
+                        columns[property_name][index] = old_value
+                    elif old_value != columns[property_name][index]:
+                        changed = True
+                if modified_properties:
+                    table.modified[index] = modified_properties
+                object.__setattr__(model, "_table", table)
+                object.__setattr__(model, "_index", index)
+                if changed:
+                    updated.append(model)
+            models.append(model)
+        self._table = table
+        return models, added, updated
+
+    def iter_all(self, chunk_rows=1000, prefetch=True):
+        """Iterate over all rows as Model objects without loading the whole
+        sheet. Rows are fetched in windows of chunk_rows rows, and the next
+        window is fetched in the background while the current one is being
+        used. Nothing is cached, so memory use is bounded by the window
+        size. First row is assumed to be header and is not returned.
+
+        Models can be saved while iterating. They are not added to the
+        cache, so save_all() does not save them.
+
+        Rows are converted from values, so this requires a cell_converter
+        that implements from_value.
+
+        Args:
+          chunk_rows (int): number of rows to fetch per request
+              (Default value = 1000)
+          prefetch (bool): fetch the next window in a background thread
+              (Default value = True)
+
+        Yields:
+          Model: Model object for each row in the sheet
+        """
+        if chunk_rows < 1:
+            raise ValueError("chunk_rows must be at least 1")
+        if not hasattr(self._cell_converter, "from_value"):
+            raise ValueError("Iterating over rows requires a converter with from_value")
+        start_row = 2
+        window = self._fetch_grid(
+            start_row=start_row, end_row=start_row + chunk_rows - 1
+        )
+        # Empty rows at the end of a window are only returned when more
+        # rows follow them, like get_all() does
+        pending_empty_rows = 0
+        while True:
+            values, format_types, row_count = window
+            next_start_row = start_row + chunk_rows
+            has_next_window = (
+                next_start_row <= row_count if row_count is not None else bool(values)
+            )
+            if has_next_window:
+                next_window_kwargs = {
+                    "start_row": next_start_row,
+                    "end_row": next_start_row + chunk_rows - 1,
+                }
+                if prefetch:
+                    next_window = _Prefetch(self._fetch_grid, **next_window_kwargs)
+                else:
+                    next_window = None
+            if values:
+                first_row = start_row - pending_empty_rows
+                values = [[]] * pending_empty_rows + values
+                format_types = [[]] * pending_empty_rows + format_types
+                for model in self._get_models_from_values(
+                    start_row=first_row, values=values, format_types=format_types
+                ):
+                    yield model
+                pending_empty_rows = 0
+            pending_empty_rows += chunk_rows - len(values)
+            if not has_next_window:
+                return
+            start_row = next_start_row
+            if next_window is not None:
+                window = next_window.get()
+            else:
+                window = self._fetch_grid(**next_window_kwargs)
+
+    def to_dataframe(self, columns=None):
+        """Get the rows of the sheet as a pandas DataFrame, built straight
+        from the fetched values without creating Models. Requires pandas.
+
+        Column names are property names. Empty cells are missing values.
+        Columns whose cells are all dates or date times become datetime64
+        columns, times become datetime.time objects, like the values
+        BasicCellConverter gives Models. The sheet is read, or its values
+        taken from a current snapshot, on every call. Cached Models are
+        neither used nor changed.
+
+        Args:
+          columns (list): property names of the columns to include, in
+              order. None means all of them. Default value = None
+
+        Returns:
+          pandas.DataFrame: a row for each row below the header
+        """
+        if pandas is None:
+            raise ImportError("to_dataframe requires pandas")
+        data = collections.OrderedDict()
+        for property_name, values, format_type in self._get_export_columns(columns):
+            if format_type is None:
+                data[property_name] = [
+                    None if value == "" else value for value in values
+                ]
+                continue
+            seconds, empty = _serials_to_seconds(values)
+            if format_type == u"TIME":
+                seconds = seconds % 86400
+                cell_times = [
+                    datetime.time(hour, minute, second)
+                    for hour, minute, second in zip(
+                        (seconds // 3600).tolist(),
+                        (seconds % 3600 // 60).tolist(),
+                        (seconds % 60).tolist(),
+                    )
+                ]
+                data[property_name] = [
+                    None if is_empty else cell_time
+                    for cell_time, is_empty in zip(cell_times, empty.tolist())
+                ]
+                continue
+            cell_datetimes = numpy.datetime64("1899-12-30T00:00:00", "s") + seconds
+            if format_type == u"DATE":
+                cell_datetimes = cell_datetimes.astype("datetime64[D]")
+            cell_datetimes[empty] = numpy.datetime64("NaT")
+            data[property_name] = cell_datetimes
+        return pandas.DataFrame(data, columns=list(data))
+
+    def to_arrow(self, columns=None):
+        """Get the rows of the sheet as a pyarrow Table, built straight
+        from the fetched values without creating Models. Requires pyarrow.
+
+        Column names are property names. Empty cells are nulls. Columns
+        whose cells are all dates, date times or times become date32,
+        timestamp or time32 columns, converted like BasicCellConverter
+        does. Columns mixing values arrow can't put in one type, e.g. text
+        and numbers, become strings. The sheet is read, or its values taken
+        from a current snapshot, on every call. Cached Models are neither
+        used nor changed.
+
+        Args:
+          columns (list): property names of the columns to include, in
+              order. None means all of them. Default value = None
+
+        Returns:
+          pyarrow.Table: a row for each row below the header
+        """
+        if pyarrow is None:
+            raise ImportError("to_arrow requires pyarrow")
+        names = []
+        arrays = []
+        for property_name, values, format_type in self._get_export_columns(columns):
+            names.append(property_name)
+            if format_type is None:
+                values = [None if value == "" else value for value in values]
+                try:
+                    arrays.append(pyarrow.array(values))
+                except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                    arrays.append(
+                        pyarrow.array(
+                            [
+                                None if value is None else six.text_type(value)
+                                for value in values
+                            ],
+                            pyarrow.string(),
+                        )
+                    )
+                continue
+            seconds, empty = _serials_to_seconds(values)
+            if format_type == u"TIME":
+                arrays.append(
+                    pyarrow.array(
+                        (seconds % 86400).astype("int32"),
+                        pyarrow.time32("s"),
+                        mask=empty,
+                    )
+                )
+                continue
+            cell_datetimes = numpy.datetime64("1899-12-30T00:00:00", "s") + seconds
+            if format_type == u"DATE":
+                cell_datetimes = cell_datetimes.astype("datetime64[D]")
+            arrays.append(pyarrow.array(cell_datetimes, mask=empty))
+        return pyarrow.Table.from_arrays(arrays, names=names)
+
+    def _get_export_columns(self, columns=None):
+        """Get the values of each column for to_dataframe() and to_arrow().
+
+        Args:
+          columns (list): property names of the columns to include, in
+              order. None means all of them, in column order.
+              Default value = None
+
+        Returns:
+          list: (property name, values, format type) tuples. Values are ""
+                for empty cells. Format type is "DATE", "TIME" or
+                "DATE_TIME" if every cell that isn't empty is a serial
+                number with that format, otherwise None.
+        """
+        property_to_column = self._get_property_to_column()
+        if columns is None:
+            columns = sorted(property_to_column, key=property_to_column.get)
+        for property_name in columns:
+            if property_name not in property_to_column:
+                raise ValueError(
+                    "No column corresponds with name {}".format(property_name)
+                )
+        if self._preloaded is not None:
+            # Leave them for get_all()
+            values, format_types = self._preloaded
+        else:
+            values, format_types = self._fetch_sheet_matrices()
+        export_columns = []
+        for property_name in columns:
+            column_values, column_format_types = _get_column(
+                values=values,
+                format_types=format_types,
+                column_number=property_to_column[property_name],
+            )
+            distinct_format_types = set()
+            for value, format_type in zip(column_values, column_format_types):
+                if value == "":
+                    continue
+                if isinstance(value, bool) or not isinstance(value, numbers.Real):
+                    distinct_format_types.add(None)
+                    break
+                distinct_format_types.add(format_type)
+            format_type = None
+            if len(distinct_format_types) == 1:
+                format_type = distinct_format_types.pop()
+                if format_type not in (u"DATE", u"TIME", u"DATE_TIME"):
+                    format_type = None
+            export_columns.append((property_name, column_values, format_type))
+        return export_columns
+
+    def _get_projected_models(self, columns):
+        """Fetch some columns of every row below the header and return
+        Models that only have those properties.
+
+        Args:
+          columns (list): property names to load
+
+        Returns:
+          list: Model objects with only the given properties
+        """
+        if not hasattr(self._cell_converter, "from_value"):
+            raise ValueError("Loading columns requires a converter with from_value")
+        if not columns:
+            raise ValueError("No columns to load")
+        property_to_column = self._get_property_to_column()
+        for property_name in columns:
+            if property_name not in property_to_column:
+                raise ValueError(
+                    "No column corresponds with name {}".format(property_name)
+                )
+        projected = dict(
+            (property_name, property_to_column[property_name])
+            for property_name in columns
         )
-        for cell in header_row:
-            property_name = self._get_property_name_from_column_header(cell.value)
-            self._col_to_property_name[cell.col] = property_name
+        # Rows at the end that are empty in every projected column are not
+        # returned, so the first column is fetched too to find the last row
+        key_column = min(property_to_column.values())
+        column_ranges = _merge_row_ranges(
+            sorted(set(projected.values()) | set([key_column]))
+        )
+        with self._profile_phase(PHASE_FETCH):
+            values, format_types = self._fetch_column_ranges(column_ranges)
+        # Column numbers in the fetched matrices, which only hold the ranges
+        compact_columns = {}
+        compact_column = 1
+        for first_column, last_column in column_ranges:
+            for column in range(first_column, last_column + 1):
+                compact_columns[column] = compact_column
+                compact_column += 1
+        with self._profile_phase(PHASE_CONVERSION):
+            converted = self._convert_columns(
+                values=values,
+                format_types=format_types,
+                property_to_column=dict(
+                    (property_name, compact_columns[column])
+                    for property_name, column in six.iteritems(projected)
+                ),
+            )
+        with self._profile_phase(PHASE_BUILD):
+            return [
+                self._get_model_from_columns(
+                    columns=converted,
+                    property_to_column=projected,
+                    row_index=row_index,
+                    row_number=row_index + 2,
+                )
+                for row_index in range(len(values))
+            ]
 
-    @classmethod
-    def get_repository_with_creds(
-        cls, service_account_file, spreadsheet_id, sheet_name="Sheet1"
-    ):
-        """Factory method to return a Repository given signed crednentials,
-        spreadsheet id, and name of sheet.
+    def _fetch_column_ranges(self, column_ranges):
+        """Fetch unformatted values and number format types of runs of
+        columns, from row 2 to the end of the sheet, in a single request.
 
         Args:
-          service_account_file (str): Service account key file (JSON) from google
-              https://pygsheets.readthedocs.io/en/stable/authorizing.html#signed-credentials
-          spreadsheet_id (str): The ID of the google spreadsheet to retrieve data from.
-          sheet_name (str): Name of sheet in spreadhseet to read/write to.
-                            Default value = "Sheet1"
+          column_ranges (list): (first column, last column) tuples
 
         Returns:
-          Repository: Repository created with arguments
+          tuple: (values, format types) as lists of rows holding the
+                 columns of every range one after another
+        """
+        title = self.worksheet.title.replace("'", "''")
+        ranges = [
+            "'{}'!{}:{}".format(
+                title,
+                pygsheets.utils.format_addr((2, first_column), "label"),
+                pygsheets.utils.format_addr((1, last_column), "label").rstrip(
+                    "0123456789"
+                ),
+            )
+            for first_column, last_column in column_ranges
+        ]
+        with self._api_request(REQUEST_READ, OPERATION_LOAD) as record:
+            response = self.worksheet.client.sheet.get(
+                self.worksheet.spreadsheet.id,
+                fields=PROJECTION_GRID_DATA_FIELDS,
+                includeGridData=True,
+                ranges=ranges,
+            )
+            record.set_payload(response)
+        try:
+            grid_data = response["sheets"][0].get("data", [])
+        except (KeyError, IndexError):
+            grid_data = []
+        # Ranges are returned in the order they were asked for
+        grids_by_column = dict(
+            (data.get("startColumn", 0) + 1, data) for data in grid_data
+        )
+        values = []
+        format_types = []
+        offset = 0
+        for first_column, last_column in column_ranges:
+            width = last_column - first_column + 1
+            range_values, range_format_types = _grid_data_to_matrices(
+                grids_by_column.get(first_column, {})
+            )
+            # Trailing empty rows and cells are not returned
+            for row_index, (row_values, row_format_types) in enumerate(
+                zip(range_values, range_format_types)
+            ):
+                if row_index == len(values):
+                    values.append([""] * offset)
+                    format_types.append([None] * offset)
+                padding = width - len(row_values)
+                values[row_index].extend(row_values + [""] * padding)
+                format_types[row_index].extend(row_format_types + [None] * padding)
+            for row_index in range(len(range_values), len(values)):
+                values[row_index].extend([""] * width)
+                format_types[row_index].extend([None] * width)
+            offset += width
+        return values, format_types
+
+    def _get_models_from_values(self, start_row, values, format_types):
+        """Given rows of values and number format types, return Models that
+        are not cached.
+
+        Args:
+          start_row (int): row number of the first row of values
+          values (list): rows of unformatted values, starting with column 1
+          format_types (list): rows of number format types, starting with column 1
+        Returns:
+          list: Model objects
+        """
+        if self._storage == STORAGE_COLUMNS:
+            table = self._get_table_from_values(
+                start_row=start_row, values=values, format_types=format_types
+            )
+            return [
+                ColumnarModel(table=table, index=index) for index in range(len(table))
+            ]
+        columns = self._convert_columns(values=values, format_types=format_types)
+        property_to_column = self._get_property_to_column()
+        return [
+            self._get_model_from_columns(
+                columns=columns,
+                property_to_column=property_to_column,
+                row_index=row_index,
+                row_number=start_row + row_index,
+            )
+            for row_index in range(len(values))
+        ]
+
+    def _get_model_class(self):
+        """Get the Model subclass generated from the header row. It is
+        created on first use and reused for every row.
+
+        Returns:
+          type: subclass of Model
+        """
+        if self._model_class is None:
+            property_names = []
+            for column_number in sorted(self._col_to_property_name):
+                property_name = self._col_to_property_name[column_number]
+                if property_name not in property_names:
+                    property_names.append(property_name)
+            self._model_class = _create_model_class(property_names)
+        return self._model_class
+
+    def _get_range_label(self, start_row, end_row=None):
+        """Get the A1 notation for rows spanning all mapped columns.
+
+        Args:
+          start_row (int): first row number
+          end_row (int): last row number. None means to the end of the sheet
+              (Default value = None)
+
+        Returns:
+          str: range label including the sheet title
+        """
+        title = self.worksheet.title.replace("'", "''")
+        if self._header is None and start_row == 1 and end_row is None:
+            # The whole sheet, the header is fetched with the rows
+            return "'{}'".format(title)
+        last_column = (
+            max(self._col_to_property_name) if self._col_to_property_name else 1
+        )
+        end_label = pygsheets.utils.format_addr((1, last_column), "label").rstrip(
+            "0123456789"
+        )
+        if end_row is not None:
+            end_label += str(end_row)
+        return "'{}'!A{}:{}".format(title, start_row, end_label)
+
+    def _fetch_value_matrices(self, start_row, end_row=None):
+        """Fetch unformatted values and number format types for a range
+        of rows in a single request.
+
+        Args:
+          start_row (int): first row number
+          end_row (int): last row number. None means to the end of the sheet
+              (Default value = None)
+
+        Returns:
+          tuple: (values, format types) as lists of rows
+        """
+        values, format_types, _ = self._fetch_grid(start_row, end_row)
+        return values, format_types
+
+    def _fetch_grid(self, start_row, end_row=None):
+        """Fetch unformatted values, number format types and the number of
+        rows in the sheet in a single request.
+
+        Args:
+          start_row (int): first row number
+          end_row (int): last row number. None means to the end of the sheet
+              (Default value = None)
 
+        Returns:
+          tuple: (values, format types, row count). Values and format types
+                 are lists of rows. Row count is None if it was not returned.
         """
+        with self._api_request(REQUEST_READ, OPERATION_LOAD) as record:
+            response = self.worksheet.client.sheet.get(
+                self.worksheet.spreadsheet.id,
+                fields=GRID_DATA_FIELDS,
+                includeGridData=True,
+                ranges=self._get_range_label(start_row, end_row),
+            )
+            record.set_payload(response)
         try:
-            client = pygsheets.authorize(service_account_file=service_account_file)
-            spreadsheet = client.open_by_key(spreadsheet_id)
-            worksheet = spreadsheet.worksheet_by_title(sheet_name)
-            return cls(pygsheets_worksheet=worksheet)
-        except HttpError as err:
-            if "Requested entity was not found" in err._get_reason():
-                raise SpreadsheetException(
-                    "Error connecting to Google Sheets. " "Check your spreadsheet ID."
-                )
-            raise
+            sheet = response["sheets"][0]
+        except (KeyError, IndexError):
+            return [], [], None
+        row_count = (
+            sheet.get("properties", {}).get("gridProperties", {}).get("rowCount")
+        )
+        try:
+            grid_data = sheet["data"][0]
+        except (KeyError, IndexError):
+            return [], [], row_count
+        values, format_types = _grid_data_to_matrices(grid_data)
+        return values, format_types, row_count
 
-    def get_all(self, lambda_filter=None):
-        """Get all rows from sheet as Model objects. A filter can be provided to
-        limit results. First row is assumed to be header and is not returned.
-        All records are initially cached so subsequent calls can be made with
-        or without a filter and no data will be pulled from the sheet.
+    def _get_property_to_column(self):
+        """Get property names mapped to column numbers. If two columns map
+        to the same property name, the last column wins.
+
+        Returns:
+          dict: property names mapped to column numbers
+        """
+        return dict(
+            (property_name, column_number)
+            for column_number, property_name in sorted(
+                six.iteritems(self._col_to_property_name)
+            )
+        )
+
+    def _convert_columns(self, values, format_types, property_to_column=None):
+        """Convert rows of values and number format types to a list of
+        converted values per property. A column with a single number format
+        is converted in one call to the cell converter's from_column if it
+        has one, otherwise each value is converted with from_value.
 
         Args:
-          lambda_filter (function): Lambda function which will filter list
+          values (list): rows of unformatted values, starting with column 1
+          format_types (list): rows of number format types, starting with column 1
+          property_to_column (dict): property names to convert mapped to
+              their column numbers in values. None means every property.
               (Default value = None)
+        Returns:
+          dict: property names mapped to lists of converted values
+        """
+        if property_to_column is None:
+            property_to_column = self._get_property_to_column()
+        columns = dict(
+            (
+                property_name,
+                _get_column(
+                    values=values,
+                    format_types=format_types,
+                    column_number=column_number,
+                ),
+            )
+            for property_name, column_number in six.iteritems(property_to_column)
+        )
+        plan = self._get_conversion_plan(columns)
+        return dict(
+            (property_name, plan[property_name](column_values))
+            for property_name, (column_values, _) in six.iteritems(columns)
+        )
 
+    def _get_conversion_plan(self, columns):
+        """Pick one function per column to convert all of its values with,
+        once per load. A column in the schema is converted to its type.
+        For a column whose non empty cells share one number format, the
+        cell converter's get_column_converter is asked for a function, then
+        its from_column is used. Other columns are converted one value at a
+        time with from_value.
+
+        Args:
+          columns (dict): property names mapped to (values, number format
+              types) of their column
         Returns:
-          list: Model objects that correspond to each row in the sheet
+          dict: property names mapped to functions that take the list of
+                values of the column and return them converted
+        """
+        unknown = set(self._schema).difference(self._col_to_property_name.values())
+        if unknown:
+            raise ValueError("No column corresponds with name {}".format(unknown.pop()))
+        converter = self._cell_converter
+        if self._profiler is not None:
+            converter = _ProfiledConverter(converter, self._profiler)
+        get_column_converter = getattr(converter, "get_column_converter", None)
+        from_column = getattr(converter, "from_column", None)
+        plan = {}
+        for property_name, (values, format_types) in six.iteritems(columns):
+            value_type = self._schema.get(property_name)
+            if value_type is not None:
+                column_converter = _get_typed_column_converter(
+                    value_type, property_name
+                )
+                if self._profiler is not None:
+                    column_converter = _profile_function(
+                        column_converter,
+                        profiler=self._profiler,
+                        converter_name="schema.{}".format(value_type.__name__),
+                        column=property_name,
+                    )
+                plan[property_name] = column_converter
+                continue
+            # Empty cells convert to "" whatever their format is
+            distinct_format_types = set(
+                format_type
+                for value, format_type in zip(values, format_types)
+                if value != ""
+            )
+            column_converter = None
+            if len(distinct_format_types) <= 1:
+                format_type = (
+                    distinct_format_types.pop() if distinct_format_types else None
+                )
+                if get_column_converter is not None:
+                    column_converter = get_column_converter(
+                        format_type=format_type, property_name=property_name
+                    )
+                if column_converter is None and from_column is not None:
+                    column_converter = functools.partial(
+                        from_column,
+                        format_type=format_type,
+                        property_name=property_name,
+                    )
+            if column_converter is None:
+                column_converter = functools.partial(
+                    _convert_values,
+                    converter.from_value,
+                    format_types=format_types,
+                    property_name=property_name,
+                )
+            plan[property_name] = column_converter
+        return plan
+
+    def _get_model_from_columns(
+        self, columns, property_to_column, row_index, row_number
+    ):
+        """Given converted column values, return a Model for one row.
+
+        Args:
+          columns (dict): property names mapped to lists of converted values
+          property_to_column (dict): property names mapped to column numbers
+          row_index (int): index of the row in the lists of values
+          row_number (int): row number in the sheet
+        Returns:
+          Model: Model object populated from columns
+        """
+        model = self._get_model_class()(
+            repository=self, cell_converter=self._cell_converter
+        )
+        for property_name, column_number in six.iteritems(property_to_column):
+            model.Metadata.add_value(
+                property_name=property_name,
+                row=row_number,
+                column=column_number,
+                value=columns[property_name][row_index],
+            )
+        return model
 
+    def _get_table_from_values(self, start_row, values, format_types):
+        """Given rows of values and number format types, return a ColumnTable.
+
+        Args:
+          start_row (int): row number of the first row of values
+          values (list): rows of unformatted values, starting with column 1
+          format_types (list): rows of number format types, starting with column 1
+        Returns:
+          ColumnTable: table populated from values
         """
-        # Only get new models if none are cached
-        if not self._models:
-            rows = self.worksheet.get_all_values(
-                include_tailing_empty=False,
-                include_tailing_empty_rows=False,
-                returnas="cells",
+        table = ColumnTable(
+            repository=self, property_to_column=self._get_property_to_column()
+        )
+        with self._profile_phase(PHASE_CONVERSION):
+            table.columns = self._convert_columns(
+                values=values, format_types=format_types
             )
-            # Skip header row and iterate over cells
-            for row in rows[1:]:
-                model = self._get_model_from_row(row)
-                self._models.append(model)
-        if lambda_filter:
-            return list(filter(lambda_filter, self._models))
-        return self._models
+        table.row_numbers.extend(range(start_row, start_row + len(values)))
+        return table
+
+    def _get_models_from_rows(self, rows):
+        """Given rows of pygsheets.Cell objects, return a Model per row.
+        Columns in the schema, and every column if the cell converter's
+        from_cell only converts the cell's value, are converted a column at
+        a time with the conversion plan. Other cells are converted with
+        from_cell.
+
+        Args:
+          rows (list): lists of pygsheets.Cell objects
+        Returns:
+          list: Model objects populated from rows
+        """
+        property_names = set(self._get_property_to_column())
+        if not _converts_cell_values(self._cell_converter):
+            property_names.intersection_update(self._schema)
+        models = [self._get_model_from_row(row, planned=property_names) for row in rows]
+        if not property_names or not models:
+            return models
+        with self._profile_phase(PHASE_CONVERSION):
+            cells = dict(
+                (
+                    property_name,
+                    [
+                        model.Metadata.property_to_cell[property_name]
+                        for model in models
+                    ],
+                )
+                for property_name in property_names
+            )
+            columns = dict(
+                (
+                    property_name,
+                    (
+                        [cell.value_unformatted for cell in column_cells],
+                        [cell.format[0] for cell in column_cells],
+                    ),
+                )
+                for property_name, column_cells in six.iteritems(cells)
+            )
+            plan = self._get_conversion_plan(columns)
+            for property_name, (values, _) in six.iteritems(columns):
+                converted = plan[property_name](values)
+                for model, value in zip(models, converted):
+                    model.Metadata.set_value(property_name, value)
+        return models
 
-    def _get_model_from_row(self, row):
+    def _get_model_from_row(self, row, planned=()):
         """Given a list of pygsheets.Cell objects, return a Model.
 
         Args:
           row (list): list of pygsheets.Cell objects
+          planned (set): property names whose cells are not converted, the
+              caller sets their values (Default value = ())
         Returns:
           Model: Model object populated from row
         """
-        model = Model(repository=self, cell_converter=self._cell_converter)
+        profiler = self._profiler
+        converter = self._cell_converter
+        if profiler is not None:
+            converter = _ProfiledConverter(converter, profiler, phase=PHASE_CONVERSION)
+        model = self._get_model_class()(repository=self, cell_converter=converter)
+        if profiler is not None:
+            start = profiler.start()
 
         # Empty cells don't get returned so we create empties to work with
         columns_to_add = set(list(self._col_to_property_name.keys()))
@@ -349,14 +3846,631 @@ class Repository(object):
             cell_pos = (row_number, column_number)
             empty_cell = pygsheets.Cell(cell_pos, worksheet=self.worksheet)
             row.append(empty_cell)
+        if profiler is not None:
+            profiler.stop(start, phase=PHASE_PLACEHOLDERS)
 
         for cell in row:
             try:
                 property_name = self._col_to_property_name[cell.col]
-                model.Metadata.add_cell(cell=cell, property_name=property_name)
+                model.Metadata.add_cell(
+                    cell=cell,
+                    property_name=property_name,
+                    convert=property_name not in planned,
+                )
             except KeyError:
                 # Don't set properties for any values
                 # we don't have a mapping for
                 # there was no header
                 pass
+        if profiler is not None:
+            # Saves don't need to be profiled
+            model.Metadata.cell_converter = self._cell_converter
         return model
+
+    def add(self, record):
+        """Add a row to the end of the sheet. See insert_many().
+
+        Args:
+          record: dict of property names to values, or a Model
+
+        Returns:
+          Model: Model for the new row
+        """
+        return self.insert_many([record])[0]
+
+    def insert_many(self, records):
+        """Add rows to the end of the sheet with a single append request.
+        Values are written with the cell converter like saved values, and
+        properties a record doesn't have or that are None are left empty,
+        as "" like empty cells that are loaded. If Models are
+        cached, Models for the new rows are added to the cache without
+        reading the sheet again.
+
+        Args:
+          records (list): dicts of property names to values, or Models.
+              Models can be from another Repository, properties this
+              Repository doesn't have are ignored.
+
+        Returns:
+          list: Model objects for the new rows, holding the values given
+        """
+        if self._session is not None:
+            # Appended rows could not be taken back on rollback
+            raise SessionException("insert_many() can't be used in a session")
+        if not records:
+            return []
+        property_to_column = self._get_property_to_column()
+        columns = dict((property_name, []) for property_name in property_to_column)
+        for record in records:
+            record = self._get_record_values(record, property_to_column)
+            for property_name, values in six.iteritems(columns):
+                value = record.get(property_name)
+                values.append("" if value is None else value)
+        cached = bool(self._models)
+        if cached and self._storage == STORAGE_COLUMNS:
+            last_row = self._table.row_numbers[-1]
+        elif cached:
+            last_row = self._models[-1].Metadata.row
+        else:
+            # Let the API find the end of the sheet
+            last_row = 0
+        rows = self._get_rows_to_append(
+            columns=columns,
+            property_to_column=property_to_column,
+            start_row=last_row + 1,
+            row_count=len(records),
+        )
+        start_row = self._append_rows(rows=rows, start_row=last_row + 1)
+        if cached and start_row != last_row + 1:
+            LOG.debug("Rows were appended at row %s, clearing cached models", start_row)
+            self._models = []
+            self._table = None
+            cached = False
+        row_numbers = list(range(start_row, start_row + len(records)))
+        return self._add_new_models(
+            columns=columns,
+            property_to_column=property_to_column,
+            row_numbers=row_numbers,
+            cached=cached,
+        )
+
+    def _get_record_values(self, record, property_to_column):
+        """Get the property values of a record to write.
+
+        Args:
+          record: dict of property names to values, or a Model. Properties
+              of a Model this Repository doesn't have are ignored.
+          property_to_column (dict): property names mapped to column numbers
+
+        Returns:
+          dict: property names mapped to values
+        """
+        if isinstance(record, Model):
+            metadata = record.Metadata
+            return dict(
+                (property_name, metadata.get_value(property_name))
+                for property_name in metadata.property_to_column
+                if property_name in property_to_column
+            )
+        for property_name in record:
+            if property_name not in property_to_column:
+                raise ValueError(
+                    "No column corresponds with name {}".format(property_name)
+                )
+        return record
+
+    def _add_new_models(self, columns, property_to_column, row_numbers, cached):
+        """Create Models for rows just written and add them to the cache.
+
+        Args:
+          columns (dict): property names mapped to lists of values
+          property_to_column (dict): property names mapped to column numbers
+          row_numbers (list): row numbers of the rows
+          cached (bool): add the Models to the cached Models and indexes
+
+        Returns:
+          list: Model objects for the rows
+        """
+        if self._storage == STORAGE_COLUMNS:
+            table = self._table if cached else None
+            if table is None:
+                table = ColumnTable(
+                    repository=self, property_to_column=property_to_column
+                )
+            if cached:
+                self._table = table
+            first_index = len(table)
+            for property_name, values in six.iteritems(columns):
+                table.columns[property_name].extend(values)
+            table.row_numbers.extend(row_numbers)
+            models = [
+                ColumnarModel(table=table, index=index)
+                for index in range(first_index, len(table))
+            ]
+        else:
+            models = [
+                self._get_model_from_columns(
+                    columns=columns,
+                    property_to_column=property_to_column,
+                    row_index=row_index,
+                    row_number=row_number,
+                )
+                for row_index, row_number in enumerate(row_numbers)
+            ]
+        if cached:
+            self._models.extend(models)
+            # Indexed on the next lookup, which reports a clashing value
+            for index in self._indexes.values():
+                for model in models:
+                    index.pending[id(model)] = model
+        return models
+
+    def delete_where(self, predicate):
+        """Delete every row whose cached Model matches a predicate. Matching
+        rows are merged into runs of consecutive rows, and all runs are
+        deleted in a single request. Cached Models below deleted rows are
+        moved up to their new row numbers. The Models of deleted rows keep
+        their values but no longer have a row, saving them raises
+        DeletedModelException.
+
+        Args:
+          predicate (function): called with each Model, returns True if
+              its row should be deleted
+
+        Returns:
+          list: Model objects of the deleted rows
+        """
+        if self._session is not None:
+            # Changes held by the session refer to rows by number
+            raise SessionException("delete_where() can't be used in a session")
+        models = self.get_all()
+        deleted = [model for model in models if predicate(model)]
+        if not deleted:
+            return []
+        deleted_rows = sorted(model.Metadata.row for model in deleted)
+        self._delete_rows(_merge_row_ranges(deleted_rows))
+        self._remove_deleted_models(deleted)
+        return deleted
+
+    def _remove_deleted_models(self, deleted):
+        """Remove Models of deleted rows from the cache, detach them from
+        their rows and move the Models below them up to their new row
+        numbers.
+
+        Args:
+          deleted (list): cached Model objects whose rows were deleted
+        """
+        deleted_rows = sorted(model.Metadata.row for model in deleted)
+        self._detach_models(deleted)
+        deleted_ids = set(id(model) for model in deleted)
+        kept = [model for model in self._models if id(model) not in deleted_ids]
+        if self._storage == STORAGE_COLUMNS:
+            old_table = self._table
+            table = ColumnTable(
+                repository=self, property_to_column=old_table.property_to_column
+            )
+            for index, model in enumerate(kept):
+                old_index = model._index
+                for property_name, values in six.iteritems(table.columns):
+                    values.append(old_table.columns[property_name][old_index])
+                row = old_table.row_numbers[old_index]
+                shift = bisect.bisect_left(deleted_rows, row)
+                table.row_numbers.append(row - shift)
+                if old_index in old_table.modified:
+                    table.modified[index] = old_table.modified[old_index]
+                if not shift and old_index in old_table.cells:
+                    table.cells[index] = old_table.cells[old_index]
+                object.__setattr__(model, "_table", table)
+                object.__setattr__(model, "_index", index)
+            self._table = table
+        else:
+            for model in kept:
+                metadata = model.Metadata
+                shift = bisect.bisect_left(deleted_rows, metadata.row)
+                if shift:
+                    metadata.row -= shift
+                    # Cells are linked to the old row
+                    metadata.property_to_cell = {}
+        self._models[:] = kept
+        self._build_indexes()
+
+    def _detach_models(self, models):
+        """Take Models of deleted rows off their rows. They keep their
+        values, pending changes are dropped.
+
+        Args:
+          models (list): cached Model objects whose rows were deleted
+        """
+        if self._storage != STORAGE_COLUMNS:
+            for model in models:
+                metadata = model.Metadata
+                metadata.row = None
+                metadata.property_to_cell = {}
+                metadata.reset_modified_properties()
+            return
+        old_table = self._table
+        for model in models:
+            # Each Model gets a table of its own, without a row number
+            table = ColumnTable(
+                repository=self, property_to_column=old_table.property_to_column
+            )
+            for property_name, values in six.iteritems(table.columns):
+                values.append(old_table.columns[property_name][model._index])
+            table.row_numbers.append(None)
+            object.__setattr__(model, "_table", table)
+            object.__setattr__(model, "_index", 0)
+
+    def update_where(self, predicate, **kwargs):
+        """Set properties of every cached Model that matches a predicate
+        and save them. Changed cells of all Models are merged into range
+        updates sent in as few batch requests as possible. Inside a session
+        the save is deferred until the session is committed.
+
+        Args:
+          predicate (function): called with each Model, returns True if
+              it should be updated
+          kwargs: property names mapped to new values
+
+        Returns:
+          list: Model objects that matched
+        """
+        property_to_column = self._get_property_to_column()
+        for property_name in kwargs:
+            if property_name not in property_to_column:
+                raise ValueError(
+                    "No column corresponds with name {}".format(property_name)
+                )
+        matches = [model for model in self.get_all() if predicate(model)]
+        for model in matches:
+            for property_name, value in six.iteritems(kwargs):
+                setattr(model, property_name, value)
+        if self._session is None:
+            self._save_models(matches)
+        return matches
+
+    def sync(self, records, key, delete=True):
+        """Make the sheet hold the given records, writing only what changed.
+        Records are matched to cached Models by the value of a key property.
+        Properties of matched Models that differ are set, rows for new keys
+        are added after the last row and, with delete, rows whose key isn't
+        in records are deleted. Deleting and inserting rows is one batch
+        request, and the changed cells and values of new rows are merged
+        into range updates sent in as few batch requests as possible.
+        The cache is kept up to date without reading the sheet again.
+
+        Args:
+          records: list of dicts of property names to values or Models, or
+              a pandas DataFrame with property names as column names. None
+              and missing values mean an empty cell. Properties a record
+              doesn't have are left as they are.
+          key (str): property name identifying a row. If several rows have
+              the same key, the first one is matched.
+          delete (bool): delete rows whose key isn't in records.
+              Default value = True
+
+        Returns:
+          SyncResult: added, updated and removed Models. Removed Models no
+                      longer have a row, see delete_where().
+        """
+        if self._session is not None:
+            raise SessionException("sync() can't be used in a session")
+        property_to_column = self._get_property_to_column()
+        if key not in property_to_column:
+            raise ValueError("No column corresponds with name {}".format(key))
+        if pandas is not None and isinstance(records, pandas.DataFrame):
+            records = _get_dataframe_records(records)
+        models = self.get_all()
+        models_by_key = {}
+        for model in models:
+            models_by_key.setdefault(getattr(model, key), model)
+        keys = set()
+        updated = []
+        new_records = []
+        for record in records:
+            record = dict(
+                (property_name, "" if value is None else value)
+                for property_name, value in six.iteritems(
+                    self._get_record_values(record, property_to_column)
+                )
+            )
+            if key not in record:
+                raise ValueError("Record has no {}".format(key))
+            if record[key] in keys:
+                raise ValueError(
+                    "More than one record has {} {}".format(key, record[key])
+                )
+            keys.add(record[key])
+            model = models_by_key.get(record[key])
+            if model is None:
+                new_records.append(record)
+                continue
+            changed = False
+            for property_name, value in six.iteritems(record):
+                if _values_differ(getattr(model, property_name), value):
+                    setattr(model, property_name, value)
+                    changed = True
+            if changed:
+                updated.append(model)
+        removed = []
+        if delete:
+            removed = [model for model in models if getattr(model, key) not in keys]
+
+        last_row = models[-1].Metadata.row - len(removed) if models else 1
+        requests = []
+        if removed:
+            deleted_rows = sorted(model.Metadata.row for model in removed)
+            requests.extend(self._get_delete_requests(_merge_row_ranges(deleted_rows)))
+        if new_records:
+            # Insert rows right after the data, formatted like the last row
+            requests.append(
+                {
+                    "insertDimension": {
+                        "range": {
+                            "sheetId": self.worksheet.id,
+                            "dimension": "ROWS",
+                            "startIndex": last_row,
+                            "endIndex": last_row + len(new_records),
+                        },
+                        "inheritFromBefore": last_row > 1,
+                    }
+                }
+            )
+        if requests:
+            self._update_sheet(requests, operation=OPERATION_SYNC)
+        if removed:
+            self._remove_deleted_models(removed)
+
+        updates, saved_models = self._get_pending_updates(updated)
+        added = []
+        if new_records:
+            columns = dict((property_name, []) for property_name in property_to_column)
+            for record in new_records:
+                for property_name, values in six.iteritems(columns):
+                    values.append(record.get(property_name, ""))
+            rows = self._get_rows_to_append(
+                columns=columns,
+                property_to_column=property_to_column,
+                start_row=last_row + 1,
+                row_count=len(new_records),
+            )
+            for row_number, row in enumerate(rows, last_row + 1):
+                for column, value in enumerate(row, 1):
+                    if value != "":
+                        updates.append((row_number, column, value))
+            added = self._add_new_models(
+                columns=columns,
+                property_to_column=property_to_column,
+                row_numbers=list(range(last_row + 1, last_row + 1 + len(new_records))),
+                cached=True,
+            )
+        for batch in self._split_updates(updates):
+            self._batch_update(batch, operation=OPERATION_SYNC)
+        for model in saved_models:
+            model.Metadata.reset_modified_properties()
+        return SyncResult(added=added, updated=updated, removed=removed)
+
+    def _get_rows_to_append(self, columns, property_to_column, start_row, row_count):
+        """Convert values of new rows with the cell converter.
+
+        Args:
+          columns (dict): property names mapped to lists of values
+          property_to_column (dict): property names mapped to column numbers
+          start_row (int): row number the first row is expected at
+          row_count (int): number of rows
+
+        Returns:
+          list: rows of cell values, starting with column 1
+        """
+        width = max(self._col_to_property_name) if self._col_to_property_name else 0
+        rows = [[""] * width for _ in range(row_count)]
+        for property_name, column in six.iteritems(property_to_column):
+            # One unlinked cell per column is enough to collect converted values
+            unlinked_cell = pygsheets.Cell((start_row, column))
+            for row, value in zip(rows, columns[property_name]):
+                if value is None or value == "":
+                    continue
+                self._cell_converter.to_cell(
+                    cell=unlinked_cell, property_name=property_name, value=value
+                )
+                row[column - 1] = unlinked_cell.value
+        return rows
+
+    def session(self):
+        """Start a unit of work. Use as a context manager:
+
+            with repo.session():
+                for model in repo.get_all():
+                    model.status = "done"
+
+        Changes made inside the block are written together when the block
+        exits. If the block raises, pending changes are discarded and
+        Models are restored to their original values.
+
+        Returns:
+          Session: session for this repository
+        """
+        return Session(self)
+
+    def save_all(self):
+        """Save every cached Model that has modified properties. Modified
+        cells from all models are combined into as few batch requests as
+        the API payload limits allow. Inside a session the save is deferred
+        until the session is committed.
+        """
+        if self._session is not None:
+            self._session.save(self._models)
+            return
+        self._save_models(self._models)
+
+    def _save_models(self, models, operation=OPERATION_BATCH_SAVE):
+        """Save modified properties for the given models using batch requests.
+
+        Args:
+          models (list): Model objects to save
+          operation (str): operation to record the requests under.
+              Default value = OPERATION_BATCH_SAVE
+        """
+        updates, saved_models = self._get_pending_updates(models)
+        for batch in self._split_updates(updates):
+            self._batch_update(batch, operation=operation)
+        for model in saved_models:
+            model.Metadata.reset_modified_properties()
+
+    def _get_pending_updates(self, models):
+        """Collect the cell updates of modified properties.
+
+        Args:
+          models (list): Model objects
+
+        Returns:
+          tuple: ((row, column, value) tuples, Models that have updates)
+        """
+        updates = []
+        saved_models = []
+        for model in models:
+            pending_updates = model.Metadata.get_pending_updates()
+            if pending_updates:
+                updates.extend(pending_updates)
+                saved_models.append(model)
+        return updates, saved_models
+
+    def _split_updates(self, updates):
+        """Split cell updates into batches that fit in a single request.
+
+        Args:
+          updates (list): (row, column, value) tuples
+
+        Returns:
+          list: lists of (row, column, value) tuples
+        """
+        batches = []
+        batch = []
+        batch_bytes = 0
+        for update in updates:
+            update_bytes = BATCH_UPDATE_RANGE_OVERHEAD_BYTES + len(
+                six.text_type(update[2]).encode("utf-8")
+            )
+            if batch and (
+                len(batch) >= BATCH_UPDATE_MAX_CELLS
+                or batch_bytes + update_bytes > BATCH_UPDATE_MAX_BYTES
+            ):
+                batches.append(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append(update)
+            batch_bytes += update_bytes
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @_retry_over_quota(OPERATION_BATCH_SAVE)
+    def _batch_update(self, updates, operation=OPERATION_BATCH_SAVE):
+        """Write cell values in one request with exponential backoff retry up
+           to 60 seconds. Retry specifically happens if you hit API quota.
+
+        Args:
+          updates (list): (row, column, value) tuples
+          operation (str): operation to record the request under.
+              Default value = OPERATION_BATCH_SAVE
+        """
+        self._send_batch_update(updates, operation=operation)
+
+    @_retry_over_quota(OPERATION_APPEND)
+    def _append_rows(self, rows, start_row):
+        """Append rows after the last row of data at or below start_row in
+        one request, with the same retry as _batch_update().
+
+        Args:
+          rows (list): rows of cell values, starting with column 1
+          start_row (int): row number to look for the end of the data from
+
+        Returns:
+          int: row number the first row was written to
+        """
+        with self._api_request(REQUEST_WRITE, OPERATION_APPEND) as record:
+            record.set_payload(rows)
+            response = self.worksheet.client.sheet.values_append(
+                self.worksheet.spreadsheet.id,
+                rows,
+                "ROWS",
+                range=self._get_range_label(start_row),
+                insertDataOption="INSERT_ROWS",
+                valueInputOption="USER_ENTERED",
+            )
+        updated_range = response.get("updates", {}).get("updatedRange", "")
+        match = re.search(r"!\$?[A-Z]+\$?([0-9]+)", updated_range)
+        if match is None:
+            raise SpreadsheetException(
+                "Unexpected append response {}".format(updated_range)
+            )
+        return int(match.group(1))
+
+    def _delete_rows(self, row_ranges):
+        """Delete runs of rows in one request.
+
+        Args:
+          row_ranges (list): (first row, last row) tuples in row order
+        """
+        self._update_sheet(self._get_delete_requests(row_ranges))
+
+    def _get_delete_requests(self, row_ranges):
+        """Get the batchUpdate requests that delete runs of rows.
+
+        Args:
+          row_ranges (list): (first row, last row) tuples in row order
+
+        Returns:
+          list: deleteDimension requests
+        """
+        # Delete from the bottom up so earlier deletes don't move later ones
+        return [
+            {
+                "deleteDimension": {
+                    "range": {
+                        "sheetId": self.worksheet.id,
+                        "dimension": "ROWS",
+                        "startIndex": first_row - 1,
+                        "endIndex": last_row,
+                    }
+                }
+            }
+            for first_row, last_row in reversed(row_ranges)
+        ]
+
+    @_retry_over_quota(OPERATION_DELETE)
+    def _update_sheet(self, requests, operation=OPERATION_DELETE):
+        """Send spreadsheet batchUpdate requests in one request, with the
+        same retry as _batch_update().
+
+        Args:
+          requests (list): batchUpdate requests
+          operation (str): operation to record the request under.
+              Default value = OPERATION_DELETE
+        """
+        with self._api_request(REQUEST_WRITE, operation) as record:
+            record.set_payload(requests)
+            self.worksheet.client.sheet.batch_update(
+                self.worksheet.spreadsheet.id, requests
+            )
+
+    def _send_batch_update(self, updates, operation=OPERATION_BATCH_SAVE):
+        """Write cell values in one request.
+
+        Args:
+          updates (list): (row, column, value) tuples
+          operation (str): operation to record the request under.
+              Default value = OPERATION_BATCH_SAVE
+        """
+        ranges = []
+        values = []
+        for start_row, start_column, matrix in _merge_cell_updates(updates):
+            start = (start_row, start_column)
+            end = (start_row + len(matrix) - 1, start_column + len(matrix[0]) - 1)
+            label = pygsheets.utils.format_addr(start, "label")
+            if end != start:
+                label += ":" + pygsheets.utils.format_addr(end, "label")
+            ranges.append(label)
+            values.append(matrix)
+        with self._api_request(REQUEST_WRITE, operation) as record:
+            record.set_payload({"ranges": ranges, "values": values})
+            self.worksheet.update_values_batch(ranges=ranges, values=values, parse=True)
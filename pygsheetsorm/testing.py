@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+In-memory stand-in for a pygsheets.Worksheet, for tests and benchmarks
+that need a Repository without a real Google Sheet
+"""
+import collections
+import datetime
+import numbers
+import re
+import pygsheets
+import six
+
+# Sheets serial numbers count days from this date
+SERIAL_EPOCH = datetime.datetime(year=1899, month=12, day=30)
+# Rows a new sheet has when no row count is given
+DEFAULT_ROW_COUNT = 1000
+
+
+def _to_serial(value):
+    """Convert a datetime to a Sheets serial number."""
+    delta = value - SERIAL_EPOCH
+    return delta.days + (delta.seconds + delta.microseconds / 1e6) / 86400.0
+
+
+def _parse_user_entered(value, format_type):
+    """Interpret a written value roughly the way Sheets does with the
+    USER_ENTERED input option.
+
+    Args:
+      value: value written
+      format_type (str): number format type of the cell
+
+    Returns:
+      tuple: (unformatted value, number format type)
+    """
+    if not isinstance(value, six.string_types):
+        return value, format_type
+    if value.upper() in (u"TRUE", u"FALSE"):
+        return value.upper() == u"TRUE", format_type
+    for pattern, parsed_format_type in (
+        ("%Y-%m-%d %H:%M:%S", u"DATE_TIME"),
+        ("%Y-%m-%d", u"DATE"),
+        ("%H:%M:%S", u"TIME"),
+    ):
+        try:
+            parsed = datetime.datetime.strptime(value, pattern)
+        except ValueError:
+            continue
+        if parsed_format_type == u"TIME":
+            serial = _to_serial(parsed) - _to_serial(parsed.replace(hour=0, minute=0))
+        else:
+            serial = _to_serial(parsed)
+        return serial, format_type or parsed_format_type
+    try:
+        return int(value), format_type
+    except ValueError:
+        pass
+    try:
+        return float(value), format_type
+    except ValueError:
+        return value, format_type
+
+
+def _get_cell_data(value, format_type):
+    """Build CellData as the Sheets API returns it."""
+    cell_data = {}
+    if value != u"":
+        if isinstance(value, bool):
+            cell_data["effectiveValue"] = {"boolValue": value}
+        elif isinstance(value, numbers.Number):
+            cell_data["effectiveValue"] = {"numberValue": value}
+        else:
+            cell_data["effectiveValue"] = {"stringValue": value}
+        cell_data["formattedValue"] = _format_value(value)
+    if format_type is not None:
+        cell_data["userEnteredFormat"] = {"numberFormat": {"type": format_type}}
+    return cell_data
+
+
+def _format_value(value):
+    """Format a value for display, close enough to what Sheets shows."""
+    if isinstance(value, bool):
+        return u"TRUE" if value else u"FALSE"
+    return six.text_type(value)
+
+
+def _parse_range(label):
+    """Parse an A1 range, optionally with a sheet title.
+
+    Args:
+      label (str): range such as "'Sheet1'!A2:C", "A2:B3", "B4" or "'Sheet1'"
+
+    Returns:
+      tuple: (start row, start column, end row, end column). Parts that are
+             not given are None.
+    """
+    if "!" in label:
+        label = label.split("!", 1)[1]
+    elif label.startswith("'"):
+        return None, None, None, None
+    parts = label.replace("$", "").split(":")
+    bounds = []
+    for part in parts:
+        match = re.match(r"^([A-Z]*)([0-9]*)$", part)
+        column = None
+        if match.group(1):
+            column = 0
+            for letter in match.group(1):
+                column = column * 26 + ord(letter) - ord("A") + 1
+        row = int(match.group(2)) if match.group(2) else None
+        bounds.append((row, column))
+    if len(bounds) == 1:
+        bounds.append(bounds[0])
+    (start_row, start_column), (end_row, end_column) = bounds
+    return start_row, start_column, end_row, end_column
+
+
+class FakeWorksheet(object):
+    """In-memory stand-in for a pygsheets.Worksheet. It implements what a
+    Repository uses: reading the header row and all values as cells, grid
+    data requests, batch value updates, appends, and inserting and deleting
+    rows. Every call that would be a request to Google is counted in calls.
+
+    Cells returned by get_row() and get_all_values() are not linked, so
+    setting their value doesn't write to the sheet.
+
+    Args:
+      rows (list): rows of values, the first row being the header. Values
+          are unformatted, e.g. numbers and bools, and dates as serial numbers.
+      format_types (list): rows of number format types for the values, e.g.
+          "DATE". None means no format for every cell. Default value = None
+      title (str): title of the sheet. Default value = "Sheet1"
+      row_count (int): number of rows in the sheet. Default value = the larger
+          of the number of rows and DEFAULT_ROW_COUNT
+
+    """
+
+    def __init__(self, rows, format_types=None, title="Sheet1", row_count=None):
+        self.title = title
+        self.id = 0
+        self.calls = collections.Counter()
+        self.values = [list(row) for row in rows]
+        if format_types is None:
+            format_types = [[None] * len(row) for row in rows]
+        self.format_types = [list(row) for row in format_types]
+        self.row_count = max(len(rows), row_count or DEFAULT_ROW_COUNT)
+        self.revision = 0
+        self.spreadsheet = _FakeSpreadsheet(self)
+        self.client = _FakeClient(self)
+
+    @property
+    def api_calls(self):
+        """Total number of calls that would have been requests."""
+        return sum(self.calls.values())
+
+    def get_value(self, row, column):
+        """Get the unformatted value of a cell, "" if it is empty."""
+        try:
+            return self.values[row - 1][column - 1]
+        except IndexError:
+            return u""
+
+    def get_format_type(self, row, column):
+        """Get the number format type of a cell, None if it has none."""
+        try:
+            return self.format_types[row - 1][column - 1]
+        except IndexError:
+            return None
+
+    def set_value(self, row, column, value, parse=True):
+        """Write a value to a cell, parsing strings like USER_ENTERED
+        values when parse is True."""
+        format_type = self.get_format_type(row, column)
+        if parse:
+            value, format_type = _parse_user_entered(value, format_type)
+        while len(self.values) < row:
+            self.values.append([])
+            self.format_types.append([])
+        for matrix, cell_value in (
+            (self.values, value),
+            (self.format_types, format_type),
+        ):
+            matrix_row = matrix[row - 1]
+            while len(matrix_row) < column:
+                matrix_row.append(u"" if matrix is self.values else None)
+            matrix_row[column - 1] = cell_value
+        self.row_count = max(self.row_count, row)
+        self.revision += 1
+
+    def _get_last_row(self):
+        """Row number of the last row with a value, 0 if there is none."""
+        for row in range(len(self.values), 0, -1):
+            if any(value != u"" for value in self.values[row - 1]):
+                return row
+        return 0
+
+    def _get_cells(self, row, include_tailing_empty):
+        """Unlinked pygsheets.Cell objects for a row."""
+        values = self.values[row - 1] if row <= len(self.values) else []
+        width = len(values)
+        if not include_tailing_empty:
+            while width and values[width - 1] == u"":
+                width -= 1
+        return [
+            pygsheets.Cell(
+                (row, column),
+                cell_data=_get_cell_data(
+                    self.get_value(row, column), self.get_format_type(row, column)
+                ),
+            )
+            for column in range(1, width + 1)
+        ]
+
+    def get_row(self, row, returnas="matrix", include_tailing_empty=True, **kwargs):
+        self.calls["get_row"] += 1
+        cells = self._get_cells(row, include_tailing_empty)
+        if returnas == "cells":
+            return cells
+        return [cell.value for cell in cells]
+
+    def get_all_values(
+        self,
+        returnas="matrix",
+        include_tailing_empty=True,
+        include_tailing_empty_rows=True,
+        **kwargs
+    ):
+        self.calls["get_all_values"] += 1
+        row_count = self.row_count
+        if not include_tailing_empty_rows:
+            row_count = self._get_last_row()
+        rows = [
+            self._get_cells(row, include_tailing_empty)
+            for row in range(1, row_count + 1)
+        ]
+        if returnas == "cells":
+            return rows
+        return [[cell.value for cell in row] for row in rows]
+
+    def update_value(self, addr, val, parse=None):
+        self.calls["update_value"] += 1
+        row, column = pygsheets.utils.format_addr(addr, "tuple")
+        self.set_value(row, column, val, parse=parse is not False)
+
+    def update_values_batch(self, ranges, values, majordim="ROWS", parse=None):
+        self.calls["update_values_batch"] += 1
+        for label, matrix in zip(ranges, values):
+            start_row, start_column, _, _ = _parse_range(label)
+            for row_offset, row_values in enumerate(matrix):
+                for column_offset, value in enumerate(row_values):
+                    self.set_value(
+                        start_row + row_offset,
+                        start_column + column_offset,
+                        value,
+                        parse=parse is not False,
+                    )
+
+    def get_grid_data(self, label):
+        """Get a sheet resource with GridData for a range, as returned by
+        spreadsheets.get with includeGridData."""
+        start_row, start_column, end_row, end_column = _parse_range(label)
+        start_row = start_row or 1
+        start_column = start_column or 1
+        end_row = min(end_row or self.row_count, self.row_count)
+        row_data = []
+        for row in range(start_row, end_row + 1):
+            width = len(self.values[row - 1]) if row <= len(self.values) else 0
+            last_column = min(width, end_column or width)
+            cells = [
+                _get_cell_data(
+                    self.get_value(row, column), self.get_format_type(row, column)
+                )
+                for column in range(start_column, last_column + 1)
+            ]
+            while cells and not cells[-1]:
+                cells.pop()
+            row_data.append({"values": cells} if cells else {})
+        # Like the API, empty rows at the end of the range are not returned
+        while row_data and not row_data[-1]:
+            row_data.pop()
+        data = {"rowData": row_data}
+        if start_row > 1:
+            data["startRow"] = start_row - 1
+        if start_column > 1:
+            data["startColumn"] = start_column - 1
+        return {
+            "properties": {
+                "sheetId": self.id,
+                "title": self.title,
+                "index": 0,
+                "gridProperties": {"rowCount": self.row_count},
+            },
+            "data": [data],
+        }
+
+
+class _FakeSpreadsheet(object):
+    """Spreadsheet of a FakeWorksheet."""
+
+    def __init__(self, worksheet):
+        self.id = "fake_spreadsheet_id"
+        self.worksheet = worksheet
+
+    @property
+    def updated(self):
+        self.worksheet.calls["drive.get_update_time"] += 1
+        return six.text_type(self.worksheet.revision)
+
+
+class _FakeClient(object):
+    """Client of a FakeWorksheet."""
+
+    def __init__(self, worksheet):
+        self.sheet = _FakeSheetAPI(worksheet)
+
+
+class _FakeSheetAPI(object):
+    """The parts of pygsheets' SheetAPIWrapper a Repository uses."""
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def get(self, spreadsheet_id, fields=None, includeGridData=False, ranges=None):
+        self.worksheet.calls["sheet.get"] += 1
+        if isinstance(ranges, six.string_types):
+            return {"sheets": [self.worksheet.get_grid_data(ranges)]}
+        # One GridData per range, in the order they were asked for
+        sheets = [self.worksheet.get_grid_data(label) for label in ranges]
+        sheet = sheets[0]
+        sheet["data"] = [data for other in sheets for data in other["data"]]
+        return {"sheets": [sheet]}
+
+    def values_append(self, spreadsheet_id, values, major_dimension, range, **kwargs):
+        worksheet = self.worksheet
+        worksheet.calls["sheet.values_append"] += 1
+        start_row, start_column, _, _ = _parse_range(range)
+        first_row = max(worksheet._get_last_row(), (start_row or 1) - 1) + 1
+        start_column = start_column or 1
+        parse = kwargs.get("valueInputOption") != "RAW"
+        for row_offset, row_values in enumerate(values):
+            for column_offset, value in enumerate(row_values):
+                worksheet.set_value(
+                    first_row + row_offset, start_column + column_offset, value, parse
+                )
+        last_row = first_row + len(values) - 1
+        last_column = start_column + max(len(row) for row in values) - 1
+        updated_range = "'{}'!{}:{}".format(
+            worksheet.title,
+            pygsheets.utils.format_addr((first_row, start_column), "label"),
+            pygsheets.utils.format_addr((last_row, last_column), "label"),
+        )
+        return {"updates": {"updatedRange": updated_range}}
+
+    def batch_update(self, spreadsheet_id, requests, **kwargs):
+        worksheet = self.worksheet
+        worksheet.calls["sheet.batch_update"] += 1
+        for request in requests:
+            kind, body = next(iter(request.items()))
+            if kind not in ("deleteDimension", "insertDimension"):
+                raise NotImplementedError("{} is not supported".format(kind))
+            dimension_range = body["range"]
+            if dimension_range["dimension"] != "ROWS":
+                raise NotImplementedError("Only rows are supported")
+            start = dimension_range["startIndex"]
+            end = dimension_range["endIndex"]
+            if kind == "deleteDimension":
+                del worksheet.values[start:end]
+                del worksheet.format_types[start:end]
+                worksheet.row_count -= end - start
+            else:
+                inherit = body.get("inheritFromBefore") and start <= len(
+                    worksheet.format_types
+                )
+                for index in range(start, end):
+                    if index > len(worksheet.values):
+                        break
+                    row_format_types = []
+                    if inherit:
+                        row_format_types = list(worksheet.format_types[start - 1])
+                    worksheet.values.insert(index, [u""] * len(row_format_types))
+                    worksheet.format_types.insert(index, row_format_types)
+                worksheet.row_count += end - start
+            worksheet.revision += 1
@@ -29,4 +29,10 @@ setup(
     packages=["pygsheetsorm"],
     zip_safe=False,
     install_requires=["pygsheets>=2", "retrying", "oauth2client"],
+    extras_require={
+        "numpy": ["numpy"],
+        "pandas": ["pandas"],
+        "arrow": ["pyarrow"],
+        "prometheus": ["prometheus_client"],
+    },
 )
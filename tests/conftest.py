@@ -0,0 +1,11 @@
+# Copyright (c) 2018, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import sys
+
+collect_ignore = []
+if sys.version_info < (3, 5):
+    # pygsheetsorm.aio uses async syntax
+    collect_ignore.append("test_aio.py")
@@ -0,0 +1,130 @@
+# Copyright (c) 2018, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import asyncio
+import pytest
+import mock
+from mock import PropertyMock
+import httplib2
+import pygsheets
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.errors import HttpError
+from pygsheetsorm.aio import AsyncRepository
+
+
+def get_worksheet(names):
+    # Creates a worksheet with a "Name" column holding names, starting
+    # in row 2.
+    mock_worksheet = mock.create_autospec(pygsheets.Worksheet)
+    mock_worksheet.title = "Sheet1"
+    mock_worksheet.spreadsheet = mock.Mock(id="spreadsheet_id")
+    mock_worksheet.client = mock.Mock()
+    header_cell = mock.create_autospec(pygsheets.Cell)
+    header_cell.value = "Name"
+    type(header_cell).col = PropertyMock(return_value=1)
+    mock_worksheet.get_row.return_value = [header_cell]
+    row_data = [
+        {"values": [{"effectiveValue": {"stringValue": name}}]} for name in names
+    ]
+    mock_worksheet.client.sheet.get.return_value = {
+        "sheets": [{"data": [{"rowData": row_data}]}]
+    }
+    return mock_worksheet
+
+
+def get_quota_error():
+    response = httplib2.Response({"status": 429})
+    response.reason = "Insufficient tokens for quota"
+    return HttpError(response, b"Insufficient tokens for quota")
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+def test_async_repo_get_all(executor):
+    worksheet = get_worksheet(["a", "b"])
+
+    async def load():
+        repo = await AsyncRepository.create(
+            worksheet, executor=executor, fast_load=True
+        )
+        models = await repo.get_all()
+        assert await repo.get_all(lambda model: model.name == "b") == models[1:]
+        return models
+
+    models = run(load())
+    assert [model.name for model in models] == ["a", "b"]
+    assert worksheet.get_row.call_count == 1
+    assert worksheet.client.sheet.get.call_count == 1
+
+
+def test_async_repo_save_all(executor):
+    worksheet = get_worksheet(["a", "b"])
+
+    async def save():
+        repo = await AsyncRepository.create(
+            worksheet, executor=executor, fast_load=True
+        )
+        a, b = await repo.get_all()
+        a.name = "new a"
+        b.name = "new b"
+        await repo.save_all()
+        assert a.Metadata.get_modified_properties() == set()
+        await repo.save(a)
+
+    run(save())
+    worksheet.update_values_batch.assert_called_once_with(
+        ranges=["A2:A3"], values=[[["new a"], ["new b"]]], parse=True
+    )
+
+
+def test_async_repo_save_backoff(executor):
+    worksheet = get_worksheet(["a"])
+    worksheet.update_values_batch.side_effect = [get_quota_error(), None]
+    waits = []
+
+    async def sleep(seconds):
+        waits.append(seconds)
+
+    async def save():
+        repo = await AsyncRepository.create(
+            worksheet, executor=executor, fast_load=True
+        )
+        (a,) = await repo.get_all()
+        a.name = "new a"
+        with mock.patch("asyncio.sleep", sleep):
+            await repo.save(a)
+
+    run(save())
+    assert waits == [2]
+    assert worksheet.update_values_batch.call_count == 2
+
+
+def test_async_repo_save_gives_up(executor):
+    worksheet = get_worksheet(["a"])
+    worksheet.update_values_batch.side_effect = get_quota_error()
+
+    async def save():
+        repo = await AsyncRepository.create(
+            worksheet, executor=executor, fast_load=True, max_attempts=1
+        )
+        (a,) = await repo.get_all()
+        a.name = "new a"
+        await repo.save(a)
+        return a
+
+    with pytest.raises(HttpError):
+        run(save())
@@ -7,10 +7,17 @@ import pytest
 import mock
 from mock import PropertyMock
 import datetime
+import decimal
+import httplib2
+import json
 import pygsheetsorm
 import pygsheets
+import six
 from pygsheetsorm import Model, Repository, BasicCellConverter
 from pygsheets.custom_types import FormatType
+from googleapiclient.errors import HttpError
+from pygsheetsorm.pygsheetsorm import STORAGE_COLUMNS, PropertyNotLoadedException
+from pygsheetsorm.testing import FakeWorksheet
 
 
 @pytest.fixture
@@ -111,6 +118,1439 @@ def full_repo():
     return repo
 
 
+def get_cell_data(value, format_type=None):
+    cell_data = {}
+    if isinstance(value, bool):
+        cell_data["effectiveValue"] = {"boolValue": value}
+    elif isinstance(value, (int, float)):
+        cell_data["effectiveValue"] = {"numberValue": value}
+    elif value:
+        cell_data["effectiveValue"] = {"stringValue": value}
+    if format_type:
+        cell_data["userEnteredFormat"] = {"numberFormat": {"type": format_type}}
+    return cell_data
+
+
+def get_grid_worksheet():
+    # Creates a worksheet that returns grid data for the following data:
+    #
+    # | Name   | Birthday   | Is A Clone |
+    # |--------|------------|------------|
+    # | Rick   | 1/15/2018  | FALSE      |
+    # |        |            |            |
+    # | Beth   |            |            |
+    #
+    mock_worksheet = mock.create_autospec(pygsheets.Worksheet)
+    mock_worksheet.title = "Sheet1"
+    mock_worksheet.spreadsheet = mock.Mock(id="spreadsheet_id")
+    mock_worksheet.client = mock.Mock()
+    header = []
+    for column_index, value in enumerate(["Name", "Birthday", "Is A Clone"]):
+        header.append(get_mock_cell(value, column_number=column_index + 1))
+    mock_worksheet.get_row.return_value = header
+    row_data = [
+        {
+            "values": [
+                get_cell_data("Rick"),
+                get_cell_data(43115, format_type="DATE"),
+                get_cell_data(False),
+            ]
+        },
+        {},
+        {"values": [get_cell_data("Beth"), get_cell_data("", format_type="DATE")]},
+    ]
+    mock_worksheet.client.sheet.get.return_value = {
+        "sheets": [{"data": [{"rowData": row_data}]}]
+    }
+    return mock_worksheet
+
+
+@pytest.fixture
+def fast_repo():
+    return Repository(pygsheets_worksheet=get_grid_worksheet(), fast_load=True)
+
+
+@pytest.fixture
+def columnar_repo():
+    return Repository(pygsheets_worksheet=get_grid_worksheet(), storage="columns")
+
+
+def test_repo_fast_load_get_all(fast_repo):
+    models = fast_repo.get_all()
+    assert fast_repo.worksheet.client.sheet.get.call_count == 1
+    assert not fast_repo.worksheet.get_all_values.called
+    _, kwargs = fast_repo.worksheet.client.sheet.get.call_args
+    assert kwargs["ranges"] == "'Sheet1'!A2:C"
+    assert kwargs["fields"] == pygsheetsorm.pygsheetsorm.GRID_DATA_FIELDS
+    assert len(models) == 3
+    assert models[0].name == "Rick"
+    assert models[0].birthday == datetime.date(2018, 1, 15)
+    assert models[0].is_a_clone is False
+    assert models[1].name == ""
+    assert models[2].name == "Beth"
+    assert models[2].birthday == ""
+    assert models[2].is_a_clone == ""
+    assert [model.Metadata.row for model in models] == [2, 3, 4]
+    assert models[0].Metadata.property_to_cell == {}
+
+
+def test_repo_fast_load_converts_by_column(fast_repo):
+    with mock.patch.object(
+        BasicCellConverter, "from_column", autospec=True, return_value=[1, 2, 3]
+    ) as from_column:
+        models = fast_repo.get_all()
+    assert from_column.call_count == 3
+    format_types = dict(
+        (kwargs["property_name"], kwargs["format_type"])
+        for _, kwargs in from_column.call_args_list
+    )
+    assert format_types == {"name": None, "birthday": "DATE", "is_a_clone": None}
+    assert [model.birthday for model in models] == [1, 2, 3]
+
+
+def test_repo_fast_load_save(fast_repo):
+    model = fast_repo.get_all()[2]
+    model.is_a_clone = True
+    model.Save()
+    _, kwargs = fast_repo.worksheet.update_values_batch.call_args
+    assert kwargs["ranges"] == ["C4"]
+    assert kwargs["values"] == [[["True"]]]
+
+
+def test_model_get_cell_created_on_demand(fast_repo):
+    model = fast_repo.get_all()[0]
+    cell = model.Metadata.get_cell("birthday")
+    assert (cell.row, cell.col) == (2, 2)
+    assert model.Metadata.get_cell("birthday") is cell
+
+
+def get_names_worksheet(names, row_count):
+    # Creates a worksheet with a "Name" column that serves grid data from
+    # names, a dict of row number to name. Changes to names show up in
+    # later fetches.
+    mock_worksheet = mock.create_autospec(pygsheets.Worksheet)
+    mock_worksheet.title = "Sheet1"
+    mock_worksheet.spreadsheet = mock.Mock(id="spreadsheet_id")
+    mock_worksheet.client = mock.Mock()
+    mock_worksheet.get_row.return_value = [get_mock_cell("Name")]
+
+    def get(spreadsheet_id, fields, includeGridData, ranges):
+        start, end = ranges.split("!")[1].split(":")
+        start_row = int(start[1:])
+        end_row = int(end[1:]) if end[1:] else row_count
+        row_data = []
+        for row_number in range(start_row, min(end_row, row_count) + 1):
+            if row_number in names:
+                row_data.append({"values": [get_cell_data(names[row_number])]})
+            else:
+                row_data.append({})
+        # Like the API, empty rows at the end of the range are not returned
+        while row_data and not row_data[-1]:
+            row_data.pop()
+        sheet = {"properties": {"gridProperties": {"rowCount": row_count}}}
+        sheet["data"] = [{"rowData": row_data}]
+        return {"sheets": [sheet]}
+
+    mock_worksheet.client.sheet.get.side_effect = get
+    return mock_worksheet
+
+
+@pytest.fixture
+def windowed_worksheet():
+    # Serves grid data for the following rows, in a sheet with 10 rows:
+    #
+    # | Name |
+    # |------|
+    # | a    |
+    # | b    |
+    # |      |
+    # |      |
+    # | c    |
+    #
+    return get_names_worksheet(names={2: "a", 3: "b", 6: "c"}, row_count=10)
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+@pytest.mark.parametrize("storage", ["rows", "columns"])
+def test_repo_iter_all(windowed_worksheet, prefetch, storage):
+    repo = Repository(pygsheets_worksheet=windowed_worksheet, storage=storage)
+    models = list(repo.iter_all(chunk_rows=2, prefetch=prefetch))
+    assert [model.name for model in models] == ["a", "b", "", "", "c"]
+    assert [model.Metadata.row for model in models] == [2, 3, 4, 5, 6]
+    requested_ranges = [
+        kwargs["ranges"]
+        for _, kwargs in windowed_worksheet.client.sheet.get.call_args_list
+    ]
+    assert requested_ranges == [
+        "'Sheet1'!A2:A3",
+        "'Sheet1'!A4:A5",
+        "'Sheet1'!A6:A7",
+        "'Sheet1'!A8:A9",
+        "'Sheet1'!A10:A11",
+    ]
+    assert repo._models == []
+
+
+def test_repo_iter_all_matches_get_all(windowed_worksheet):
+    repo = Repository(pygsheets_worksheet=windowed_worksheet, fast_load=True)
+    iterated = [model.name for model in repo.iter_all(chunk_rows=3)]
+    assert iterated == [model.name for model in repo.get_all()]
+
+
+def test_repo_iter_all_save(windowed_worksheet):
+    repo = Repository(pygsheets_worksheet=windowed_worksheet)
+    for model in repo.iter_all(chunk_rows=2):
+        if model.name == "c":
+            model.name = "d"
+            model.Save()
+    _, kwargs = windowed_worksheet.update_values_batch.call_args
+    assert kwargs["ranges"] == ["A6"]
+
+
+def test_repo_iter_all_fetch_error(windowed_worksheet):
+    windowed_worksheet.client.sheet.get.side_effect = [
+        windowed_worksheet.client.sheet.get.side_effect(
+            "spreadsheet_id", None, True, "'Sheet1'!A2:A3"
+        ),
+        ValueError("boom"),
+    ]
+    repo = Repository(pygsheets_worksheet=windowed_worksheet)
+    models = repo.iter_all(chunk_rows=2)
+    assert next(models).name == "a"
+    assert next(models).name == "b"
+    with pytest.raises(ValueError):
+        next(models)
+
+
+def test_repo_iter_all_requires_from_value(windowed_worksheet):
+    repo = Repository(
+        pygsheets_worksheet=windowed_worksheet, cell_converter=CellOnlyConverter()
+    )
+    with pytest.raises(ValueError):
+        next(repo.iter_all())
+    assert not windowed_worksheet.client.sheet.get.called
+
+
+@pytest.mark.parametrize("storage", ["rows", "columns"])
+def test_repo_refresh_by_position(storage):
+    names = {2: "a", 3: "b", 4: "c"}
+    repo = Repository(
+        pygsheets_worksheet=get_names_worksheet(names=names, row_count=10),
+        fast_load=True,
+        storage=storage,
+    )
+    a, b, c = repo.get_all()
+    b.name = "local b"
+    names.update({2: "new a", 3: "new b", 5: "d"})
+    result = repo.refresh()
+    assert [model.name for model in repo.get_all()] == [
+        "new a",
+        "local b",
+        "c",
+        "d",
+    ]
+    assert repo.get_all()[:3] == [a, b, c]
+    assert result.updated == [a]
+    assert [model.name for model in result.added] == ["d"]
+    assert result.removed == []
+    assert b.Metadata.get_modified_properties() == set(["name"])
+
+    del names[5]
+    del names[4]
+    result = repo.refresh()
+    assert repo.get_all() == [a, b]
+    assert result.removed[0] is c
+    assert [model.name for model in result.removed] == ["c", "d"]
+
+
+@pytest.mark.parametrize("storage", ["rows", "columns"])
+def test_repo_refresh_by_key(storage):
+    names = {2: "a", 3: "b", 4: "c"}
+    repo = Repository(
+        pygsheets_worksheet=get_names_worksheet(names=names, row_count=10),
+        fast_load=True,
+        storage=storage,
+    )
+    a, b, c = repo.get_all()
+    # Row 3 is deleted and a row is inserted above a
+    names.clear()
+    names.update({2: "z", 3: "a", 4: "c"})
+    result = repo.refresh(key="name")
+    assert [model.name for model in repo.get_all()] == ["z", "a", "c"]
+    assert repo.get_all()[1:] == [a, c]
+    assert [model.Metadata.row for model in repo.get_all()] == [2, 3, 4]
+    assert result.removed == [b]
+    assert result.updated == [a]
+    assert [model.name for model in result.added] == ["z"]
+    a.name = "new a"
+    a.Save()
+    _, kwargs = repo.worksheet.update_values_batch.call_args
+    assert kwargs["ranges"] == ["A3"]
+
+
+def test_repo_refresh_unknown_key(fast_repo):
+    with pytest.raises(ValueError):
+        fast_repo.refresh(key="this_doesnt_exist")
+
+
+def test_repo_refresh_cells(full_repo):
+    models = full_repo.get_all()
+    rows = full_repo.worksheet.get_all_values.return_value
+    rows[1][0] = get_mock_cell("changed", column_number=1, row_number=2)
+    result = full_repo.refresh()
+    assert full_repo.get_all() == models
+    assert models[0].header_row_1_column_1 == "changed"
+    assert result.updated == [models[0]]
+
+
+def get_snapshot_repo(worksheet, path, revision="2018-01-15T00:00:00.000Z"):
+    worksheet.spreadsheet.updated = revision
+    return Repository(
+        pygsheets_worksheet=worksheet,
+        snapshot_cache=pygsheetsorm.SnapshotCache(str(path)),
+    )
+
+
+def test_repo_snapshot_cache(tmpdir):
+    path = tmpdir.join("snapshots.db")
+    models = get_snapshot_repo(get_grid_worksheet(), path).get_all()
+    worksheet = get_grid_worksheet()
+    repo = get_snapshot_repo(worksheet, path)
+    cached_models = repo.get_all()
+    assert not worksheet.get_row.called
+    assert not worksheet.client.sheet.get.called
+    assert [model.name for model in cached_models] == [m.name for m in models]
+    assert cached_models[0].birthday == datetime.date(2018, 1, 15)
+    assert cached_models[0].is_a_clone is False
+    assert [model.Metadata.row for model in cached_models] == [2, 3, 4]
+    assert repo.refresh() == ([], [], [])
+    assert not worksheet.client.sheet.get.called
+
+
+def test_repo_snapshot_cache_revision_changed(tmpdir):
+    path = tmpdir.join("snapshots.db")
+    get_snapshot_repo(get_grid_worksheet(), path).get_all()
+    worksheet = get_grid_worksheet()
+    repo = get_snapshot_repo(worksheet, path, revision="2018-01-16T00:00:00.000Z")
+    assert len(repo.get_all()) == 3
+    assert worksheet.get_row.called
+    assert worksheet.client.sheet.get.call_count == 1
+    worksheet = get_grid_worksheet()
+    get_snapshot_repo(worksheet, path, revision="2018-01-16T00:00:00.000Z").get_all()
+    assert not worksheet.client.sheet.get.called
+
+
+@pytest.mark.parametrize("storage", ["rows", "columns"])
+def test_repo_index_follows_changes(storage):
+    names = {2: "a", 3: "b", 4: "a"}
+    repo = Repository(
+        pygsheets_worksheet=get_names_worksheet(names=names, row_count=10),
+        fast_load=True,
+        storage=storage,
+    )
+    repo.create_index("name")
+    first, second, third = repo.get_all()
+    assert repo.find_by(name="a") == [first, third]
+    assert repo.get_by(name="b") is second
+    assert repo.get_by(name="z") is None
+    second.name = "a"
+    assert repo.find_by(name="b") == []
+    assert repo.find_by(name="a") == [first, third, second]
+    with repo.session() as session:
+        first.name = "c"
+        session.rollback()
+    assert repo.find_by(name="c") == []
+    assert repo.find_by(name="a") == [third, second, first]
+
+    names.update({2: "d", 5: "e"})
+    repo.refresh()
+    assert repo.get_by(name="d") is first
+    assert repo.get_by(name="e").Metadata.row == 5
+
+
+def test_repo_unique_index(fast_repo):
+    fast_repo.create_index("name", unique=True)
+    rick, empty, beth = fast_repo.get_all()
+    assert fast_repo.get_by(name="Rick") is rick
+    assert fast_repo.get_by(name="Rick", is_a_clone=True) is None
+    beth.name = "Rick"
+    for _ in range(2):
+        with pytest.raises(pygsheetsorm.pygsheetsorm.IndexException):
+            fast_repo.get_by(name="Rick")
+    beth.name = "Beth"
+    assert fast_repo.get_by(name="Rick") is rick
+    assert fast_repo.get_by(name="Beth") is beth
+    beth.name = "Rick"
+    fast_repo.drop_index("name")
+    assert fast_repo.find_by(name="Rick") == [rick, beth]
+
+
+def test_repo_find_by_unknown_property(fast_repo):
+    with pytest.raises(ValueError):
+        fast_repo.find_by(age=1)
+    with pytest.raises(ValueError):
+        fast_repo.create_index("age")
+
+
+def test_snapshot_cache_store_and_load(tmpdir):
+    cache = pygsheetsorm.SnapshotCache(str(tmpdir.join("snapshots.db")))
+    assert cache.load("spreadsheet_id", "Sheet1", "1") is None
+    cache.store(
+        spreadsheet_id="spreadsheet_id",
+        sheet_title="Sheet1",
+        revision="1",
+        header={1: "name", 2: "age"},
+        values=[[u"Rick", 70], [u"Ren\xe9e", 1.5]],
+        format_types=[[None, u"NUMBER"], [None, None]],
+    )
+    assert cache.load("spreadsheet_id", "Sheet1", "2") is None
+    assert cache.load("spreadsheet_id", "Sheet1", "1") == (
+        {1: "name", 2: "age"},
+        [[u"Rick", 70], [u"Ren\xe9e", 1.5]],
+        [[None, u"NUMBER"], [None, None]],
+    )
+    cache.delete("spreadsheet_id", "Sheet1")
+    assert cache.load("spreadsheet_id", "Sheet1", "1") is None
+
+
+def get_accounts_repo(storage):
+    # Creates a repo with models based on the following data:
+    #
+    # | Name  | Status | Balance |
+    # |-------|--------|---------|
+    # | a     | open   | 5       |
+    # | b     | closed | 50      |
+    # | c     | open   | 20      |
+    # | d     | open   |         |
+    # | e     | open   | 20      |
+    #
+    mock_worksheet = mock.create_autospec(pygsheets.Worksheet)
+    mock_worksheet.title = "Sheet1"
+    mock_worksheet.spreadsheet = mock.Mock(id="spreadsheet_id")
+    mock_worksheet.client = mock.Mock()
+    mock_worksheet.get_row.return_value = [
+        get_mock_cell(value, column_number=column_index + 1)
+        for column_index, value in enumerate(["Name", "Status", "Balance"])
+    ]
+    rows = [
+        ("a", "open", 5),
+        ("b", "closed", 50),
+        ("c", "open", 20),
+        ("d", "open", ""),
+        ("e", "open", 20),
+    ]
+    row_data = [
+        {"values": [get_cell_data(value) for value in row if value != ""]}
+        for row in rows
+    ]
+    mock_worksheet.client.sheet.get.return_value = {
+        "sheets": [{"data": [{"rowData": row_data}]}]
+    }
+    return Repository(
+        pygsheets_worksheet=mock_worksheet, fast_load=True, storage=storage
+    )
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+@pytest.mark.parametrize("storage", ["rows", "columns"])
+def test_repo_query(storage, indexed):
+    repo = get_accounts_repo(storage)
+    if indexed:
+        repo.create_index("status")
+
+    def names(query):
+        return [model.name for model in query]
+
+    open_accounts = repo.query().where(status="open")
+    assert names(open_accounts) == ["a", "c", "d", "e"]
+    assert names(open_accounts.where_gt("balance", 10)) == ["c", "e"]
+    assert names(open_accounts.where_lte("balance", 20)) == ["a", "c", "e"]
+    assert names(open_accounts.limit(2)) == ["a", "c"]
+    assert names(open_accounts.order_by("balance")) == ["a", "c", "e", "d"]
+    assert names(open_accounts.order_by("balance").limit(2)) == ["a", "c"]
+    assert names(open_accounts.order_by("balance", descending=True)) == [
+        "c",
+        "e",
+        "a",
+        "d",
+    ]
+    assert names(
+        repo.query().order_by("balance", descending=True).order_by("name").limit(3)
+    ) == ["b", "c", "e"]
+    assert names(
+        repo.query().order_by("balance").order_by("name", descending=True)
+    ) == ["a", "e", "c", "b", "d"]
+    assert open_accounts.where(name="d").first().balance == ""
+    assert repo.query().where(status="pending").first() is None
+    assert names(open_accounts.where_gte("balance", 20).where_lt("balance", 50)) == [
+        "c",
+        "e",
+    ]
+
+
+@pytest.mark.parametrize("storage", ["rows", "columns"])
+def test_repo_query_index_keeps_row_order(storage):
+    repo = get_accounts_repo(storage)
+    repo.create_index("status")
+    first = repo.query().where(status="open").first()
+    first.status = "closed"
+    assert repo.query().where(status="open").first().name == "c"
+    first.status = "open"
+    assert repo.query().where(status="open").first() is first
+    assert [model.name for model in repo.query().where(status="open")] == [
+        "a",
+        "c",
+        "d",
+        "e",
+    ]
+
+
+def test_repo_query_stops_at_limit():
+    repo = get_accounts_repo("rows")
+    models = repo.get_all()
+    checked = []
+
+    def get_all():
+        for model in models:
+            checked.append(model)
+            yield model
+
+    repo.get_all = get_all
+    assert [model.name for model in repo.query().where(status="open").limit(2)] == [
+        "a",
+        "c",
+    ]
+    assert checked == models[:3]
+
+
+def test_repo_query_unknown_property():
+    repo = get_accounts_repo("rows")
+    with pytest.raises(ValueError):
+        repo.query().where(age=1)
+    with pytest.raises(ValueError):
+        repo.query().order_by("age")
+
+
+def get_spreadsheet_response(spreadsheet_id, sheets, ranges):
+    # Builds a spreadsheets.get response for sheets, a dict of sheet title
+    # to rows of values, with grid data for the sheets in ranges
+    response = {
+        "spreadsheetId": spreadsheet_id,
+        "properties": {"title": spreadsheet_id, "defaultFormat": {}},
+        "sheets": [],
+    }
+    for index, (title, rows) in enumerate(sorted(sheets.items())):
+        sheet = {"properties": {"sheetId": index, "title": title, "index": index}}
+        if "'{}'".format(title) in ranges:
+            row_data = [
+                {"values": [get_cell_data(value) for value in row]} for row in rows
+            ]
+            sheet["data"] = [{"rowData": row_data}]
+        response["sheets"].append(sheet)
+    return response
+
+
+def test_repo_load_many():
+    spreadsheets = {
+        "first": {"Sheet1": [["Name"], ["a"], ["b"]], "Sheet2": [["Id"], [1]]},
+        "second": {"Sheet1": [["Name", "Age"], ["c", 3]], "Other": [["X"]]},
+    }
+    client = mock.Mock(spreadsheet_cls=pygsheets.Spreadsheet)
+
+    def get(spreadsheetId, fields, includeGridData, ranges):
+        assert fields == pygsheetsorm.pygsheetsorm.SPREADSHEET_GRID_DATA_FIELDS
+        response = get_spreadsheet_response(
+            spreadsheetId, spreadsheets[spreadsheetId], ranges
+        )
+        return mock.Mock(**{"execute.return_value": response})
+
+    client.sheet.service.spreadsheets.return_value.get.side_effect = get
+    repos = Repository.load_many(
+        client=client,
+        specs=[("first", "Sheet2"), ("second", "Sheet1"), ("first", "Sheet1")],
+        max_workers=2,
+    )
+    assert client.sheet.service.spreadsheets.return_value.get.call_count == 2
+    assert [repo.worksheet.title for repo in repos] == ["Sheet2", "Sheet1", "Sheet1"]
+    assert [model.id for model in repos[0].get_all()] == [1]
+    assert [(model.name, model.age) for model in repos[1].get_all()] == [("c", 3)]
+    models = repos[2].get_all()
+    assert [model.name for model in models] == ["a", "b"]
+    assert [model.Metadata.row for model in models] == [2, 3]
+    assert not client.sheet.values_get.called
+    assert not client.sheet.get.called
+
+
+@pytest.fixture
+def client_pool():
+    with mock.patch("pygsheets.authorize") as authorize:
+        yield authorize
+    pygsheetsorm.clear_client_pool()
+
+
+def test_repo_with_creds_reuses_client(client_pool):
+    client = client_pool.return_value
+    spreadsheet = client.open_by_key.return_value
+    spreadsheet.worksheet_by_title.side_effect = lambda title: get_grid_worksheet()
+    first = Repository.get_repository_with_creds("creds.json", "spreadsheet_id")
+    second = Repository.get_repository_with_creds(
+        "creds.json", "spreadsheet_id", sheet_name="Sheet2"
+    )
+    Repository.get_repository_with_creds("creds.json", "other_id")
+    client_pool.assert_called_once_with(service_account_file="creds.json")
+    assert client.open_by_key.call_count == 2
+    assert [args for args, _ in spreadsheet.worksheet_by_title.call_args_list] == [
+        ("Sheet1",),
+        ("Sheet2",),
+        ("Sheet1",),
+    ]
+    assert first.worksheet is not second.worksheet
+
+    pygsheetsorm.clear_client_pool()
+    Repository.get_repository_with_creds("creds.json", "spreadsheet_id")
+    assert client_pool.call_count == 2
+
+
+def test_repo_with_creds_rate_limits_outside_pool_lock(client_pool):
+    pool_lock = pygsheetsorm.pygsheetsorm._CLIENT_POOL._lock
+    spreadsheet = client_pool.return_value.open_by_key.return_value
+    spreadsheet.worksheet_by_title.side_effect = lambda title: get_grid_worksheet()
+    locked = []
+    limiter = mock.Mock()
+    limiter.acquire.side_effect = lambda kind: locked.append(pool_lock.locked())
+    pygsheetsorm.set_default_rate_limiter(limiter)
+    try:
+        Repository.get_repository_with_creds("creds.json", "spreadsheet_id")
+    finally:
+        pygsheetsorm.set_default_rate_limiter(None)
+    # Opening the spreadsheet, then loading the header
+    assert locked == [False, False]
+
+
+def test_repos_sharing_client_share_lock():
+    first = Repository(pygsheets_worksheet=get_grid_worksheet())
+    second = Repository(pygsheets_worksheet=get_grid_worksheet())
+    assert first._api_lock is not second._api_lock
+    second.worksheet.client = first.worksheet.client
+    third = Repository(pygsheets_worksheet=second.worksheet)
+    assert third._api_lock is first._api_lock
+
+
+def test_rate_limiter_paces_requests():
+    clock = mock.Mock(return_value=0.0)
+
+    def sleep(seconds):
+        clock.return_value += seconds
+
+    limiter = pygsheetsorm.RateLimiter(
+        reads_per_minute=60, writes_per_minute=120, burst=2, clock=clock, sleep=sleep
+    )
+    waits = [limiter.acquire("read") for _ in range(4)]
+    assert waits == [0, 0, 1, 1]
+    assert limiter.acquire("write") == 0
+    assert limiter.get_stats("read") == (4, 0, 2)
+    assert limiter.get_stats("write").requests == 1
+    clock.return_value += 10
+    assert limiter.acquire("read") == 0
+
+
+def test_repo_requests_use_rate_limiter():
+    limiter = mock.Mock()
+    repo = Repository(
+        pygsheets_worksheet=get_grid_worksheet(), fast_load=True, rate_limiter=limiter
+    )
+    models = repo.get_all()
+    models[0].name = "Morty"
+    models[0].Save()
+    assert limiter.acquire.call_args_list == [
+        mock.call("read"),
+        mock.call("read"),
+        mock.call("write"),
+    ]
+    default_limiter = mock.Mock()
+    pygsheetsorm.set_default_rate_limiter(default_limiter)
+    try:
+        Repository(pygsheets_worksheet=get_grid_worksheet())
+    finally:
+        pygsheetsorm.set_default_rate_limiter(None)
+    default_limiter.acquire.assert_called_once_with("read")
+
+
+@pytest.mark.parametrize("storage", ["rows", "columns"])
+def test_repo_insert_many(storage):
+    worksheet = get_grid_worksheet()
+    worksheet.client.sheet.values_append.return_value = {
+        "updates": {"updatedRange": "Sheet1!A5:C6"}
+    }
+    repo = Repository(pygsheets_worksheet=worksheet, fast_load=True, storage=storage)
+    repo.create_index("name")
+    rick = repo.get_all()[0]
+    morty, rick_copy = repo.insert_many([{"name": "Morty", "is_a_clone": False}, rick])
+    worksheet.client.sheet.values_append.assert_called_once_with(
+        "spreadsheet_id",
+        [["Morty", "", "False"], ["Rick", "2018-01-15", "False"]],
+        "ROWS",
+        range="'Sheet1'!A5:C",
+        insertDataOption="INSERT_ROWS",
+        valueInputOption="USER_ENTERED",
+    )
+    assert repo.get_all()[-2:] == [morty, rick_copy]
+    assert morty.Metadata.row == 5
+    assert morty.birthday == ""
+    assert rick_copy.Metadata.row == 6
+    assert rick_copy.birthday == datetime.date(2018, 1, 15)
+    assert repo.get_by(name="Morty") is morty
+    assert worksheet.client.sheet.get.call_count == 1
+    morty.name = "Summer"
+    morty.Save()
+    worksheet.update_values_batch.assert_called_once_with(
+        ranges=["A5"], values=[[["Summer"]]], parse=True
+    )
+
+
+@pytest.mark.parametrize("storage", ["rows", "columns"])
+def test_repo_insert_many_none_is_empty(storage):
+    worksheet = FakeWorksheet([[u"Id", u"Name"], [1, u"a"]])
+    repo = Repository(worksheet, storage=storage)
+    repo.get_all()
+    (model,) = repo.insert_many([{"id": 2, "name": None}])
+    assert worksheet.values[2] == [2, u""]
+    assert model.name == u""
+    assert repo.get_all()[1].name == u""
+
+
+def test_repo_insert_many_not_cached(fast_repo):
+    append = fast_repo.worksheet.client.sheet.values_append
+    append.return_value = {"updates": {"updatedRange": "'Sheet1'!A5:C5"}}
+    model = fast_repo.add({"name": "Morty"})
+    _, kwargs = append.call_args
+    assert kwargs["range"] == "'Sheet1'!A1:C"
+    assert model.Metadata.row == 5
+    assert not fast_repo.worksheet.client.sheet.get.called
+    with pytest.raises(ValueError):
+        fast_repo.add({"age": 14})
+
+
+def test_repo_insert_many_clears_cache_if_rows_moved(fast_repo):
+    append = fast_repo.worksheet.client.sheet.values_append
+    append.return_value = {"updates": {"updatedRange": "'Sheet1'!A3:C3"}}
+    fast_repo.get_all()
+    model = fast_repo.add({"name": "Morty"})
+    assert model.Metadata.row == 3
+    assert fast_repo._models == []
+
+
+@pytest.mark.parametrize("storage", ["rows", "columns"])
+def test_repo_delete_where(storage):
+    names = {2: "a", 3: "b", 4: "c", 5: "d", 6: "e"}
+    worksheet = get_names_worksheet(names=names, row_count=10)
+    worksheet.id = 7
+    repo = Repository(pygsheets_worksheet=worksheet, fast_load=True, storage=storage)
+    repo.create_index("name")
+    a, b, c, d, e = repo.get_all()
+    d.name = "local d"
+    deleted = repo.delete_where(lambda model: model.name in ("b", "c", "e"))
+    assert deleted == [b, c, e]
+    requests = [
+        {
+            "deleteDimension": {
+                "range": {
+                    "sheetId": 7,
+                    "dimension": "ROWS",
+                    "startIndex": start,
+                    "endIndex": end,
+                }
+            }
+        }
+        for start, end in [(5, 6), (2, 4)]
+    ]
+    worksheet.client.sheet.batch_update.assert_called_once_with(
+        "spreadsheet_id", requests
+    )
+    assert repo.get_all() == [a, d]
+    assert [model.Metadata.row for model in repo.get_all()] == [2, 3]
+    assert repo.get_by(name="c") is None
+    assert repo.get_by(name="local d") is d
+    d.Save()
+    worksheet.update_values_batch.assert_called_once_with(
+        ranges=["A3"], values=[[["local d"]]], parse=True
+    )
+    assert repo.delete_where(lambda model: False) == []
+    assert worksheet.client.sheet.batch_update.call_count == 1
+
+
+def get_delete_worksheet():
+    return FakeWorksheet([[u"Id", u"Name"], [1, u"a"], [2, u"b"], [3, u"c"]])
+
+
+def test_repo_delete_where_in_session():
+    worksheet = get_delete_worksheet()
+    repo = Repository(worksheet, fast_load=True)
+    with pytest.raises(pygsheetsorm.pygsheetsorm.SessionException):
+        with repo.session():
+            repo.get_by(id=2).name = u"edited"
+            repo.delete_where(lambda model: model.id == 2)
+    assert worksheet.values[1:] == [[1, u"a"], [2, u"b"], [3, u"c"]]
+
+
+@pytest.mark.parametrize("storage", ["rows", "columns"])
+def test_repo_delete_where_detaches_models(storage):
+    worksheet = get_delete_worksheet()
+    repo = Repository(worksheet, storage=storage)
+    (deleted,) = repo.delete_where(lambda model: model.id == 2)
+    assert deleted.Metadata.row is None
+    assert deleted.name == u"b"
+    deleted.name = u"late"
+    with pytest.raises(pygsheetsorm.pygsheetsorm.DeletedModelException):
+        deleted.Save()
+    assert worksheet.values[1:] == [[1, u"a"], [3, u"c"]]
+    assert repo.get_all()[1].Metadata.row == 3
+
+
+@pytest.mark.parametrize("storage", ["rows", "columns"])
+def test_repo_sync_detaches_removed_models(storage):
+    worksheet = get_delete_worksheet()
+    repo = Repository(worksheet, storage=storage)
+    result = repo.sync([{"id": 1}, {"id": 3}], key="id")
+    (removed,) = result.removed
+    removed.name = u"late"
+    with pytest.raises(pygsheetsorm.pygsheetsorm.DeletedModelException):
+        removed.Save()
+    assert worksheet.values[1:] == [[1, u"a"], [3, u"c"]]
+
+
+def test_merge_row_ranges():
+    assert pygsheetsorm.pygsheetsorm._merge_row_ranges([9, 3, 4, 2, 7, 3]) == [
+        (2, 4),
+        (7, 7),
+        (9, 9),
+    ]
+
+
+@pytest.mark.parametrize("storage", ["rows", "columns"])
+def test_repo_update_where(storage):
+    repo = get_accounts_repo(storage)
+    matches = repo.update_where(lambda model: model.status == "open", status="closed")
+    assert [model.name for model in matches] == ["a", "c", "d", "e"]
+    repo.worksheet.update_values_batch.assert_called_once_with(
+        ranges=["B2", "B4:B6"],
+        values=[[["closed"]], [["closed"], ["closed"], ["closed"]]],
+        parse=True,
+    )
+    assert all(model.status == "closed" for model in repo.get_all())
+    with pytest.raises(ValueError):
+        repo.update_where(lambda model: True, age=1)
+
+
+def get_metrics_worksheet():
+    return FakeWorksheet(
+        [[u"Name", u"Status"], [u"a", u"new"], [u"b", u"new"], [u"c", u"open"]]
+    )
+
+
+def test_metrics_records_requests():
+    worksheet = get_metrics_worksheet()
+    stats = pygsheetsorm.RequestStats()
+    repo = Repository(worksheet, fast_load=True, metrics=stats)
+    models = repo.get_all()
+    models[0].status = u"open"
+    models[0].Save()
+    models[1].status = u"open"
+    models[2].status = u"closed"
+    repo.save_all()
+    repo.add({"name": u"d", "status": u"new"})
+    repo.delete_where(lambda model: model.name == u"b")
+
+    all_stats = stats.get_all_stats()
+    assert sorted(all_stats) == [
+        pygsheetsorm.pygsheetsorm.OPERATION_APPEND,
+        pygsheetsorm.pygsheetsorm.OPERATION_BATCH_SAVE,
+        pygsheetsorm.pygsheetsorm.OPERATION_DELETE,
+        pygsheetsorm.pygsheetsorm.OPERATION_HEADER,
+        pygsheetsorm.pygsheetsorm.OPERATION_LOAD,
+        pygsheetsorm.pygsheetsorm.OPERATION_SAVE,
+    ]
+    for operation_stats in all_stats.values():
+        assert operation_stats.requests == 1
+        assert operation_stats.errors == 0
+        assert operation_stats.seconds >= 0
+    load_stats = stats.get_stats(pygsheetsorm.pygsheetsorm.OPERATION_LOAD)
+    assert load_stats.payload_bytes > 0
+    # Header fetched as cells, so its size isn't known
+    header_stats = stats.get_stats(pygsheetsorm.pygsheetsorm.OPERATION_HEADER)
+    assert header_stats.payload_bytes == 0
+    assert stats.get_stats("unknown") == pygsheetsorm.pygsheetsorm.OperationStats(
+        0, 0, 0.0, 0, 0, 0.0
+    )
+
+
+def test_metrics_records_errors_and_backoff():
+    worksheet = get_metrics_worksheet()
+    stats = pygsheetsorm.RequestStats()
+    repo = Repository(worksheet, fast_load=True, metrics=stats)
+    models = repo.get_all()
+    response = httplib2.Response({"status": 429})
+    response.reason = "Insufficient tokens for quota"
+    quota_error = HttpError(response, b"Insufficient tokens for quota")
+    update_values_batch = worksheet.update_values_batch
+    with mock.patch.object(
+        worksheet,
+        "update_values_batch",
+        side_effect=[quota_error, quota_error, update_values_batch],
+    ):
+        with mock.patch("retrying.time.sleep") as sleep:
+            models[0].status = u"open"
+            models[0].Save()
+    assert sleep.call_count == 2
+    save_stats = stats.get_stats(pygsheetsorm.pygsheetsorm.OPERATION_SAVE)
+    assert save_stats.requests == 3
+    assert save_stats.errors == 2
+    assert save_stats.retries == 2
+    assert save_stats.backoff_seconds == 2 + 4
+
+
+def test_default_metrics():
+    stats = pygsheetsorm.RequestStats()
+    pygsheetsorm.set_default_metrics(stats)
+    try:
+        Repository(get_metrics_worksheet(), fast_load=True).get_all()
+    finally:
+        pygsheetsorm.set_default_metrics(None)
+    assert stats.get_stats(pygsheetsorm.pygsheetsorm.OPERATION_LOAD).requests == 1
+
+
+def test_statsd_metrics():
+    client = mock.Mock()
+    metrics = pygsheetsorm.StatsdMetrics(client, prefix="jobs")
+    metrics.record_request("load", 0.25, 100, error=False)
+    metrics.record_request("save", 0.5, None, error=True)
+    metrics.record_backoff("save", 2.0)
+    assert client.incr.call_args_list == [
+        mock.call("jobs.load.requests", 1),
+        mock.call("jobs.load.payload_bytes", 100),
+        mock.call("jobs.save.requests", 1),
+        mock.call("jobs.save.errors", 1),
+        mock.call("jobs.save.retries", 1),
+    ]
+    assert client.timing.call_args_list == [
+        mock.call("jobs.load.latency", 250.0),
+        mock.call("jobs.save.latency", 500.0),
+        mock.call("jobs.save.backoff", 2000.0),
+    ]
+
+
+def test_prometheus_metrics():
+    prometheus_client = pytest.importorskip("prometheus_client")
+    registry = prometheus_client.CollectorRegistry()
+    metrics = pygsheetsorm.PrometheusMetrics(registry=registry)
+    metrics.record_request("load", 0.25, 100, error=False)
+    metrics.record_backoff("load", 2.0)
+    labels = {"operation": "load"}
+    assert registry.get_sample_value("pygsheetsorm_requests_total", labels) == 1
+    assert registry.get_sample_value("pygsheetsorm_payload_bytes_total", labels) == 100
+    assert registry.get_sample_value("pygsheetsorm_retries_total", labels) == 1
+    assert registry.get_sample_value("pygsheetsorm_backoff_seconds_total", labels) == 2
+
+
+def test_profiler_nested_phases():
+    times = iter([0.0, 1.0, 3.0, 4.0, 5.0, 10.0])
+    profiler = pygsheetsorm.Profiler(clock=lambda: next(times))
+    with profiler.time("outer"):
+        start = profiler.start()
+        profiler.stop(start, phase="inner", column="name", converter="C.from_value")
+        with profiler.time("inner"):
+            pass
+    report = profiler.get_report()
+    # Nested phases are not counted in the phase they run in
+    assert report["phases"] == {
+        "outer": {"calls": 1, "seconds": 7.0},
+        "inner": {"calls": 2, "seconds": 3.0},
+    }
+    assert report["columns"] == {"name": {"calls": 1, "seconds": 2.0}}
+    assert report["converters"] == {"C.from_value": {"calls": 1, "seconds": 2.0}}
+    assert json.loads(profiler.to_json()) == report
+    profiler.reset()
+    assert profiler.get_report() == {"phases": {}, "columns": {}, "converters": {}}
+
+
+class CellOnlyConverter(pygsheetsorm.CellConverter):
+    def from_cell(self, cell, property_name):
+        return cell.value_unformatted
+
+
+@pytest.mark.parametrize(
+    "kwargs,phases,converter",
+    [
+        (
+            {},
+            ["build_models", "conversion", "fetch", "index", "placeholder_cells"],
+            ("BasicCellConverter.from_column", 2),
+        ),
+        (
+            {"cell_converter": CellOnlyConverter()},
+            ["build_models", "conversion", "fetch", "index", "placeholder_cells"],
+            ("CellOnlyConverter.from_cell", 6),
+        ),
+        (
+            {"fast_load": True},
+            ["build_models", "conversion", "fetch", "index"],
+            ("BasicCellConverter.from_column", 2),
+        ),
+        (
+            {"storage": STORAGE_COLUMNS},
+            ["build_models", "conversion", "fetch", "index"],
+            ("BasicCellConverter.from_column", 2),
+        ),
+    ],
+)
+def test_repo_profiler(kwargs, phases, converter):
+    profiler = pygsheetsorm.Profiler()
+    repo = Repository(get_metrics_worksheet(), profiler=profiler, **kwargs)
+    models = repo.get_all()
+    report = profiler.get_report()
+    assert sorted(report["phases"]) == phases
+    assert sorted(report["columns"]) == ["name", "status"]
+    converter_name, calls = converter
+    assert list(report["converters"]) == [converter_name]
+    assert report["converters"][converter_name]["calls"] == calls
+    assert models[0].Metadata.cell_converter is repo._cell_converter
+    assert models[0].name == u"a"
+
+
+def get_export_worksheet():
+    return FakeWorksheet(
+        [
+            [u"Name", u"Balance", u"Opened", u"Updated", u"Alarm", u"Note"],
+            [u"a", 1, 43101, 43101.5, 0.5, u"x"],
+            [u"b", u"", 43102, u"", 0.25, 3],
+            [u"c", 2.5, u"", 43103.25],
+        ],
+        format_types=[[None] * 6]
+        + [[None, None, u"DATE", u"DATE_TIME", u"TIME", None]] * 3,
+    )
+
+
+def test_repo_to_dataframe():
+    pandas = pytest.importorskip("pandas")
+    repo = Repository(get_export_worksheet(), fast_load=True)
+    frame = repo.to_dataframe()
+    assert list(frame.columns) == [
+        "name",
+        "balance",
+        "opened",
+        "updated",
+        "alarm",
+        "note",
+    ]
+    assert list(frame["name"]) == [u"a", u"b", u"c"]
+    assert frame["balance"][0] == 1 and pandas.isnull(frame["balance"][1])
+    assert frame["opened"][1] == pandas.Timestamp(2018, 1, 2)
+    assert pandas.isnull(frame["opened"][2])
+    assert frame["updated"][2] == pandas.Timestamp(2018, 1, 3, 6)
+    assert list(frame["alarm"]) == [datetime.time(12), datetime.time(6), None]
+    assert list(frame["note"]) == [u"x", 3, None]
+    # Models are not created
+    assert repo._models == []
+    assert list(repo.to_dataframe(columns=["opened", "name"]).columns) == [
+        "opened",
+        "name",
+    ]
+    with pytest.raises(ValueError):
+        repo.to_dataframe(columns=["missing"])
+
+
+def test_repo_to_arrow():
+    pyarrow = pytest.importorskip("pyarrow")
+    repo = Repository(get_export_worksheet(), fast_load=True)
+    table = repo.to_arrow()
+    assert table.schema.types == [
+        pyarrow.string(),
+        pyarrow.float64(),
+        pyarrow.date32(),
+        pyarrow.timestamp("s"),
+        pyarrow.time32("s"),
+        pyarrow.string(),
+    ]
+    assert table.to_pydict() == {
+        "name": [u"a", u"b", u"c"],
+        "balance": [1.0, None, 2.5],
+        "opened": [datetime.date(2018, 1, 1), datetime.date(2018, 1, 2), None],
+        "updated": [
+            datetime.datetime(2018, 1, 1, 12),
+            None,
+            datetime.datetime(2018, 1, 3, 6),
+        ],
+        "alarm": [datetime.time(12), datetime.time(6), None],
+        "note": [u"x", u"3", None],
+    }
+    assert repo._models == []
+
+
+def get_sync_worksheet():
+    return FakeWorksheet(
+        [[u"Id", u"Name", u"Opened"]]
+        + [[number, u"n{}".format(number), 43100 + number] for number in range(1, 8)],
+        format_types=[[None, None, None]] + [[None, None, u"DATE"]] * 7,
+    )
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{}, {"fast_load": True}, {"storage": STORAGE_COLUMNS}]
+)
+def test_repo_sync(kwargs):
+    worksheet = get_sync_worksheet()
+    repo = Repository(worksheet, **kwargs)
+    repo.create_index("id", unique=True)
+    records = [
+        {"id": number, "name": u"n{}".format(number)}
+        for number in range(1, 8)
+        if number not in (2, 3, 6)
+    ]
+    records[1]["name"] = u"changed"
+    records.append({"id": 9, "name": u"new", "opened": datetime.date(2018, 2, 1)})
+    worksheet.calls.clear()
+    result = repo.sync(records, key="id")
+
+    assert [model.id for model in result.added] == [9]
+    assert [model.id for model in result.updated] == [4]
+    assert [model.id for model in result.removed] == [2, 3, 6]
+    # Deletes and the insert in one request, changed cells in another
+    assert worksheet.calls == {"sheet.batch_update": 1, "update_values_batch": 1}
+    assert worksheet.values[1:] == [
+        [1, u"n1", 43101],
+        [4, u"changed", 43104],
+        [5, u"n5", 43105],
+        [7, u"n7", 43107],
+        [9, u"new", 43132],
+    ]
+    # The new row is formatted like the row above
+    assert worksheet.format_types[5] == [None, None, u"DATE"]
+    models = repo.get_all()
+    assert [(model.Metadata.row, model.id) for model in models] == [
+        (2, 1),
+        (3, 4),
+        (4, 5),
+        (5, 7),
+        (6, 9),
+    ]
+    assert repo.get_by(id=9).opened == datetime.date(2018, 2, 1)
+    assert repo.get_by(id=2) is None
+    assert not models[1].Metadata.get_modified_properties()
+
+    worksheet.calls.clear()
+    assert repo.sync(records, key="id") == ([], [], [])
+    assert worksheet.api_calls == 0
+
+
+def test_repo_sync_without_delete():
+    worksheet = get_sync_worksheet()
+    repo = Repository(worksheet, fast_load=True)
+    result = repo.sync([{"id": 1, "name": None}], key="id", delete=False)
+    assert result.removed == []
+    assert repo.get_all()[0].name == u""
+    assert len(repo.get_all()) == 7
+
+
+def test_repo_sync_rejects_duplicate_keys():
+    repo = Repository(get_sync_worksheet(), fast_load=True)
+    with pytest.raises(ValueError):
+        repo.sync([{"id": 1}, {"id": 1}], key="id")
+    with pytest.raises(ValueError):
+        repo.sync([{"name": u"n1"}], key="id")
+    with pytest.raises(ValueError):
+        repo.sync([{"id": 1}], key="missing")
+
+
+def test_repo_sync_dataframe():
+    pandas = pytest.importorskip("pandas")
+    worksheet = get_sync_worksheet()
+    repo = Repository(worksheet, fast_load=True)
+    frame = pandas.DataFrame(
+        {
+            "id": [1, 2],
+            "name": [u"n1", None],
+            "opened": pandas.to_datetime(["2018-01-01", "2018-03-01"]),
+        }
+    )
+    result = repo.sync(frame, key="id")
+    assert [model.id for model in result.updated] == [2]
+    assert worksheet.values[2] == [2, u"", 43160]
+    assert len(result.removed) == 5
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{}, {"fast_load": True}, {"storage": STORAGE_COLUMNS}]
+)
+def test_repo_lazy(kwargs):
+    worksheet = get_sync_worksheet()
+    repo = Repository(worksheet, lazy=True, **kwargs)
+    assert worksheet.api_calls == 0
+    models = repo.get_all()
+    # The header comes with the rows
+    assert worksheet.api_calls == 1
+    assert [model.id for model in models] == list(range(1, 8))
+    assert models[0].opened == datetime.date(2018, 1, 1)
+
+
+def test_repo_lazy_header_on_its_own():
+    worksheet = get_sync_worksheet()
+    repo = Repository(worksheet, lazy=True, fast_load=True)
+    repo.add({"id": 8, "name": u"n8"})
+    assert worksheet.calls == {"get_row": 1, "sheet.values_append": 1}
+    assert worksheet.values[8][:2] == [8, u"n8"]
+
+
+def test_repo_lazy_snapshot_cache(tmpdir):
+    path = str(tmpdir.join("snapshots.db"))
+    worksheet = get_sync_worksheet()
+    cache = pygsheetsorm.SnapshotCache(path)
+    Repository(worksheet, lazy=True, snapshot_cache=cache).get_all()
+    assert worksheet.calls == {"drive.get_update_time": 2, "sheet.get": 1}
+    worksheet.calls.clear()
+    repo = Repository(worksheet, lazy=True, snapshot_cache=cache)
+    assert worksheet.api_calls == 0
+    assert [model.id for model in repo.get_all()] == list(range(1, 8))
+    assert worksheet.calls == {"drive.get_update_time": 1}
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"fast_load": True}])
+def test_repo_header(kwargs):
+    worksheet = get_sync_worksheet()
+    repo = Repository(worksheet, header=[u"Id", u"Name", u"Opened"], **kwargs)
+    assert worksheet.api_calls == 0
+    models = repo.get_all()
+    assert worksheet.api_calls == 1
+    assert [model.name for model in models][:2] == [u"n1", u"n2"]
+    assert models[1].Metadata.row == 3
+
+
+def get_schema_worksheet():
+    return FakeWorksheet(
+        [
+            [u"Id", u"Price", u"Opened", u"Active", u"Code"],
+            [1, 1.1, 43101, True, 7],
+            [2.0, u"", 43101.75, u"false", u"B8"],
+            [3, 2, u"", u"", u""],
+        ]
+    )
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{}, {"fast_load": True}, {"storage": STORAGE_COLUMNS}]
+)
+def test_repo_schema(kwargs):
+    schema = {
+        "id": int,
+        "price": decimal.Decimal,
+        "opened": datetime.datetime,
+        "active": bool,
+        "code": six.text_type,
+    }
+    models = Repository(get_schema_worksheet(), schema=schema, **kwargs).get_all()
+    assert [model.id for model in models] == [1, 2, 3]
+    assert type(models[1].id) is int
+    assert models[0].price == decimal.Decimal("1.1")
+    assert models[1].price == u""
+    assert models[1].opened == datetime.datetime(2018, 1, 1, 18)
+    assert models[2].opened == u""
+    assert [model.active for model in models] == [True, False, u""]
+    assert [model.code for model in models] == [u"7", u"B8", u""]
+
+
+def test_repo_schema_errors():
+    with pytest.raises(ValueError):
+        Repository(get_schema_worksheet(), schema={"id": list})
+    repo = Repository(get_schema_worksheet(), schema={"missing": int})
+    with pytest.raises(ValueError):
+        repo.get_all()
+    repo = Repository(get_schema_worksheet(), schema={"code": int})
+    with pytest.raises(ValueError, match="code"):
+        repo.get_all()
+
+
+class UpperCaseConverter(BasicCellConverter):
+    def __init__(self):
+        self.columns = []
+
+    def get_column_converter(self, format_type, property_name):
+        self.columns.append(property_name)
+        if property_name != "name":
+            return None
+        return lambda values: [value.upper() for value in values]
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{}, {"fast_load": True}, {"storage": STORAGE_COLUMNS}]
+)
+def test_repo_get_column_converter(kwargs):
+    converter = UpperCaseConverter()
+    profiler = pygsheetsorm.Profiler()
+    repo = Repository(
+        get_sync_worksheet(), cell_converter=converter, profiler=profiler, **kwargs
+    )
+    models = repo.get_all()
+    # Once per column, not per cell
+    assert sorted(converter.columns) == ["id", "name", "opened"]
+    assert models[0].name == u"N1"
+    assert models[0].opened == datetime.date(2018, 1, 1)
+    converters = profiler.get_report()["converters"]
+    assert converters["UpperCaseConverter.get_column_converter"]["calls"] == 1
+
+
+class UpperCaseValueConverter(BasicCellConverter):
+    def from_value(self, value, format_type, property_name):
+        if isinstance(value, six.string_types):
+            return value.upper()
+        return super(UpperCaseValueConverter, self).from_value(
+            value=value, format_type=format_type, property_name=property_name
+        )
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{}, {"fast_load": True}, {"storage": STORAGE_COLUMNS}]
+)
+def test_repo_from_value_subclass(kwargs):
+    repo = Repository(
+        get_sync_worksheet(), cell_converter=UpperCaseValueConverter(), **kwargs
+    )
+    models = repo.get_all()
+    assert models[0].name == u"N1"
+    assert models[0].opened == datetime.date(2018, 1, 1)
+
+
+def get_projection_worksheet():
+    return FakeWorksheet(
+        [
+            [u"Id", u"Name", u"Balance", u"Opened", u"Notes"],
+            [1, u"n1", 1.5, 43101, u"first"],
+            [2, u"n2", u"", u"", u""],
+            [3, u"n3", 3.5, 43103],
+        ],
+        format_types=[[None] * 5] + [[None, None, None, u"DATE", None]] * 3,
+    )
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{}, {"fast_load": True}, {"storage": STORAGE_COLUMNS}]
+)
+def test_repo_get_all_columns(kwargs):
+    worksheet = get_projection_worksheet()
+    repo = Repository(worksheet, **kwargs)
+    worksheet.calls.clear()
+    models = repo.get_all(columns=["id", "balance", "opened"])
+    # Both runs of columns in one request
+    assert worksheet.calls == {"sheet.get": 1}
+    assert [model.id for model in models] == [1, 2, 3]
+    assert [model.balance for model in models] == [1.5, u"", 3.5]
+    assert models[0].opened == datetime.date(2018, 1, 1)
+    assert models[1].opened == u""
+    assert models[2].Metadata.row == 4
+    with pytest.raises(PropertyNotLoadedException):
+        models[0].name
+    with pytest.raises(AttributeError):
+        models[0].notes = u"changed"
+    assert "name" not in repr(models[0])
+    assert not hasattr(models[0], "missing")
+
+    filtered = repo.get_all(lambda model: model.name != u"n1", columns=["name"])
+    assert [model.name for model in filtered] == [u"n2", u"n3"]
+    # Partial models are not cached
+    assert len(repo.get_all()[0].notes) == 5
+
+
+def test_repo_get_all_columns_loaded():
+    worksheet = get_projection_worksheet()
+    repo = Repository(worksheet, fast_load=True)
+    repo.get_all()
+    worksheet.calls.clear()
+    models = repo.get_all(columns=["id"])
+    assert worksheet.api_calls == 0
+    assert models[0].notes == u"first"
+
+
+def test_repo_get_all_columns_trailing_empty_cells():
+    worksheet = FakeWorksheet(
+        [[u"Id", u"Name", u"Notes"], [1, u"a", u"x"], [2, u"b", u""], [3, u"c"]]
+    )
+    repo = Repository(worksheet, fast_load=True)
+    worksheet.calls.clear()
+    models = repo.get_all(columns=["notes"])
+    assert worksheet.calls == {"sheet.get": 1}
+    assert [model.notes for model in models] == [u"x", u"", u""]
+    assert [model.Metadata.row for model in models] == [2, 3, 4]
+
+
+def test_repo_get_all_columns_rejects_unknown():
+    repo = Repository(get_projection_worksheet(), fast_load=True)
+    with pytest.raises(ValueError):
+        repo.get_all(columns=["id", "missing"])
+    with pytest.raises(ValueError):
+        repo.get_all(columns=[])
+
+
+def test_repo_get_all_columns_changes():
+    worksheet = get_projection_worksheet()
+    repo = Repository(worksheet, fast_load=True)
+    model = repo.get_all(columns=["name", "opened"])[2]
+    model.name = u"changed"
+    model.opened = datetime.date(2018, 2, 1)
+    model.Metadata.save()
+    assert worksheet.values[3][:4] == [3, u"changed", 3.5, 43132]
+
+
+def test_repo_columnar_get_all(columnar_repo):
+    models = columnar_repo.get_all()
+    assert columnar_repo.worksheet.client.sheet.get.call_count == 1
+    assert len(models) == 3
+    assert models[0].name == "Rick"
+    assert models[0].birthday == datetime.date(2018, 1, 15)
+    assert models[2].name == "Beth"
+    assert models[2].is_a_clone == ""
+    assert columnar_repo._table.columns["name"] == ["Rick", "", "Beth"]
+    assert [model.Metadata.row for model in models] == [2, 3, 4]
+    assert not hasattr(models[0], "__dict__")
+    assert repr(models[0]) == (
+        '<Model [1:name="Rick"], [2:birthday="2018-01-15"], [3:is_a_clone="False"]>'
+    )
+
+
+def test_repo_columnar_save(columnar_repo):
+    models = columnar_repo.get_all()
+    models[1].name = "Morty"
+    models[2].name = "Beth"
+    assert models[1].Metadata.get_modified_properties() == set(["name"])
+    assert len(models[2].Metadata.get_modified_properties()) == 0
+    assert columnar_repo._table.columns["name"] == ["Rick", "Morty", "Beth"]
+    models[1].Save()
+    _, kwargs = columnar_repo.worksheet.update_values_batch.call_args
+    assert kwargs["ranges"] == ["A3"]
+    assert kwargs["values"] == [[["Morty"]]]
+    assert len(models[1].Metadata.get_modified_properties()) == 0
+
+
+def test_repo_columnar_session_rollback(columnar_repo):
+    model = columnar_repo.get_all()[0]
+    with pytest.raises(ValueError):
+        with columnar_repo.session():
+            model.name = "Rick C-137"
+            raise ValueError("boom")
+    assert model.name == "Rick"
+    assert len(model.Metadata.get_modified_properties()) == 0
+
+
+def test_repo_columnar_set_incorrect_property_name(columnar_repo):
+    model = columnar_repo.get_all()[0]
+    with pytest.raises(TypeError):
+        model.this_doesnt_exist = "boom"
+    with pytest.raises(AttributeError):
+        model.this_doesnt_exist
+
+
+def test_repo_unknown_storage():
+    with pytest.raises(ValueError):
+        Repository(pygsheets_worksheet=get_grid_worksheet(), storage="bogus")
+
+
 def test_model_repr_and_str(full_repo):
     model1 = full_repo.get_all()[0]
     expected_value = '<Model [1:header_row_1_column_1="row 2 column 1"], [2:header_row_1_column_2="row 2 column 2"]>'
@@ -136,6 +1576,39 @@ def test_model_not_modified_after_save(full_repo):
     for row in full_repo.worksheet.get_all_values():
         for cell in row:
             assert not cell.update.called
+    assert not full_repo.worksheet.update_values_batch.called
+
+
+def test_repo_generated_model_class(full_repo):
+    models = full_repo.get_all()
+    model_class = type(models[0])
+    assert issubclass(model_class, Model)
+    assert model_class is not Model
+    assert type(models[1]) is model_class
+    assert "Metadata" in model_class.__slots__
+    assert not hasattr(models[0], "__dict__")
+    assert isinstance(Model(repository=full_repo), Model)
+    with pytest.raises(TypeError):
+        models[0].this_doesnt_exist = "boom"
+    models[0].header_row_1_column_2 = "row 2 column 2"
+    assert len(models[0].Metadata.get_modified_properties()) == 0
+    models[0].header_row_1_column_2 = "new value"
+    assert models[0].header_row_1_column_2 == "new value"
+    assert models[0].Metadata.get_modified_properties() == set(
+        ["header_row_1_column_2"]
+    )
+    assert models[1].header_row_1_column_2 == "row 3 column 2"
+
+
+def test_repo_generated_model_class_unusual_names(full_repo):
+    full_repo._col_to_property_name[1] = "__not_valid_starting_chars"
+    full_repo._col_to_property_name[2] = "_column0"
+    model = full_repo.get_all()[0]
+    assert model.__not_valid_starting_chars == "row 2 column 1"
+    assert model._column0 == "row 2 column 2"
+    model.__not_valid_starting_chars = "new value"
+    assert getattr(model, "__not_valid_starting_chars") == "new value"
+    assert model._column0 == "row 2 column 2"
 
 
 def test_repo_header_mappings(repo):
@@ -178,6 +1651,141 @@ def test_repo_save(full_repo):
     assert len(model.Metadata.get_modified_properties()) == 0
 
 
+def test_repo_save_is_one_batch_request(full_repo):
+    model = full_repo.get_all()[0]
+    model.header_row_1_column_1 = "new value 1"
+    model.header_row_1_column_2 = 42
+    model.Save()
+    assert full_repo.worksheet.update_values_batch.call_count == 1
+    _, kwargs = full_repo.worksheet.update_values_batch.call_args
+    assert kwargs["ranges"] == ["A2:B2"]
+    assert kwargs["values"] == [[["new value 1", "42"]]]
+
+
+def test_repo_save_all(full_repo):
+    models = full_repo.get_all()
+    models[0].header_row_1_column_1 = "new value 1"
+    models[1].header_row_1_column_2 = "new value 2"
+    full_repo.save_all()
+    assert full_repo.worksheet.update_values_batch.call_count == 1
+    _, kwargs = full_repo.worksheet.update_values_batch.call_args
+    assert sorted(kwargs["ranges"]) == ["A2", "B3"]
+    for model in models:
+        assert len(model.Metadata.get_modified_properties()) == 0
+
+
+def test_repo_save_all_nothing_modified(full_repo):
+    full_repo.get_all()
+    full_repo.save_all()
+    assert not full_repo.worksheet.update_values_batch.called
+
+
+def test_repo_save_all_splits_large_batches(full_repo):
+    models = full_repo.get_all()
+    for model in models:
+        model.header_row_1_column_1 = "new value 1"
+        model.header_row_1_column_2 = "new value 2"
+    with mock.patch.object(pygsheetsorm.pygsheetsorm, "BATCH_UPDATE_MAX_CELLS", 3):
+        full_repo.save_all()
+    call_sizes = [
+        sum(len(row) for matrix in kwargs["values"] for row in matrix)
+        for _, kwargs in full_repo.worksheet.update_values_batch.call_args_list
+    ]
+    assert call_sizes == [3, 1]
+
+
+def test_merge_cell_updates():
+    updates = [
+        (2, 1, "a2"),
+        (2, 2, "b2"),
+        (3, 1, "a3"),
+        (3, 2, "b3"),
+        (3, 4, "d3"),
+        (5, 1, "a5"),
+    ]
+    merged = pygsheetsorm.pygsheetsorm._merge_cell_updates(updates)
+    assert merged == [
+        (2, 1, [["a2", "b2"], ["a3", "b3"]]),
+        (3, 4, [["d3"]]),
+        (5, 1, [["a5"]]),
+    ]
+
+
+def test_session_defers_writes_until_commit(full_repo):
+    models = full_repo.get_all()
+    with full_repo.session() as session:
+        models[0].header_row_1_column_1 = "new value 1"
+        models[1].header_row_1_column_1 = "new value 2"
+        models[0].Save()
+        assert not full_repo.worksheet.update_values_batch.called
+        assert session.get_models() == models
+    assert full_repo.worksheet.update_values_batch.call_count == 1
+    _, kwargs = full_repo.worksheet.update_values_batch.call_args
+    assert kwargs["ranges"] == ["A2:A3"]
+    assert kwargs["values"] == [[["new value 1"], ["new value 2"]]]
+    assert full_repo._session is None
+    for model in models:
+        assert len(model.Metadata.get_modified_properties()) == 0
+
+
+def test_session_skips_values_set_back_to_original(full_repo):
+    model = full_repo.get_all()[0]
+    with full_repo.session():
+        model.header_row_1_column_1 = "new value"
+        model.header_row_1_column_1 = "row 2 column 1"
+    assert not full_repo.worksheet.update_values_batch.called
+
+
+def test_session_rollback_on_error(full_repo):
+    model = full_repo.get_all()[0]
+    with pytest.raises(ValueError):
+        with full_repo.session():
+            model.header_row_1_column_1 = "new value"
+            raise ValueError("boom")
+    assert not full_repo.worksheet.update_values_batch.called
+    assert model.header_row_1_column_1 == "row 2 column 1"
+    assert len(model.Metadata.get_modified_properties()) == 0
+    assert full_repo._session is None
+
+
+def test_session_defers_save_all_until_commit():
+    worksheet = get_delete_worksheet()
+    repo = Repository(worksheet, fast_load=True)
+    models = repo.get_all()
+    models[0].name = u"before"
+    with pytest.raises(RuntimeError):
+        with repo.session():
+            models[1].name = u"during"
+            repo.save_all()
+            models[2].Save()
+            assert worksheet.calls["update_values_batch"] == 0
+            raise RuntimeError("boom")
+    assert worksheet.values[1:] == [[1, u"a"], [2, u"b"], [3, u"c"]]
+    assert models[1].name == u"b"
+    with repo.session():
+        repo.save_all()
+    # Changes made before the session are saved with it
+    assert worksheet.values[1] == [1, u"before"]
+    assert worksheet.calls["update_values_batch"] == 1
+
+
+def test_session_rejects_insert_many():
+    worksheet = get_delete_worksheet()
+    repo = Repository(worksheet, fast_load=True)
+    with pytest.raises(pygsheetsorm.pygsheetsorm.SessionException):
+        with repo.session():
+            repo.add({"id": 4, "name": u"d"})
+    assert len(worksheet.values) == 4
+    assert len(repo.get_all()) == 3
+
+
+def test_session_cannot_be_nested(full_repo):
+    with full_repo.session():
+        with pytest.raises(pygsheetsorm.pygsheetsorm.SessionException):
+            with full_repo.session():
+                pass
+
+
 def test_repo_with_empty_cells(repo_with_empty_cells):
     models = repo_with_empty_cells.get_all()
     models[0].header_row_1_column_1 == "row 2 column 1"
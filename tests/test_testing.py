@@ -0,0 +1,100 @@
+# Copyright (c) 2018, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+import datetime
+import pytest
+from pygsheetsorm import Repository
+from pygsheetsorm.pygsheetsorm import STORAGE_COLUMNS
+from pygsheetsorm.testing import FakeWorksheet
+
+
+def get_worksheet():
+    return FakeWorksheet(
+        [
+            [u"Name", u"Age", u"Birthday", u"Is A Clone"],
+            [u"Rick", 70, 43101, False],
+            [u"Morty", 14, 43102, False],
+            [u"Beth", 34, 43103, True],
+        ],
+        format_types=[
+            [None, None, None, None],
+            [None, None, u"DATE", None],
+            [None, None, u"DATE", None],
+            [None, None, u"DATE", None],
+        ],
+    )
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{}, {"fast_load": True}, {"storage": STORAGE_COLUMNS}]
+)
+def test_fake_worksheet_get_all(kwargs):
+    worksheet = get_worksheet()
+    repo = Repository(worksheet, **kwargs)
+    people = repo.get_all()
+    assert [person.name for person in people] == [u"Rick", u"Morty", u"Beth"]
+    assert people[0].age == 70
+    assert people[0].birthday == datetime.date(2018, 1, 1)
+    assert people[2].is_a_clone is True
+    # The header row and the data
+    assert worksheet.api_calls == 2
+
+
+def test_fake_worksheet_writes():
+    worksheet = get_worksheet()
+    repo = Repository(worksheet, fast_load=True)
+    people = repo.get_all()
+    people[1].age = 15
+    people[1].birthday = datetime.date(2018, 2, 1)
+    repo.save_all()
+    repo.add({"name": u"Summer", "age": 17, "is_a_clone": False})
+    repo.delete_where(lambda person: person.name == u"Rick")
+    assert worksheet.calls["update_values_batch"] == 1
+    assert worksheet.calls["sheet.values_append"] == 1
+    assert worksheet.calls["sheet.batch_update"] == 1
+    assert worksheet.values[1] == [u"Morty", 15, 43132, False]
+    assert worksheet.format_types[1][2] == u"DATE"
+    assert worksheet.values[3] == [u"Summer", 17, u"", False]
+
+    reloaded = Repository(worksheet, fast_load=True).get_all()
+    assert [person.name for person in reloaded] == [u"Morty", u"Beth", u"Summer"]
+    assert reloaded[0].birthday == datetime.date(2018, 2, 1)
+
+
+def get_accounts_worksheet(row_count):
+    """Small version of the sheet benchmarks/bench_repository.py uses."""
+    rows = [[u"Name", u"Status", u"Balance"]]
+    for index in range(row_count):
+        rows.append([u"account {}".format(index), [u"new", u"open"][index % 2], index])
+    return FakeWorksheet(rows)
+
+
+@pytest.mark.parametrize(
+    "kwargs,values_call",
+    [
+        ({}, "get_all_values"),
+        ({"fast_load": True}, "sheet.get"),
+        ({"storage": STORAGE_COLUMNS}, "sheet.get"),
+    ],
+)
+def test_fake_worksheet_api_calls(kwargs, values_call):
+    # The operations the benchmarks time, checked by API calls instead
+    worksheet = get_accounts_worksheet(50)
+    repo = Repository(worksheet, **kwargs)
+    accounts = repo.get_all()
+    assert worksheet.calls == {"get_row": 1, values_call: 1}
+
+    worksheet.calls.clear()
+    assert len(repo.get_all()) == 50
+    assert len(repo.query().where(status=u"open").where_gt("balance", 25).all()) == 12
+    repo.create_index("name", unique=True)
+    assert repo.get_by(name=u"account 10") is accounts[10]
+    assert worksheet.api_calls == 0
+
+    for account in accounts[::10]:
+        account.status = u"closed"
+    repo.save_all()
+    assert worksheet.calls == {"update_values_batch": 1}
+    assert [row[1] for row in worksheet.values[1::10]] == [u"closed"] * 5
@@ -204,3 +204,60 @@ def test_basic_cell_converter_date_time2(basic_cell_converter):
         datetime.datetime(year=1980, month=9, day=21, hour=5, minute=15, second=49)
         == value
     )
+
+
+def test_basic_cell_converter_from_value_date(basic_cell_converter):
+    value = basic_cell_converter.from_value(
+        value=43115, format_type=u"DATE", property_name="fake"
+    )
+    assert datetime.date(2018, 1, 15) == value
+
+
+def test_basic_cell_converter_from_value_empty_date(basic_cell_converter):
+    value = basic_cell_converter.from_value(
+        value=u"", format_type=u"DATE", property_name="fake"
+    )
+    assert u"" == value
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+@pytest.mark.parametrize("format_type", [u"DATE", u"TIME", u"DATE_TIME"])
+def test_basic_cell_converter_from_column_matches_from_value(
+    basic_cell_converter, format_type, use_numpy
+):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    values = [43115, 0.563680555556, 43116.5635069, 29485.2193171, 43115.99999999, u""]
+    expected = [
+        basic_cell_converter.from_value(
+            value=value, format_type=format_type, property_name="fake"
+        )
+        for value in values
+    ]
+    with mock.patch.object(
+        pygsheetsorm.pygsheetsorm,
+        "numpy",
+        pygsheetsorm.pygsheetsorm.numpy if use_numpy else None,
+    ):
+        converted = basic_cell_converter.from_column(
+            values=values, format_type=format_type, property_name="fake"
+        )
+    assert converted == expected
+    assert converted[-1] == u""
+
+
+def test_basic_cell_converter_from_column_passthrough(basic_cell_converter):
+    values = [1, u"two", 3.5, True, u""]
+    converted = basic_cell_converter.from_column(
+        values=values, format_type=u"NUMBER", property_name="fake"
+    )
+    assert converted == values
+    assert converted is not values
+
+
+def test_basic_cell_converter_date_time_rounds_to_next_minute(basic_cell_converter):
+    # 1/16/2018 13:31:59.6
+    value = basic_cell_converter.from_value(
+        value=43116.56388425926, format_type=u"DATE_TIME", property_name="fake"
+    )
+    assert datetime.datetime(2018, 1, 16, 13, 32, 0) == value